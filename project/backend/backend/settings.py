@@ -27,6 +27,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'core',
@@ -47,7 +48,11 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 100
 }
 
-DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+# Загрузки хранятся по хешу содержимого, одинаковые файлы — один раз (core.storage)
+STORAGES = {
+    'default': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
@@ -133,15 +138,106 @@ USE_X_FORWARDED_HOST = True
 BASE_URL = 'http://localhost:8000'
 FRONTEND_BASE_URL = 'http://localhost:5173'
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'post-views-cache',
+# Кеш общий для всех процессов: в нём поколения контента (кеш ответов, ETag), скетчи просмотров,
+# блокировки пересчёта. С REDIS_URL — Redis (нужен пакет redis), иначе таблица в БД
+# (создаётся миграцией core.0003_cache_table)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
     }
-}
 
+# Окно уникальности просмотра: один HLL-скетч (1 КиБ) на пост и окно (blog.view_counter)
 POST_VIEW_UNIQUE_TTL = 6 * 60 * 60
 
+# Просмотры копятся в памяти процесса и сбрасываются в БД пачкой раз в N секунд
+VIEW_COUNTER_BUFFERED = True
+VIEW_COUNTER_FLUSH_INTERVAL = 10
+
+# Конфигурация полнотекстового поиска PostgreSQL (контент на русском)
+POST_SEARCH_CONFIG = 'russian'
+
+# Автодополнение (pg_trgm): префиксы до N символов кешируются на TTL секунд
+AUTOCOMPLETE_CACHE_TTL = 60
+AUTOCOMPLETE_CACHE_MAX_PREFIX = 4
+
+# Поиск «что приготовить»: индекс в памяти перестраивается не реже, чем раз в N секунд
+PANTRY_INDEX_MAX_AGE = 5 * 60
+
+# Кеш списков постов (для анонимов), тегов и ингредиентов (0 — выключен).
+# Свежесть, окно отдачи устаревшего ответа на время пересчёта и подстановка актуальных счётчиков
+RESPONSE_CACHE_TTL = 30
+RESPONSE_CACHE_STALE_TTL = 5 * 60
+RESPONSE_CACHE_LIVE_COUNTERS = True
+
+# Трендовый рейтинг (blog.trending): очки (лайки, комментарии, просмотры с весами), которые
+# вдвое теряют в весе за каждые TRENDING_HALF_LIFE_HOURS возраста поста.
+# Считается для постов не старше TRENDING_WINDOW_DAYS дней; инкрементальный пересчёт берёт
+# изменённые с прошлого запуска минус TRENDING_REFRESH_OVERLAP секунд (поздние коммиты, расхождение часов)
+TRENDING_HALF_LIFE_HOURS = 12
+TRENDING_WEIGHTS = {'likes': 1.0, 'comments': 2.0, 'views': 0.05}
+TRENDING_WINDOW_DAYS = 14
+TRENDING_REFRESH_OVERLAP = 60
+
+# Похожие посты (blog.similarity): сколько соседей хранить и веса косинусного сходства
+# по тегам, ингредиентам и лайкнувшим пользователям
+SIMILAR_POSTS_TOP_K = 20
+SIMILAR_POSTS_WEIGHTS = {'tags': 1.0, 'ingredients': 2.0, 'likers': 0.5}
+# Признаки (тег, ингредиент, пользователь) у большей доли постов не учитываются
+SIMILAR_POSTS_MAX_DF = 0.05
+
+# Лента подписок (blog.timeline): длина материализованного списка; авторы с большим числом
+# подписчиков не рассылаются по лентам, их посты подмешиваются при чтении (список кешируется на N секунд)
+TIMELINE_MAX_LENGTH = 500
+TIMELINE_FANOUT_MAX_FOLLOWERS = 5000
+TIMELINE_PULL_AUTHORS_TTL = 10 * 60
+
+# Варианты изображений (core.images): ширины по видам, качество WebP/JPEG; строятся после загрузки
+# в пуле из N потоков, недостающие — при первом запросе
+IMAGE_VARIANT_WIDTHS = {
+    'cover': (320, 640, 1280),
+    'step': (320, 640, 1280),
+    'avatar': (64, 128, 256),
+}
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANTS_ON_UPLOAD = True
+IMAGE_VARIANT_WORKERS = 2
+
+# Раскладка загрузок по каталогам ab/cd/ (core.storage.sharded_upload_path, blob): ширины уровней, () — плоско
+MEDIA_UPLOAD_FANOUT = (2, 2)
+
+# Blob-хранилище медиа (core.storage): каталог blob и сколько секунд blob без ссылок живёт до удаления
+MEDIA_BLOB_PREFIX = 'blobs'
+MEDIA_BLOB_GRACE = 24 * 60 * 60
+# gc_media: файлы без ссылок моложе стольких секунд не трогаются (загрузка, ещё не сохранённая в БД)
+MEDIA_GC_GRACE = 24 * 60 * 60
+
+# Раздача media (core.media_delivery): 'python' — поток из Django (разработка), 'x-accel' — nginx
+# (location MEDIA_ACCEL_PREFIX { internal; alias <MEDIA_ROOT>/; }), 'x-sendfile' — Apache/lighttpd.
+# Blob — Cache-Control immutable на год, прочие файлы — MEDIA_CACHE_MAX_AGE секунд
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'python')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 60 * 60
+MEDIA_STREAM_CHUNK_SIZE = 64 * 1024
+
+# URL файлов в ответах API (core.media_urls): CDN-хосты (файл закреплён за хостом по хешу имени; пусто —
+# хост запроса) и подписанные ссылки со сроком MEDIA_URL_TTL — он должен быть больше
+# RESPONSE_CACHE_TTL + RESPONSE_CACHE_STALE_TTL, иначе кеш ответов отдаст просроченные ссылки
+MEDIA_CDN_ORIGINS = [origin for origin in os.environ.get('MEDIA_CDN_ORIGINS', '').split(',') if origin]
+MEDIA_URL_SIGNED = False
+MEDIA_URL_SIGNING_KEY = None
+MEDIA_URL_TTL = 60 * 60
+
 # --- EMAIL (реальная отправка через Gmail SMTP) ---
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -152,6 +248,25 @@ EMAIL_USE_TLS = True
 EMAIL_TIMEOUT = 10
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Локальная заглушка SMTP для проверки рассылки (manage.py smtp_sink): EMAIL_SMTP_SINK=127.0.0.1:1025
+_smtp_sink = os.environ.get('EMAIL_SMTP_SINK')
+if _smtp_sink:
+    EMAIL_HOST, _, _smtp_sink_port = _smtp_sink.partition(':')
+    EMAIL_PORT = int(_smtp_sink_port or 1025)
+    EMAIL_HOST_USER = EMAIL_HOST_PASSWORD = ''
+    EMAIL_USE_TLS = False
+
+# Очередь писем о новых постах (blog.notifications, команда process_post_notifications):
+# письма уходят пачками через одно SMTP-соединение; сбой пачки повторяется с паузой
+# BACKOFF * 2^n секунд, затем уведомление откладывается до следующей попытки воркера
+NOTIFICATION_CHUNK_SIZE = 100
+NOTIFICATION_SEND_RETRIES = 3
+NOTIFICATION_RETRY_BACKOFF = 2
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_ATTEMPT_BACKOFF = 60
+# Уведомление в статусе sending дольше N секунд считается брошенным упавшим воркером
+NOTIFICATION_LEASE = 10 * 60
+
 if DEBUG and not EMAIL_HOST_PASSWORD:
     print('WARNING: EMAIL_HOST_PASSWORD env var not set – отправка писем не будет работать.')
 # -----------------------------------------------
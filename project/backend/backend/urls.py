@@ -1,16 +1,18 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 
-from reports.views import PostReportView
+from core.views import image_variant, media_file
+from reports.views import PostReportView, PostViewersReportView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('users.urls')),
     path('api/blog/', include('blog.urls')),
     path('api/reports/posts/', PostReportView.as_view(), name='post-report'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('api/reports/post-viewers/', PostViewersReportView.as_view(), name='post-viewers-report'),
+    # Варианты изображений с генерацией при первом запросе (core.images) — раньше общей раздачи media
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+\.w\d+\.(?:webp|jpg))$', image_variant, name='image-variant'),
+    # Остальные файлы media (core.media_delivery, MEDIA_SERVE_MODE); для перенесённых reshard_media — редирект со старого URL
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', media_file, name='media-file'),
+]
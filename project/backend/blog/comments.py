@@ -0,0 +1,68 @@
+from django.db.models import Count, Exists, F, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Greatest, Now
+
+from .models import Comment, Post
+
+# Потомки заданных комментариев до глубины max_depth (1 — только прямые ответы)
+DESCENDANTS_SQL = '''
+WITH RECURSIVE tree (id, depth) AS (
+    SELECT id, 1 FROM {table} WHERE parent_comment_id = ANY(%s)
+    UNION ALL
+    SELECT c.id, t.depth + 1 FROM {table} c JOIN tree t ON c.parent_comment_id = t.id WHERE t.depth < %s
+)
+SELECT id FROM tree
+'''
+
+
+def thread_queryset():
+    return (Comment.objects
+            .select_related('author')
+            .annotate(has_replies=Exists(Comment.objects.filter(parent_comment=OuterRef('pk'))))
+            .order_by('created_at', 'id'))
+
+
+def attach_replies(roots, max_depth):
+    '''
+    Догружает ответы к roots одним рекурсивным запросом (с автором) и раскладывает их
+    по comment.thread_replies. У узлов на границе глубины ответы не грузятся —
+    их можно дочитать запросом поддерева (?root=).
+    '''
+    for root in roots:
+        root.thread_replies = []
+    root_ids = [root.pk for root in roots]
+    if not root_ids:
+        return []
+    sql = DESCENDANTS_SQL.format(table=Comment._meta.db_table)
+    descendants = list(thread_queryset().filter(pk__in=RawSQL(sql, (root_ids, max_depth))))
+
+    by_id = {comment.pk: comment for comment in roots}
+    for comment in descendants:
+        comment.thread_replies = []
+        by_id[comment.pk] = comment
+    # Порядок created_at, id — родитель всегда раньше ответа, ответы внутри ветки по времени
+    for comment in descendants:
+        parent = by_id.get(comment.parent_comment_id)
+        if parent is not None:
+            parent.thread_replies.append(comment)
+    return descendants
+
+
+def change_comments_count(post_id, delta):
+    # Один UPDATE без чтения строки; меньше нуля не опускаемся
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0), counters_changed_at=Now()
+    )
+
+
+def reconcile_comments_count(queryset):
+    '''
+    Приводит comments_count к фактическому числу комментариев одним UPDATE.
+    Модель комментария берётся из queryset.model — работает и в миграциях.
+    Возвращает число исправленных постов.
+    '''
+    comment_model = queryset.model._meta.get_field('comments').related_model
+    actual = Coalesce(Subquery(
+        comment_model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('pk')).values('n')
+    ), Value(0))
+    return queryset.exclude(comments_count=actual).update(comments_count=actual, counters_changed_at=Now())
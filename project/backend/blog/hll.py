@@ -0,0 +1,72 @@
+import hashlib
+import math
+
+# 2^10 регистров по байту: 1 КиБ на скетч, стандартная ошибка 1.04 / sqrt(1024) ≈ 3.25%
+PRECISION = 10
+
+
+class HyperLogLog:
+    '''
+    Оценка числа уникальных значений с фиксированной памятью (Flajolet et al., 2007).
+    - add() возвращает True, если изменился хотя бы один регистр — значение точно новое;
+      False — значение, скорее всего, уже встречалось.
+    - Скетчи одной точности сливаются (merge) без потерь: максимум по регистрам.
+    - Сериализуется в bytes длины m — по байту на регистр.
+    '''
+
+    def __init__(self, precision=PRECISION, registers=None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError(f'Expected {self.m} registers, got {len(self.registers)}')
+        self._recount()
+
+    @classmethod
+    def from_bytes(cls, data, precision=PRECISION):
+        return cls(precision, data or None)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    @property
+    def error_bound(self):
+        '''Относительная стандартная ошибка оценки (для ~68% оценок; ×2 — для ~95%).'''
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        x = int.from_bytes(digest, 'big')
+        width = 64 - self.precision
+        index = x >> width
+        rank = width - (x & ((1 << width) - 1)).bit_length() + 1
+        current = self.registers[index]
+        if rank <= current:
+            return False
+        self.registers[index] = rank
+        # Сумма 2^-M и число нулевых регистров поддерживаются инкрементально — count() за O(1)
+        self._sum += 2.0 ** -rank - 2.0 ** -current
+        if current == 0:
+            self._zeros -= 1
+        return True
+
+    def merge(self, other):
+        if other.m != self.m:
+            raise ValueError('Cannot merge sketches of different precision')
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        self._recount()
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / self._sum
+        if estimate <= 2.5 * self.m and self._zeros:
+            # Малые мощности — линейный подсчёт по пустым регистрам, он здесь точнее
+            return self.m * math.log(self.m / self._zeros)
+        return estimate
+
+    def __len__(self):
+        return int(round(self.count()))
+
+    def _recount(self):
+        self._sum = math.fsum(2.0 ** -r for r in self.registers)
+        self._zeros = self.registers.count(0)
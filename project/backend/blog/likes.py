@@ -0,0 +1,46 @@
+from django.db import connection
+
+from .models import Like, Post
+
+# Один оператор вместо exists/add/remove/UPDATE/refresh_from_db:
+# - target — пост, если он виден пользователю (иначе ничего не меняется и строк нет);
+# - removed — снимаем лайк, если он был;
+# - inserted — ставим, если снимать было нечего; при гонке двух кликов ON CONFLICT
+#   возвращает существующую строку, а xmax = 0 отличает реальную вставку;
+# - UPDATE сдвигает likes_count на итог и возвращает новое значение.
+TOGGLE_LIKE_SQL = '''
+WITH target AS (
+    SELECT id FROM {post} WHERE id = %(post_id)s AND ({visible})
+), removed AS (
+    DELETE FROM {like} WHERE user_id = %(user_id)s AND post_id IN (SELECT id FROM target)
+    RETURNING 1
+), inserted AS (
+    INSERT INTO {like} (user_id, post_id, created_at)
+    SELECT %(user_id)s, id, now() FROM target WHERE NOT EXISTS (SELECT 1 FROM removed)
+    ON CONFLICT (user_id, post_id) DO UPDATE SET created_at = {like}.created_at
+    RETURNING (xmax = 0) AS created
+)
+UPDATE {post}
+SET likes_count = GREATEST(
+    likes_count + (SELECT count(*) FROM inserted WHERE created) - (SELECT count(*) FROM removed), 0
+), counters_changed_at = now()
+WHERE id IN (SELECT id FROM target)
+RETURNING likes_count, EXISTS (SELECT 1 FROM inserted)
+'''
+
+VISIBLE_TO_USER_SQL = "status = 'published' OR author_id = %(user_id)s"
+
+
+def toggle_like(user, post_id):
+    '''
+    Переключает лайк пользователя одним запросом.
+    Возвращает (likes_count, is_liked) или None, если пост не найден или не виден пользователю.
+    '''
+    sql = TOGGLE_LIKE_SQL.format(
+        post=connection.ops.quote_name(Post._meta.db_table),
+        like=connection.ops.quote_name(Like._meta.db_table),
+        visible='TRUE' if user.is_staff else VISIBLE_TO_USER_SQL,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'post_id': post_id, 'user_id': user.pk})
+        return cursor.fetchone()
@@ -0,0 +1,67 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.pagination import PostFeedCursorPagination
+from core.images import VARIANT_FORMATS, open_original, render_variant, variant_widths
+
+
+class Command(BaseCommand):
+    help = 'Байты картинок на страницу ленты: оригиналы обложек против вариантов (core.images); варианты кодируются в памяти'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=10)
+        parser.add_argument('--page-size', type=int, default=PostFeedCursorPagination.page_size)
+        parser.add_argument('--width', type=int, default=640, help='Ширина варианта, который выберет карточка (по srcset)')
+        parser.add_argument('--source', choices=['auto', 'db', 'media'], default='auto',
+                            help='Обложки опубликованных постов в порядке ленты или файлы MEDIA_ROOT/posts/covers')
+
+    def handle(self, *args, **options):
+        if options['width'] not in variant_widths('cover'):
+            self.stderr.write(f'Width {options["width"]} is not one of the cover variants {variant_widths("cover")}')
+            return
+        limit = options['pages'] * options['page_size']
+        names = self.feed_covers(limit) if options['source'] != 'media' else []
+        if not names and options['source'] != 'db':
+            names = self.media_covers(limit)
+            self.stdout.write('No covers in the feed, using files from MEDIA_ROOT/posts/covers')
+        if not names:
+            self.stdout.write('No cover images found')
+            return
+
+        original_bytes = 0
+        variant_bytes = dict.fromkeys(VARIANT_FORMATS, 0)
+        started = time.perf_counter()
+        for name in names:
+            original_bytes += default_storage.size(name)
+            image = open_original(name)
+            for fmt in VARIANT_FORMATS:
+                variant_bytes[fmt] += len(render_variant(image, options['width'], fmt))
+        elapsed = time.perf_counter() - started
+
+        pages = max(1, -(-len(names) // options['page_size']))
+        self.stdout.write(f'{len(names)} covers, {pages} pages of {options["page_size"]}, variant width {options["width"]}px '
+                          f'(encoded in {elapsed / len(names) * 1000:.0f} ms/image)')
+        self.stdout.write(f'{"":>10} {"KiB/page":>10} {"vs original":>12}')
+        self.stdout.write(f'{"original":>10} {original_bytes / pages / 1024:>10.1f} {"":>12}')
+        for fmt, total in variant_bytes.items():
+            self.stdout.write(f'{fmt:>10} {total / pages / 1024:>10.1f} {original_bytes / total:>11.1f}x')
+
+    def feed_covers(self, limit):
+        return list(Post.objects
+                    .filter(status='published')
+                    .exclude(cover_image='')
+                    .exclude(cover_image__isnull=True)
+                    .order_by('-created_at', '-id')
+                    .values_list('cover_image', flat=True)[:limit])
+
+    def media_covers(self, limit):
+        directory = os.path.join(settings.MEDIA_ROOT, 'posts', 'covers')
+        if not os.path.isdir(directory):
+            return []
+        entries = sorted(entry.name for entry in os.scandir(directory) if entry.is_file() and '.w' not in entry.name)
+        return [f'posts/covers/{name}' for name in entries][:limit]
@@ -0,0 +1,98 @@
+import random
+import statistics
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import Ingredient, Post, PostIngredient
+from blog.pantry import PantryIndex, rank_posts_sql
+from users.models import CustomUser
+
+
+def _ms(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f'p50={statistics.median(samples) * 1000:.2f}ms p95={p95 * 1000:.2f}ms'
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк поиска «что приготовить»: индекс в памяти против SQL GROUP BY'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Сгенерировать N рецептов (откатываются после замера)')
+        parser.add_argument('--ingredients', type=int, default=2000, help='Размер словаря ингредиентов при --seed')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--pantry-size', type=int, default=6, help='Ингредиентов в одном запросе')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'], options['ingredients'])
+            self.run(options['queries'], options['pantry_size'])
+            if options['seed']:
+                transaction.set_rollback(True)
+
+    def run(self, queries, pantry_size):
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        if not ingredient_ids:
+            self.stdout.write('No ingredients — nothing to benchmark (use --seed).')
+            return
+
+        index = PantryIndex()
+        started = time.perf_counter()
+        index.build()
+        build_time = time.perf_counter() - started
+        postings_bytes = sum(sys.getsizeof(p) for p in index._postings.values())
+        self.stdout.write(
+            f'index: {len(index._post_ingredients)} recipes, {len(index._postings)} ingredients, '
+            f'build {build_time * 1000:.0f}ms, postings ~{postings_bytes / 1024:.0f}KiB'
+        )
+
+        # Популярные ингредиенты встречаются в запросах чаще — берём из начала словаря
+        weights = [1 / (i + 1) for i in range(len(ingredient_ids))]
+        index_times, sql_times, mismatches = [], [], 0
+        for _ in range(queries):
+            pantry = set(random.choices(ingredient_ids, weights=weights, k=pantry_size))
+
+            started = time.perf_counter()
+            from_index = index.rank(pantry)
+            index_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            from_sql = rank_posts_sql(pantry)
+            sql_times.append(time.perf_counter() - started)
+
+            if from_index != [tuple(r) for r in from_sql]:
+                mismatches += 1
+
+        self.stdout.write(f'in-memory index: {_ms(index_times)}')
+        self.stdout.write(f'SQL GROUP BY:    {_ms(sql_times)}')
+        style = self.style.SUCCESS if not mismatches else self.style.ERROR
+        self.stdout.write(style(f'result mismatches: {mismatches}/{queries}'))
+
+    def seed(self, count, vocabulary):
+        author = CustomUser.objects.create_user(
+            username=f'pantry_seed_{random.randint(0, 10 ** 9)}',
+            email=f'pantry_seed_{random.randint(0, 10 ** 9)}@example.com',
+            password=None,
+        )
+        tag = random.randint(0, 10 ** 9)
+        ingredients = Ingredient.objects.bulk_create(
+            [Ingredient(name=f'seed-{tag}-{i}') for i in range(vocabulary)]
+        )
+        weights = [1 / (i + 1) for i in range(vocabulary)]
+        batch_size = 5000
+        for start in range(0, count, batch_size):
+            posts = Post.objects.bulk_create([
+                Post(author=author, title=f'Seed recipe {i}', excerpt='seed', content='seed',
+                     status='published', post_type='recipe')
+                for i in range(start, min(start + batch_size, count))
+            ])
+            rows = []
+            for post in posts:
+                chosen = set(random.choices(ingredients, weights=weights, k=random.randint(3, 15)))
+                rows.extend(PostIngredient(post=post, ingredient=ing, quantity='1') for ing in chosen)
+            PostIngredient.objects.bulk_create(rows)
+        self.stdout.write(f'Seeded {count} recipes over {vocabulary} ingredients')
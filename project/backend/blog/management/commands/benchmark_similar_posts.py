@@ -0,0 +1,75 @@
+import resource
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from blog.similarity import build_feature_matrix, compute_neighbours, update_neighbours
+
+
+def _zipf_pairs(rng, posts, per_post, features):
+    # Частоты признаков по Ципфу: несколько очень популярных тегов/ингредиентов, длинный хвост редких
+    weights = 1.0 / np.arange(1, features + 1)
+    counts = rng.poisson(per_post, size=posts) + 1
+    post_ids = np.repeat(np.arange(1, posts + 1), counts)
+    return np.column_stack([post_ids, rng.choice(features, size=len(post_ids), p=weights / weights.sum())])
+
+
+class Command(BaseCommand):
+    help = 'Время и память пакетного расчёта похожих постов (blog.similarity) на синтетических данных, без БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=3000)
+        parser.add_argument('--users', type=int, default=50000)
+        parser.add_argument('--dirty', type=float, default=0.01, help='Доля постов с изменившимися тегами для инкрементального прохода')
+        parser.add_argument('--max-df', type=float, default=None, help='Отсечка частых признаков (по умолчанию SIMILAR_POSTS_MAX_DF; 1 — без отсечки)')
+        parser.add_argument('--top-k', type=int, default=20)
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        posts, k, chunk_size = options['posts'], options['top_k'], options['chunk_size']
+        post_ids = np.arange(1, posts + 1, dtype=np.int64)
+        blocks = {
+            'tags': _zipf_pairs(rng, posts, 3, options['tags']),
+            'ingredients': _zipf_pairs(rng, posts, 7, options['ingredients']),
+            'likers': _zipf_pairs(rng, posts, 4, options['users']),
+        }
+        self.stdout.write(f'{posts} posts, pairs: ' + ', '.join(f'{name} {len(pairs)}' for name, pairs in blocks.items()))
+
+        started = time.perf_counter()
+        matrix = build_feature_matrix(post_ids, blocks, max_df=options['max_df'])
+        self.stdout.write(f'feature matrix: {matrix.shape[0]}x{matrix.shape[1]}, nnz {matrix.nnz}, {time.perf_counter() - started:.2f}s')
+
+        started = time.perf_counter()
+        existing = compute_neighbours(matrix, post_ids, np.arange(posts), k, chunk_size)
+        full_time = time.perf_counter() - started
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(f'full top-{k}: {full_time:.1f}s ({full_time / posts * 1e6:.0f} us/post), max RSS {peak:.0f} MiB (chunk {chunk_size})')
+
+        # Инкрементальный проход: у доли постов поменялись теги
+        dirty_rows = np.sort(rng.choice(posts, size=max(1, int(posts * options['dirty'])), replace=False))
+        dirty_ids = set(post_ids[dirty_rows].tolist())
+        tags = blocks['tags']
+        changed = np.isin(tags[:, 0], post_ids[dirty_rows])
+        tags[changed, 1] = rng.choice(options['tags'], size=int(changed.sum()))
+        matrix = build_feature_matrix(post_ids, blocks, max_df=options['max_df'])
+
+        started = time.perf_counter()
+        updated = update_neighbours(matrix, post_ids, dirty_rows, existing, k, chunk_size)
+        incremental_time = time.perf_counter() - started
+        self.stdout.write(
+            f'incremental ({len(dirty_rows)} changed posts): {incremental_time:.2f}s, '
+            f'{len(updated)} rows rewritten ({len(updated) - len(dirty_ids)} of unchanged posts), '
+            f'{full_time / incremental_time:.0f}x faster than full'
+        )
+
+        # Точность инкрементального прохода против полного пересчёта на тех же данных
+        sample = rng.choice(posts, size=min(posts, 2000), replace=False)
+        merged = {**existing, **updated}
+        exact = compute_neighbours(matrix, post_ids, np.sort(sample), k, chunk_size)
+        overlap = np.mean([len(set(exact[post_id][0]) & set(merged[post_id][0])) / max(len(exact[post_id][0]), 1) for post_id in exact])
+        self.stdout.write(f'top-{k} overlap with a full recompute on {len(exact)} sampled posts: {overlap:.1%}')
@@ -0,0 +1,66 @@
+import gc
+import tracemalloc
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from blog.hll import HyperLogLog
+
+
+def _measure(fill):
+    # Память, которую занимает заполненный LocMemCache (ключи, pickle-значения, сроки жизни)
+    gc.collect()
+    tracemalloc.start()
+    cache = LocMemCache('benchmark-view-sketch', {'OPTIONS': {'MAX_ENTRIES': 10 ** 9}})
+    result = fill(cache)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    cache.clear()
+    return used, result
+
+
+class Command(BaseCommand):
+    help = 'Память и точность дедупликации просмотров: ключ на зрителя против HyperLogLog-скетча на пост'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--viewers', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+        parser.add_argument('--posts', type=int, default=10, help='Число постов, у каждого --viewers зрителей')
+
+    def handle(self, *args, **options):
+        posts = options['posts']
+        error = HyperLogLog().error_bound
+        self.stdout.write(f'HLL: {HyperLogLog().m} registers, relative standard error ±{error:.2%} (±{2 * error:.2%} for ~95% of estimates)')
+        self.stdout.write(f'Memory for {posts} posts:')
+        self.stdout.write(f'{"viewers/post":>13} {"keys, KiB":>11} {"sketch, KiB":>12} {"ratio":>7} {"estimate err":>13} {"counted err":>12}')
+
+        for viewers in options['viewers']:
+            key_bytes, _ = _measure(lambda cache: self.fill_keys(cache, posts, viewers))
+            sketch_bytes, (estimates, counted) = _measure(lambda cache: self.fill_sketches(cache, posts, viewers))
+            estimate_err = max(abs(e - viewers) / viewers for e in estimates)
+            counted_err = max(abs(c - viewers) / viewers for c in counted)
+            self.stdout.write(
+                f'{viewers:>13} {key_bytes / 1024:>11.0f} {sketch_bytes / 1024:>12.0f} '
+                f'{key_bytes / sketch_bytes:>6.1f}x {estimate_err:>12.2%} {counted_err:>11.2%}'
+            )
+
+    def fill_keys(self, cache, posts, viewers):
+        # Старая схема: pv:{post}:{viewer} на каждого зрителя каждого поста
+        for post_id in range(posts):
+            for viewer in range(viewers):
+                cache.add(f'pv:{post_id}:a{viewer:032x}', 1, timeout=21600)
+
+    def fill_sketches(self, cache, posts, viewers):
+        # Новая схема (blog.view_counter.register_unique_view): скетч на пост и окно
+        estimates, counted = [], []
+        for post_id in range(posts):
+            key = f'pvh:{post_id}:0'
+            views = 0
+            for viewer in range(viewers):
+                sketch = HyperLogLog.from_bytes(cache.get(key))
+                before = sketch.count()
+                if sketch.add(f'a{post_id:08x}{viewer:024x}'):
+                    cache.set(key, sketch.to_bytes(), timeout=21600)
+                    views += max(0, int(sketch.count()) - int(before))
+            estimates.append(HyperLogLog.from_bytes(cache.get(key)).count())
+            counted.append(views)
+        return estimates, counted
@@ -0,0 +1,69 @@
+import itertools
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from blog.signals import IMAGE_FIELDS
+from core.images import delete_variants
+from core.storage import ContentAddressedStorage, blob_prefix, rebuild_blob_refcounts
+
+
+class Command(BaseCommand):
+    help = 'Перенести загруженные раньше изображения в blob-хранилище (core.storage): одинаковые файлы сливаются в один, ссылки в БД переписываются'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, сколько места освободится')
+        parser.add_argument('--batch-size', type=int, default=200, help='Файлов на транзакцию')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('STORAGES["default"] must be core.storage.ContentAddressedStorage')
+
+        files = missing = 0
+        replaced = set()
+        bytes_before = 0
+        blob_sizes = {}
+        for model, (field, _) in IMAGE_FIELDS.items():
+            names = (model.objects
+                     .exclude(**{f'{field}__isnull': True})
+                     .exclude(**{field: ''})
+                     .exclude(**{f'{field}__startswith': f'{blob_prefix()}/'})
+                     .order_by()
+                     .values_list(field, flat=True)
+                     .distinct()
+                     .iterator(chunk_size=options['batch_size']))
+            while batch := list(itertools.islice(names, options['batch_size'])):
+                moved = {}
+                for name in batch:
+                    if not default_storage.exists(name):
+                        missing += 1
+                        self.stderr.write(f'{model.__name__}.{field}: missing file {name}')
+                        continue
+                    size = default_storage.size(name)
+                    blob = default_storage.content_name(name) if options['dry_run'] else default_storage.ingest(name)
+                    files += 1
+                    bytes_before += size
+                    blob_sizes[blob] = size
+                    moved[name] = blob
+                if options['dry_run'] or not moved:
+                    continue
+                with transaction.atomic():
+                    for old, new in moved.items():
+                        # В обход сигналов: счётчики ссылок пересчитываются целиком в конце
+                        model.objects.filter(**{field: old}).update(**{field: new})
+                replaced.update(moved)
+
+        # Исходники и их варианты — когда ссылки на них переписаны во всех полях
+        for name in replaced:
+            delete_variants(name)
+            default_storage.delete(name)
+        if not options['dry_run']:
+            blobs = rebuild_blob_refcounts([(model, field) for model, (field, _) in IMAGE_FIELDS.items()])
+            self.stdout.write(f'Blob reference counts rebuilt: {blobs} blobs')
+        bytes_after = sum(blob_sizes.values())
+        verb = 'would be' if options['dry_run'] else 'were'
+        self.stdout.write(self.style.SUCCESS(
+            f'{files} files {verb} stored as {len(blob_sizes)} blobs: '
+            f'{bytes_before / 2 ** 20:.1f} MiB -> {bytes_after / 2 ** 20:.1f} MiB; missing files: {missing}'
+        ))
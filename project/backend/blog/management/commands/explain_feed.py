@@ -0,0 +1,163 @@
+import random
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.http import HttpRequest, QueryDict
+from rest_framework.request import Request
+
+from blog.models import Post, Tag
+from blog.pagination import PostFeedCursorPagination
+from blog.search import refresh_search_vectors
+from blog.tagging import refresh_tag_slugs
+from blog.views import PostViewSet
+from users.models import CustomUser
+
+SEED_TAGS = ['breakfast', 'lunch', 'dinner', 'dessert', 'baking', 'soup', 'salad', 'vegan']
+
+# Варианты ленты — те же query params, что шлёт фронт в /api/blog/posts/, и кто смотрит:
+# аноним (только опубликованные), автор (опубликованные или свои), staff (без фильтра по статусу)
+FEED_VARIANTS = [
+    ('latest', {}, 'anonymous'),
+    ('likes', {'ordering': '-likes'}, 'anonymous'),
+    ('views', {'ordering': '-views'}, 'anonymous'),
+    ('post_type', {'post_type': 'recipe'}, 'anonymous'),
+    ('max_time', {'max_time': '30'}, 'anonymous'),
+    ('max_calories', {'max_calories': '400'}, 'anonymous'),
+    ('tags_relevance', {'tags': 'breakfast,dinner', 'ordering': 'relevance'}, 'anonymous'),
+    ('latest_authenticated', {}, 'authenticated'),
+    ('likes_authenticated', {'ordering': '-likes'}, 'authenticated'),
+    ('views_authenticated', {'ordering': '-views'}, 'authenticated'),
+    ('post_type_authenticated', {'post_type': 'recipe'}, 'authenticated'),
+    ('latest_staff', {}, 'staff'),
+    ('likes_staff', {'ordering': '-likes'}, 'staff'),
+    ('views_staff', {'ordering': '-views'}, 'staff'),
+    ('post_type_staff', {'post_type': 'recipe'}, 'staff'),
+]
+
+INDEX_SCAN_RE = re.compile(r'Index (?:Only )?Scan(?: Backward)? using (\w+)|Bitmap Index Scan on (\w+)')
+SEQ_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN ANALYZE для каждого варианта ленты постов (проверка использования индексов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Сгенерировать N постов перед EXPLAIN')
+        parser.add_argument('--keep', action='store_true', help='Не откатывать сгенерированные данные')
+        parser.add_argument('--as-user', type=int,
+                            help='ID пользователя для вариантов authenticated (по умолчанию — любой не staff)')
+        parser.add_argument('--variant', action='append', help='Только указанные варианты (можно несколько)')
+        parser.add_argument('--verbose-plan', action='store_true', help='Печатать полный план')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('explain_feed работает только с PostgreSQL')
+
+        user = None
+        if options['as_user']:
+            user = CustomUser.objects.filter(pk=options['as_user']).first()
+            if not user:
+                raise CommandError(f'User {options["as_user"]} not found')
+
+        variants = FEED_VARIANTS
+        if options['variant']:
+            variants = [v for v in FEED_VARIANTS if v[0] in options['variant']]
+
+        with transaction.atomic():
+            author = self.seed(options['seed']) if options['seed'] else None
+            if user is None:
+                # Обычный зритель с немногими своими постами; автор сгенерированных видит их все
+                user = CustomUser.objects.filter(is_staff=False).exclude(pk=getattr(author, 'pk', None)).first() or author
+            # Staff без сохранения: важен только is_staff, фильтр по статусу не применяется
+            staff = CustomUser(username='explain_staff', is_staff=True)
+            audiences = {'anonymous': None, 'authenticated': user, 'staff': staff}
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE blog_post')
+                cursor.execute('ANALYZE blog_post_tags')
+
+            for name, params, audience in variants:
+                if audiences[audience] is None and audience != 'anonymous':
+                    self.stdout.write(self.style.WARNING(f'== {name}: no user, skipped (use --as-user or --seed)'))
+                    continue
+                self.explain_variant(name, params, audiences[audience], options['verbose_plan'])
+
+            if options['seed'] and not options['keep']:
+                transaction.set_rollback(True)
+                self.stdout.write('Seeded data rolled back (use --keep to commit it).')
+
+    def explain_variant(self, name, params, user, verbose):
+        http_request = HttpRequest()
+        http_request.method = 'GET'
+        http_request.GET = QueryDict(mutable=True)
+        http_request.GET.update(params)
+        request = Request(http_request)
+        if user:
+            request.user = user
+
+        view = PostViewSet(request=request, format_kwarg=None, kwargs={}, action='list')
+        queryset = view.get_queryset()[:PostFeedCursorPagination.page_size + 1]
+        plan = queryset.explain(analyze=True, buffers=True)
+
+        indexes = sorted({a or b for a, b in INDEX_SCAN_RE.findall(plan)})
+        seq_scans = sorted(set(SEQ_SCAN_RE.findall(plan)))
+        timing = re.search(r'Execution Time: ([\d.]+) ms', plan)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'== {name} {params or ""}'))
+        self.stdout.write(f'  indexes:   {", ".join(indexes) or "-"}')
+        if 'blog_post' in seq_scans:
+            self.stdout.write(self.style.WARNING('  seq scan:  blog_post'))
+        if timing:
+            self.stdout.write(f'  exec time: {timing.group(1)} ms')
+        if verbose:
+            self.stdout.write(plan)
+
+    def seed(self, count):
+        author = CustomUser.objects.create_user(
+            username=f'explain_seed_{random.randint(0, 10 ** 9)}',
+            email=f'explain_seed_{random.randint(0, 10 ** 9)}@example.com',
+            password=None,
+        )
+        tags = []
+        for tag_name in SEED_TAGS:
+            tag, _ = Tag.objects.get_or_create(name=tag_name)
+            tags.append(tag)
+
+        statuses = ['published'] * 8 + ['draft', 'archived']
+        batch_size = 5000
+        through = Post.tags.through
+        for start in range(0, count, batch_size):
+            posts = Post.objects.bulk_create([
+                Post(
+                    author=author,
+                    title=f'Seed post {i}',
+                    excerpt='seed',
+                    content='seed',
+                    status=random.choice(statuses),
+                    post_type=random.choice(['recipe', 'recipe', 'article']),
+                    likes_count=int(random.paretovariate(1.5)) - 1,
+                    views_count=int(random.paretovariate(1.2) * 10),
+                    cooking_time=random.randint(5, 180),
+                    calories=random.randint(50, 1500),
+                )
+                for i in range(start, min(start + batch_size, count))
+            ])
+            through.objects.bulk_create([
+                through(post_id=post.id, tag_id=tag.id)
+                for post in posts
+                for tag in random.sample(tags, random.randint(0, 3))
+            ])
+            # bulk_create не шлёт post_save/m2m_changed — денормализованные поля заполняем сами,
+            # иначе фильтр по тегам и поиск работают на пустом множестве
+            seeded = Post.objects.filter(pk__in=[post.id for post in posts])
+            refresh_tag_slugs(seeded)
+            refresh_search_vectors(seeded)
+
+        # auto_now_add не даёт задать created_at в bulk_create — разносим даты отдельным UPDATE
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE blog_post SET created_at = now() - random() * interval '730 days' WHERE author_id = %s",
+                [author.id],
+            )
+        self.stdout.write(f'Seeded {count} posts for {author.username}')
+        return author
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.signals import IMAGE_FIELDS
+from core.media_gc import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Найти (или с --delete удалить) файлы в MEDIA_ROOT, на которые не ссылаются посты, шаги и аватары'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Удалять; без флага — только отчёт')
+        parser.add_argument('--grace', type=int, default=None, help='Не трогать файлы моложе N секунд (по умолчанию MEDIA_GC_GRACE)')
+        parser.add_argument('--state', default=None, help='Файл позиции: прерванный проход продолжится с неё')
+        parser.add_argument('--max-rate', type=float, default=0, help='Не больше N файлов в секунду (0 — без ограничения)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Кандидатов на одну перепроверку в БД')
+        parser.add_argument('--checkpoint-every', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        grace = options['grace'] if options['grace'] is not None else getattr(settings, 'MEDIA_GC_GRACE', 24 * 60 * 60)
+        on_orphan = (lambda name, size: self.stdout.write(f'{name} {size}')) if options['verbosity'] > 1 else None
+        stats = collect_garbage(
+            settings.MEDIA_ROOT,
+            [(model, field) for model, (field, _) in IMAGE_FIELDS.items()],
+            grace,
+            delete=options['delete'],
+            state_path=options['state'],
+            max_rate=options['max_rate'],
+            batch_size=options['batch_size'],
+            checkpoint_every=options['checkpoint_every'],
+            on_orphan=on_orphan,
+        )
+        if stats['resumed']:
+            self.stdout.write(f'Resumed from {options["state"]}')
+        self.stdout.write(f'Scanned {stats["scanned"]} files: {stats["referenced"]} referenced, {stats["recent"]} newer than {grace}s')
+        verb = 'deleted' if options['delete'] else 'found'
+        self.stdout.write(self.style.SUCCESS(
+            f'Orphans {verb}: {stats["deleted"] if options["delete"] else stats["orphans"]} '
+            f'({stats["orphan_bytes"] / 2 ** 20:.1f} MiB)'
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from blog.notifications import process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Разослать письма о новых постах из очереди PostNotification; --loop — работать постоянно'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Не выходить, опрашивать очередь раз в --interval секунд')
+        parser.add_argument('--interval', type=float, default=5)
+        parser.add_argument('--limit', type=int, default=None, help='Не больше N уведомлений за проход')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_outbox(limit=options['limit'])
+            if processed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Notifications processed: {processed}'))
+            if not options['loop']:
+                break
+            close_old_connections()
+            if not processed:
+                time.sleep(options['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.storage import purge_released_blobs
+
+
+class Command(BaseCommand):
+    help = 'Удалить файлы blob (core.storage), на которые дольше MEDIA_BLOB_GRACE нет ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=None, help='Секунд без ссылок до удаления (по умолчанию MEDIA_BLOB_GRACE)')
+
+    def handle(self, *args, **options):
+        purged = purge_released_blobs(grace=options['grace'])
+        self.stdout.write(self.style.SUCCESS(f'Blobs purged: {purged}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.search import refresh_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать search_vector постов (например, после смены POST_SEARCH_CONFIG)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        total = 0
+        while True:
+            batch = list(Post.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            total += refresh_search_vectors(Post.objects.filter(pk__in=batch))
+            last_id = batch[-1]
+        self.stdout.write(self.style.SUCCESS(f'Search vectors rebuilt: {total}'))
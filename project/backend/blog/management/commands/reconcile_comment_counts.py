@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from blog.comments import reconcile_comments_count
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Сверить Post.comments_count с фактическим числом комментариев и исправить расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        fixed = 0
+        while True:
+            batch = list(Post.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            fixed += reconcile_comments_count(Post.objects.filter(pk__in=batch))
+            last_id = batch[-1]
+        self.stdout.write(self.style.SUCCESS(f'Posts with corrected comments_count: {fixed}'))
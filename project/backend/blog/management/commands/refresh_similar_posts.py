@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blog.similarity import refresh_similar_posts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать похожие посты (/posts/{id}/similar/): по умолчанию только изменившиеся, --full — все'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Пересчитать все опубликованные посты (подтягивает и изменения лайков)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Строк в одном матричном произведении')
+
+    def handle(self, *args, **options):
+        written, removed = refresh_similar_posts(full=options['full'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Similar posts rows written: {written}, removed: {removed}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from blog.trending import refresh_trending_scores
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать трендовый рейтинг постов с изменёнными счётчиками (ленту ?ordering=trending); '
+            'запускать по расписанию, например раз в 5 минут')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--full', action='store_true', help='Пересчитать все посты окна, а не только изменённые')
+
+    def handle(self, *args, **options):
+        updated, removed = refresh_trending_scores(batch_size=options['batch_size'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Trending scores updated: {updated}, removed: {removed}'))
@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from blog.models import Post, RecipeStep
+from core.images import generate_variants
+from users.models import CustomUser
+
+# Вид варианта -> (модель, поле изображения)
+SOURCES = {
+    'cover': (Post, 'cover_image'),
+    'step': (RecipeStep, 'image'),
+    'avatar': (CustomUser, 'avatar'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Построить (или с --force перестроить) варианты изображений обложек, шагов и аватаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(SOURCES), action='append', help='Только указанные виды (можно несколько раз)')
+        parser.add_argument('--force', action='store_true', help='Перезаписать существующие варианты')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        kinds = options['kind'] or sorted(SOURCES)
+        written = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for kind in kinds:
+                model, field = SOURCES[kind]
+                names = (model.objects
+                         .exclude(**{f'{field}__isnull': True})
+                         .exclude(**{field: ''})
+                         .order_by()
+                         .values_list(field, flat=True)
+                         .distinct()
+                         .iterator(chunk_size=500))
+                futures = {name: executor.submit(generate_variants, name, kind, force=options['force']) for name in names}
+                for name, future in futures.items():
+                    try:
+                        written += future.result()
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f'{kind} {name}: {exc!r}')
+        self.stdout.write(self.style.SUCCESS(f'Variant files written: {written}, failed originals: {failed}'))
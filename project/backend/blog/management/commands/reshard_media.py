@@ -0,0 +1,86 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+
+from blog.models import COVER_UPLOAD_DIR, STEP_IMAGE_UPLOAD_DIR, Post, RecipeStep
+from core.models import MovedMedia
+from core.storage import move_media_file, resharded_name
+from users.models import AVATAR_UPLOAD_DIR, CustomUser
+
+# Модель, поле изображения, каталог upload_to
+SOURCES = [
+    (Post, 'cover_image', COVER_UPLOAD_DIR),
+    (RecipeStep, 'image', STEP_IMAGE_UPLOAD_DIR),
+    (CustomUser, 'avatar', AVATAR_UPLOAD_DIR),
+]
+
+
+class Command(BaseCommand):
+    help = 'Перенести загруженные файлы из плоских каталогов в раскладку MEDIA_UPLOAD_FANOUT (ab/cd/) пачками; старые URL редиректят на новые'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Строк на пачку')
+        parser.add_argument('--sleep', type=float, default=0, help='Пауза между пачками, секунд — чтобы не забивать диск и БД')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        moved = skipped = 0
+        for model, field, directory in SOURCES:
+            max_length = model._meta.get_field(field).max_length
+            last_pk = 0
+            while True:
+                # Keyset по pk: пачка не зависит от уже переименованных строк, прерванный запуск просто повторяется
+                rows = list(model.objects
+                            .filter(pk__gt=last_pk, **{f'{field}__startswith': f'{directory}/'})
+                            .order_by('pk')
+                            .values_list('pk', field)[:options['batch_size']])
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                renames = {}
+                for _, name in rows:
+                    new_name = resharded_name(directory, name)
+                    if new_name is None or name in renames:
+                        continue
+                    if len(new_name) > max_length:
+                        skipped += 1
+                        self.stderr.write(f'{model.__name__}.{field}: {new_name} is longer than {max_length}, left in place')
+                        continue
+                    renames[name] = new_name
+                if not renames:
+                    continue
+                if options['dry_run']:
+                    moved += len(renames)
+                    continue
+                moved_batch, skipped_batch = self.move_batch(model, field, renames)
+                moved += moved_batch
+                skipped += skipped_batch
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+        verb = 'would be moved' if options['dry_run'] else 'moved'
+        self.stdout.write(self.style.SUCCESS(f'Files {verb}: {moved}, skipped: {skipped}'))
+
+    def move_batch(self, model, field, renames):
+        # Редиректы — до переноса: пока строки в БД ещё со старыми именами, старый URL уже ведёт на новый файл
+        MovedMedia.objects.bulk_create(
+            [MovedMedia(old_name=old, new_name=new) for old, new in renames.items()],
+            update_conflicts=True, unique_fields=['old_name'], update_fields=['new_name'],
+        )
+        done = {}
+        for old, new in renames.items():
+            if move_media_file(old, new, default_storage):
+                done[old] = new
+            else:
+                self.stderr.write(f'{model.__name__}.{field}: {new} already exists, {old} left in place')
+        if done:
+            with transaction.atomic():
+                # Одним UPDATE на пачку; условие по старому имени — строку, которую успели поменять, не трогаем
+                model.objects.filter(**{f'{field}__in': list(done)}).update(**{field: Case(
+                    *[When(**{field: old}, then=Value(new)) for old, new in done.items()],
+                    output_field=models.CharField(),
+                )})
+        MovedMedia.objects.filter(old_name__in=[old for old in renames if old not in done]).delete()
+        return len(done), len(renames) - len(done)
@@ -0,0 +1,94 @@
+import re
+import socketserver
+import threading
+
+from django.core.management.base import BaseCommand
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    # Минимальный диалог SMTP, которого хватает smtplib: письма принимаются и никуда не уходят
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        self.reply('220 smtp-sink ready')
+        recipients = []
+        while line := self.rfile.readline():
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 smtp-sink')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.partition(':')[2].strip().strip('<>')
+                if server.refuse and server.refuse.search(address):
+                    self.reply('550 Mailbox unavailable')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while (data := self.rfile.readline()) and data != b'.\r\n':
+                    pass
+                with server.lock:
+                    server.attempts += 1
+                    dropped = server.fail_every and server.attempts % server.fail_every == 0
+                    if not dropped:
+                        server.messages.extend(recipients)
+                if dropped:
+                    # Обрыв до ответа — клиент обязан повторить письмо
+                    return
+                self.reply('250 OK queued')
+                server.on_message(recipients)
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    '''
+    Локальная заглушка SMTP для проверки рассылки без реального сервера:
+    fail_every — рвать соединение на каждом N-м письме, refuse — регулярное выражение отклоняемых адресов.
+    '''
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, fail_every=0, refuse=None, on_message=None):
+        super().__init__(address, SMTPSinkHandler)
+        self.fail_every = fail_every
+        self.refuse = re.compile(refuse) if refuse else None
+        self.on_message = on_message or (lambda recipients: None)
+        self.lock = threading.Lock()
+        self.attempts = 0
+        self.messages = []
+
+
+class Command(BaseCommand):
+    help = 'Локальная заглушка SMTP для проверки рассылки; запускать сайт/воркер с EMAIL_SMTP_SINK=127.0.0.1:1025'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+        parser.add_argument('--fail-every', type=int, default=0, help='Рвать соединение на каждом N-м письме (0 — никогда)')
+        parser.add_argument('--refuse', default='', help='Регулярное выражение адресов, которые сервер отклоняет (550)')
+        parser.add_argument('--quiet', action='store_true')
+
+    def handle(self, *args, **options):
+        on_message = None if options['quiet'] else (lambda recipients: self.stdout.write(f'accepted: {", ".join(recipients)}'))
+        server = SMTPSink((options['host'], options['port']), options['fail_every'], options['refuse'], on_message)
+        self.stdout.write(f'SMTP sink on {options["host"]}:{options["port"]}, Ctrl+C to stop')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(self.style.SUCCESS(f'Messages accepted: {len(server.messages)}, delivery attempts: {server.attempts}'))
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:27
+
+import blog.models
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не блокирует запись в blog_post и не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("blog", "0002_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="post",
+            name="cover_image",
+            field=models.ImageField(
+                blank=True, null=True, upload_to=blog.models.cover_upload_to
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipestep",
+            name="image",
+            field=models.ImageField(
+                blank=True, null=True, upload_to=blog.models.step_image_upload_to
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["-created_at", "-id"],
+                name="post_pub_created_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["-likes_count", "-id"],
+                name="post_pub_likes_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["-views_count", "-id"],
+                name="post_pub_views_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["post_type", "-created_at", "-id"],
+                name="post_pub_type_created_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["cooking_time"],
+                name="post_pub_cooking_time_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["calories"],
+                name="post_pub_calories_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "-created_at"], name="post_author_created_idx"
+            ),
+        ),
+    ]
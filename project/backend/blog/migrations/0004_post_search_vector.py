@@ -0,0 +1,66 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:29
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Вектор на момент миграции (как blog.search.build_search_vector тогда) — своей копией SQL,
+# чтобы миграция не зависела от того, как модуль поиска изменится потом
+BACKFILL_SQL = '''
+UPDATE blog_post p SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, coalesce(p.title, '')), 'A')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(t.name, ' ') FROM blog_post_tags pt JOIN blog_tag t ON t.id = pt.tag_id
+        WHERE pt.post_id = p.id), '')), 'B')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT concat(u.username, ' ', u.display_name) FROM users_customuser u
+        WHERE u.id = p.author_id), '')), 'B')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce(p.excerpt, '')), 'B')
+    || setweight(to_tsvector(%(config)s::regconfig, regexp_replace(coalesce(p.content, ''), '<[^>]+>', ' ', 'g')), 'C')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(s.description, ' ') FROM blog_recipestep s
+        WHERE s.post_id = p.id), '')), 'D')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(i.name, ' ') FROM blog_postingredient pi JOIN blog_ingredient i ON i.id = pi.ingredient_id
+        WHERE pi.post_id = p.id), '')), 'D')
+WHERE p.id = ANY(%(ids)s)
+'''
+
+
+def backfill_search_vectors(apps, schema_editor):
+    Post = apps.get_model("blog", "Post")
+    config = getattr(settings, "POST_SEARCH_CONFIG", "russian")
+    ids = list(Post.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), BACKFILL_BATCH_SIZE):
+        batch = ids[start : start + BACKFILL_BATCH_SIZE]
+        schema_editor.execute(BACKFILL_SQL, {"config": config, "ids": batch})
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("blog", "0003_post_feed_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="post_search_vector_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:34
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# Слаги тегов поста на момент миграции (как blog.tagging.refresh_tag_slugs) — своей копией SQL
+BACKFILL_TAG_SLUGS_SQL = '''
+UPDATE blog_post p SET tag_slugs = coalesce((
+    SELECT array_agg(DISTINCT t.slug ORDER BY t.slug)
+    FROM blog_post_tags pt JOIN blog_tag t ON t.id = pt.tag_id
+    WHERE pt.post_id = p.id AND t.slug <> ''
+), '{}')
+WHERE EXISTS (SELECT 1 FROM blog_post_tags pt WHERE pt.post_id = p.id)
+'''
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("blog", "0005_trigram_name_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="tag_slugs",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.CharField(max_length=100),
+                blank=True,
+                default=list,
+                editable=False,
+                size=None,
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["tag_slugs"], name="post_tag_slugs_idx"
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_TAG_SLUGS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0006_post_tag_slugs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostDailyViewers",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("sketch", models.BinaryField(default=bytes)),
+                ("unique_viewers", models.PositiveIntegerField(default=0)),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_viewers",
+                        to="blog.post",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("post", "day")},
+            },
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+COPY_LIKES_SQL = """
+INSERT INTO blog_like (user_id, post_id, created_at)
+SELECT customuser_id, post_id, now() FROM blog_post_liked_by ORDER BY id
+ON CONFLICT (user_id, post_id) DO NOTHING
+"""
+
+DROP_AUTO_THROUGH_SQL = "DROP TABLE blog_post_liked_by"
+
+RESTORE_AUTO_THROUGH_SQL = """
+CREATE TABLE blog_post_liked_by (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    post_id bigint NOT NULL REFERENCES blog_post (id) DEFERRABLE INITIALLY DEFERRED,
+    customuser_id bigint NOT NULL REFERENCES users_customuser (id) DEFERRABLE INITIALLY DEFERRED,
+    UNIQUE (post_id, customuser_id)
+);
+CREATE INDEX blog_post_liked_by_post_id_fb9fd74f ON blog_post_liked_by (post_id);
+CREATE INDEX blog_post_liked_by_customuser_id_a859ea66 ON blog_post_liked_by (customuser_id);
+INSERT INTO blog_post_liked_by (post_id, customuser_id) SELECT post_id, user_id FROM blog_like ORDER BY id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0007_post_daily_viewers"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Like",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="likes",
+                        to="blog.post",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="likes",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="like",
+            index=models.Index(
+                fields=["user", "-created_at"], name="like_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="like",
+            index=models.Index(
+                fields=["post", "-created_at"], name="like_post_created_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="like",
+            unique_together={("user", "post")},
+        ),
+        # Старые лайки без времени: created_at = момент миграции, порядок сохраняется через id
+        migrations.RunSQL(
+            sql=COPY_LIKES_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="post",
+                    name="liked_by",
+                    field=models.ManyToManyField(
+                        blank=True,
+                        related_name="liked_posts",
+                        through="blog.Like",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    sql=DROP_AUTO_THROUGH_SQL,
+                    reverse_sql=RESTORE_AUTO_THROUGH_SQL,
+                ),
+            ],
+        ),
+    ]
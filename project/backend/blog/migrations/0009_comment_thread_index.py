@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:05
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# До этой миграции comments_count нигде не обновлялся. Своя копия SQL
+# (как blog.comments.reconcile_comments_count): пишутся только расходящиеся строки
+BACKFILL_COMMENTS_COUNT_SQL = '''
+UPDATE blog_post p SET comments_count = actual.n
+FROM (
+    SELECT p2.id, count(c.id) AS n
+    FROM blog_post p2 LEFT JOIN blog_comment c ON c.post_id = p2.id
+    GROUP BY p2.id
+) actual
+WHERE actual.id = p.id AND p.comments_count <> actual.n
+'''
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("blog", "0008_like"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("parent_comment__isnull", True)),
+                fields=["post", "created_at", "id"],
+                name="comment_post_roots_idx",
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_COMMENTS_COUNT_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Лента ?ordering=trending не пуста сразу после миграции, до первого запуска команды.
+# Своя копия SQL рейтинга с весами по умолчанию; точные значения из настроек даст команда
+BACKFILL_TRENDING_SQL = '''
+INSERT INTO blog_posttrendingscore (post_id, score, computed_at)
+SELECT id,
+       (likes_count * 1.0 + comments_count * 2.0 + views_count * 0.05)
+       / power(GREATEST(EXTRACT(EPOCH FROM now() - created_at), 0) / 3600 + 2, 1.8),
+       now()
+FROM blog_post
+WHERE status = 'published' AND created_at >= now() - interval '14 days'
+ON CONFLICT (post_id) DO UPDATE SET score = EXCLUDED.score, computed_at = EXCLUDED.computed_at
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0009_comment_thread_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostTrendingScore",
+            fields=[
+                (
+                    "post",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="trending",
+                        serialize=False,
+                        to="blog.post",
+                    ),
+                ),
+                ("score", models.FloatField(default=0)),
+                ("computed_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["-score", "-post"], name="trending_score_idx")
+                ],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_TRENDING_SQL, migrations.RunSQL.noop),
+    ]
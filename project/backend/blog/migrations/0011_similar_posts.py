@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:15
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0010_post_trending_score"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarPosts",
+            fields=[
+                (
+                    "post",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="similar",
+                        serialize=False,
+                        to="blog.post",
+                    ),
+                ),
+                (
+                    "neighbours",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(), default=list, size=None
+                    ),
+                ),
+                (
+                    "scores",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.FloatField(), default=list, size=None
+                    ),
+                ),
+                ("stale_since", models.DateTimeField(blank=True, null=True)),
+                ("computed_at", models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:36
+
+import django.db.models.constraints
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0013_post_notification"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="recipestep",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="recipestep",
+            constraint=models.UniqueConstraint(
+                deferrable=django.db.models.constraints.Deferrable["DEFERRED"],
+                fields=("post", "order"),
+                name="recipestep_post_order_uniq",
+            ),
+        ),
+    ]
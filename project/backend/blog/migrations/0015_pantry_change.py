@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:23
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0014_recipestep_order_deferred"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PantryChange",
+            fields=[
+                (
+                    "generation",
+                    models.BigIntegerField(primary_key=True, serialize=False),
+                ),
+                (
+                    "post_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.BigIntegerField(), size=None
+                    ),
+                ),
+            ],
+        ),
+    ]
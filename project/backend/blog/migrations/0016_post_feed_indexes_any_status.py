@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:26
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CONCURRENTLY не блокирует запись в blog_post; новые индексы — до удаления старых,
+    # чтобы лента ни на миг не осталась без индекса
+    atomic = False
+
+    dependencies = [
+        ("blog", "0015_pantry_change"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(fields=["-created_at", "-id"], name="post_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(fields=["-likes_count", "-id"], name="post_likes_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(fields=["-views_count", "-id"], name="post_views_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                fields=["post_type", "-created_at", "-id"], name="post_type_created_idx"
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="post",
+            name="post_pub_created_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="post",
+            name="post_pub_likes_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="post",
+            name="post_pub_views_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="post",
+            name="post_pub_type_created_idx",
+        ),
+    ]
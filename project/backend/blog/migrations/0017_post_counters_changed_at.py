@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:35
+
+import django.utils.timezone
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# Рейтинг сменил формулу (log-очки + время публикации / tau) — пересчёт всех строк, чтобы
+# старые и новые значения не смешивались в одной ленте до первого запуска команды.
+# Своя копия SQL с весами и периодом полураспада по умолчанию
+RECOMPUTE_TRENDING_SQL = '''
+UPDATE blog_posttrendingscore s
+SET score = ln(1 + p.likes_count * 1.0 + p.comments_count * 2.0 + p.views_count * 0.05)
+            + EXTRACT(EPOCH FROM p.created_at) / (12 * 3600 / ln(2)),
+    computed_at = now()
+FROM blog_post p
+WHERE p.id = s.post_id
+'''
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("blog", "0016_post_feed_indexes_any_status"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="counters_changed_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                fields=["counters_changed_at"], name="post_counters_changed_idx"
+            ),
+        ),
+        migrations.RunSQL(RECOMPUTE_TRENDING_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:37
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0017_post_counters_changed_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="hometimeline",
+            name="post_ids",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.BigIntegerField(), default=list, size=None
+            ),
+        ),
+    ]
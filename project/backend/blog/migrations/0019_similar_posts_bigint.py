@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:37
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0018_home_timeline_bigint"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="similarposts",
+            name="neighbours",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.BigIntegerField(), default=list, size=None
+            ),
+        ),
+    ]
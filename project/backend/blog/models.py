@@ -1,25 +1,39 @@
 import os
 import uuid
 
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from django.utils.text import slugify
 
+from core.storage import sharded_upload_path
 from users.models import CustomUser
 
+COVER_UPLOAD_DIR = 'posts/covers'
+STEP_IMAGE_UPLOAD_DIR = 'posts/steps'
+
 
 def cover_upload_to(instance, filename):
     base, ext = os.path.splitext(filename)
-    return f'posts/covers/{slugify(base)[:60]}-{uuid.uuid4().hex[:8]}{ext.lower()}'
+    return sharded_upload_path(COVER_UPLOAD_DIR, f'{slugify(base)[:60]}-{uuid.uuid4().hex[:8]}{ext.lower()}')
 
 def step_image_upload_to(instance, filename):
     base, ext = os.path.splitext(filename)
-    return f'posts/steps/{slugify(base)[:50]}-{uuid.uuid4().hex[:8]}{ext.lower()}'
+    return sharded_upload_path(STEP_IMAGE_UPLOAD_DIR, f'{slugify(base)[:50]}-{uuid.uuid4().hex[:8]}{ext.lower()}')
 
 class Tag(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, blank=True)
     color = models.CharField(max_length=7, blank=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['name'], name='tag_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -31,6 +45,11 @@ class Tag(models.Model):
 class Ingredient(models.Model):
     name = models.CharField(max_length=255, unique=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['name'], name='ingredient_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -42,7 +61,11 @@ class RecipeStep(models.Model):
 
     class Meta:
         ordering = ['order']
-        unique_together = ('post', 'order')
+        constraints = [
+            # Проверка при коммите: blog.recipe_sync перенумеровывает шаги одним UPDATE,
+            # а немедленная проверка упала бы на промежуточном совпадении номеров
+            models.UniqueConstraint(fields=['post', 'order'], name='recipestep_post_order_uniq', deferrable=models.Deferrable.DEFERRED),
+        ]
 
     def __str__(self):
         return f'Step {self.order} for {self.post.title}'
@@ -83,18 +106,166 @@ class Post(models.Model):
         related_name='posts',
         blank=True
     )
-    liked_by = models.ManyToManyField(CustomUser, related_name='liked_posts', blank=True)
+    liked_by = models.ManyToManyField(CustomUser, through='Like', related_name='liked_posts', blank=True)
 
     likes_count = models.PositiveIntegerField(default=0)
     comments_count = models.PositiveIntegerField(default=0)
     views_count = models.PositiveIntegerField(default=0)
+    # Когда менялся любой из счётчиков — по нему blog.trending пересчитывает только изменённые посты
+    counters_changed_at = models.DateTimeField(default=timezone.now, editable=False)
 
     calories = models.PositiveIntegerField(null=True, blank=True)
     cooking_time = models.PositiveIntegerField(null=True, blank=True)
 
+    # Поддерживается blog.search (сигналы в blog.signals), вручную не редактируется
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Денормализованные слаги тегов для фильтра без JOIN (blog.tagging, синхронизация в blog.signals)
+    tag_slugs = ArrayField(models.CharField(max_length=100), default=list, blank=True, editable=False)
+
+    class Meta:
+        # Индексы повторяют формы запросов ленты (PostViewSet.get_queryset).
+        # Сортировочные — без условия по статусу: ими идут и аноним (status = 'published'),
+        # и автор (status = 'published' OR author_id = …), и staff (без фильтра), отбрасывая
+        # немногие неопубликованные строки по пути. Частичный индекс годился бы только анониму
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+            models.Index(fields=['-likes_count', '-id'], name='post_likes_idx'),
+            models.Index(fields=['-views_count', '-id'], name='post_views_idx'),
+            models.Index(fields=['post_type', '-created_at', '-id'], name='post_type_created_idx'),
+            models.Index(fields=['cooking_time'], name='post_pub_cooking_time_idx', condition=Q(status='published')),
+            models.Index(fields=['calories'], name='post_pub_calories_idx', condition=Q(status='published')),
+            # Свои посты (в т.ч. черновики) и профиль автора
+            models.Index(fields=['author', '-created_at'], name='post_author_created_idx'),
+            models.Index(fields=['counters_changed_at'], name='post_counters_changed_idx'),
+            GinIndex(fields=['search_vector'], name='post_search_vector_idx'),
+            GinIndex(fields=['tag_slugs'], name='post_tag_slugs_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+class Like(models.Model):
+    '''Лайк с временем — для ленты «понравившееся» по времени лайка. Переключается в blog.likes.'''
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='likes')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='like_user_created_idx'),
+            models.Index(fields=['post', '-created_at'], name='like_post_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} ♥ {self.post_id}'
+
+class PostDailyViewers(models.Model):
+    '''
+    Уникальные зрители поста за день: HyperLogLog-скетч (blog.hll, 1 КиБ) и его оценка.
+    Пополняется пачками из blog.view_counter, ошибка оценки ~3.25%.
+    '''
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='daily_viewers')
+    day = models.DateField()
+    sketch = models.BinaryField(default=bytes, editable=False)
+    unique_viewers = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'day')
+
+    def __str__(self):
+        return f'{self.post_id} @ {self.day}: ~{self.unique_viewers}'
+
+class PostTrendingScore(models.Model):
+    '''
+    Предрасчитанный «трендовый» рейтинг опубликованного поста (blog.trending).
+    Пересчитывается командой refresh_trending_scores (только посты с изменёнными счётчиками)
+    и при публикации / снятии с публикации; лента читает готовые значения.
+    '''
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    score = models.FloatField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        # Топ-N ленты ?ordering=trending — в порядке сортировки
+        indexes = [
+            models.Index(fields=['-score', '-post'], name='trending_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.3f}'
+
+class SimilarPosts(models.Model):
+    '''
+    Top-k похожих опубликованных постов (по тегам, ингредиентам и лайкнувшим), по убыванию сходства.
+    Считается пакетно в blog.similarity; stale_since — когда после расчёта поменялись теги или ингредиенты.
+    '''
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='similar')
+    neighbours = ArrayField(models.BigIntegerField(), default=list)
+    scores = ArrayField(models.FloatField(), default=list)
+    stale_since = models.DateTimeField(null=True, blank=True)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.post_id} ~ {self.neighbours[:5]}'
+
+class PantryChange(models.Model):
+    '''
+    Журнал изменений индекса «что приготовить» (blog.pantry): поколение и id изменённых им постов.
+    Поколения выдаются подряд, в порядке коммита; процессы догоняют по журналу свои индексы в памяти.
+    '''
+    generation = models.BigIntegerField(primary_key=True)
+    post_ids = ArrayField(models.BigIntegerField())
+
+    def __str__(self):
+        return f'{self.generation}: {len(self.post_ids)} posts'
+
+class HomeTimeline(models.Model):
+    '''
+    Лента подписок пользователя: id последних опубликованных постов авторов, на которых он
+    подписан, по убыванию, не больше TIMELINE_MAX_LENGTH. Пополняется при публикации (blog.timeline);
+    строка создаётся при первом чтении ленты и удаляется при смене подписок.
+    '''
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='home_timeline')
+    post_ids = ArrayField(models.BigIntegerField(), default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.user_id}: {len(self.post_ids)} posts'
+
+class PostNotification(models.Model):
+    '''
+    Письма подписчикам о публикации поста — очередь (outbox) в той же транзакции, что и публикация.
+    Рассылает команда process_post_notifications (blog.notifications); last_recipient_id — курсор
+    по подписчикам (последний, кому письмо ушло или был отказ), после сбоя рассылка продолжается с него.
+    '''
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='notifications')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_recipient_id = models.BigIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='notification_due_idx', condition=Q(status__in=['pending', 'sending'])),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.status} ({self.sent_count} sent)'
+
 class PostIngredient(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
@@ -113,5 +284,11 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     parent_comment = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies')
 
+    class Meta:
+        indexes = [
+            # Корневые комментарии поста для keyset-пагинации дерева (CommentThreadView)
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_roots_idx', condition=Q(parent_comment__isnull=True)),
+        ]
+
     def __str__(self):
         return f'Comment by {self.author.username}'
@@ -0,0 +1,176 @@
+import datetime
+import itertools
+import logging
+import smtplib
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from users.models import CustomUser
+
+from .models import Post, PostNotification
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_post_notification(post):
+    '''
+    Ставит рассылку о публикации в очередь. Строка пишется в транзакции публикации —
+    уведомление не теряется и не уходит, если публикация откатилась; сама рассылка — в воркере.
+    '''
+    return PostNotification.objects.create(post=post)
+
+
+def build_post_email(post):
+    author = post.author
+    author_name = author.display_name or author.username
+    type_label = 'рецепт' if post.post_type == 'recipe' else 'статью'
+    frontend_base = getattr(settings, 'FRONTEND_BASE_URL', '').rstrip('/')
+    link = f'{frontend_base}/posts/{post.id}'
+    excerpt = (post.excerpt or '')[:200]
+    subject = f'Новый пост: {post.title} — {author_name}'
+
+    text_body = f'''Здравствуйте!
+
+Пользователь {author_name} опубликовал новый {type_label}.
+
+{post.title}
+{excerpt}
+
+Смотреть: {link}
+
+Если вы больше не хотите получать эти письма — отпишитесь от пользователя на сайте.
+'''
+    return subject, text_body
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def send_chunk(connection, recipients, subject, body):
+    '''
+    Отправляет пачку писем через открытое соединение, по письму на получателя; после каждого
+    получателя отдаёт (id, доставлено) — вызывающий двигает курсор по одному письму.
+    Отказ сервера принять адрес — окончательный, получатель пропускается; обрыв соединения
+    и прочие ошибки SMTP — повтор с того же письма через BACKOFF * 2^n секунд на новом соединении.
+    После NOTIFICATION_SEND_RETRIES повторов ошибка пробрасывается.
+    '''
+    retries = getattr(settings, 'NOTIFICATION_SEND_RETRIES', 3)
+    backoff = getattr(settings, 'NOTIFICATION_RETRY_BACKOFF', 2)
+    failures = 0
+    position = 0
+    while position < len(recipients):
+        recipient_id, email = recipients[position]
+        try:
+            # Уже открытое соединение не переоткрывается
+            connection.open()
+            connection.send_messages([EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [email], connection=connection)])
+        except smtplib.SMTPRecipientsRefused:
+            yield recipient_id, False
+        except (smtplib.SMTPException, OSError):
+            failures += 1
+            if failures > retries:
+                raise
+            connection.close()
+            time.sleep(backoff * 2 ** (failures - 1))
+            continue
+        else:
+            yield recipient_id, True
+        position += 1
+        failures = 0
+
+
+def deliver(notification, connection):
+    '''
+    Рассылает уведомление подписчикам автора, начиная с курсора. Курсор сдвигается после каждого
+    письма и сохраняется после каждой пачки и при сбое — повтор не шлёт уже отправленное ещё раз.
+    '''
+    post = Post.objects.select_related('author').get(pk=notification.post_id)
+    if post.status != 'published':
+        notification.status = 'cancelled'
+        notification.save(update_fields=['status', 'updated_at'])
+        return
+
+    subject, body = build_post_email(post)
+    chunk_size = getattr(settings, 'NOTIFICATION_CHUNK_SIZE', 100)
+    # Адреса потоком, без загрузки пользователей целиком
+    recipients = (CustomUser.objects
+                  .filter(subscriptions=post.author_id, pk__gt=notification.last_recipient_id)
+                  .exclude(email='')
+                  .order_by('pk')
+                  .values_list('pk', 'email')
+                  .iterator(chunk_size=chunk_size))
+    for chunk in _chunks(recipients, chunk_size):
+        try:
+            for recipient_id, delivered in send_chunk(connection, chunk, subject, body):
+                notification.last_recipient_id = recipient_id
+                if delivered:
+                    notification.sent_count += 1
+                else:
+                    notification.failed_count += 1
+        finally:
+            # updated_at заодно продлевает аренду (NOTIFICATION_LEASE)
+            notification.save(update_fields=['last_recipient_id', 'sent_count', 'failed_count', 'updated_at'])
+
+    notification.status = 'sent'
+    notification.last_error = ''
+    notification.save(update_fields=['status', 'last_error', 'updated_at'])
+
+
+def claim_notification():
+    '''Берёт одно готовое к отправке уведомление; параллельные воркеры не получат одно и то же.'''
+    now = timezone.now()
+    lease = datetime.timedelta(seconds=getattr(settings, 'NOTIFICATION_LEASE', 600))
+    with transaction.atomic():
+        notification = (PostNotification.objects
+                        .select_for_update(skip_locked=True)
+                        .filter(Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', updated_at__lt=now - lease))
+                        .order_by('next_attempt_at', 'pk')
+                        .first())
+        if notification is not None:
+            notification.status = 'sending'
+            notification.save(update_fields=['status', 'updated_at'])
+    return notification
+
+
+def _postpone(notification, error):
+    notification.attempts += 1
+    notification.last_error = repr(error)
+    if notification.attempts >= getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5):
+        notification.status = 'failed'
+    else:
+        notification.status = 'pending'
+        delay = getattr(settings, 'NOTIFICATION_ATTEMPT_BACKOFF', 60) * 2 ** (notification.attempts - 1)
+        notification.next_attempt_at = timezone.now() + datetime.timedelta(seconds=delay)
+    notification.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'updated_at'])
+
+
+def process_outbox(limit=None):
+    '''
+    Рассылает готовые уведомления через одно SMTP-соединение на весь проход.
+    Возвращает число обработанных уведомлений.
+    '''
+    processed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        while limit is None or processed < limit:
+            notification = claim_notification()
+            if notification is None:
+                break
+            try:
+                deliver(notification, connection)
+            except (smtplib.SMTPException, OSError) as exc:
+                logger.warning('Post notification %s postponed: %r', notification.pk, exc)
+                connection.close()
+                _postpone(notification, exc)
+            processed += 1
+    finally:
+        connection.close()
+    return processed
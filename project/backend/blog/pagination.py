@@ -1,4 +1,14 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class SmallPageNumberPagination(PageNumberPagination):
@@ -11,3 +21,168 @@ class AdminPageNumberPagination(PageNumberPagination):
     page_size = 8
     page_size_query_param = 'page_size'
     max_page_size = 50
+
+
+def _encode_value(value):
+    # DjangoJSONEncoder обрезает микросекунды — для keyset-сравнения нужна точная метка
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Unsupported cursor value: {type(value).__name__}')
+
+
+class KeysetCursorPagination(BasePagination):
+    '''
+    Keyset-пагинация по текущему order_by queryset'а.
+    - Курсор непрозрачный (base64 JSON) и хранит значения ключей сортировки
+      последней/первой записи страницы, а не номер страницы.
+    - Нет COUNT(*) и OFFSET: каждая страница — WHERE (ключи) < (курсор) LIMIT n+1.
+    - Курсор привязан к сортировке: курсор от ?ordering=likes не применится к ?ordering=views.
+    '''
+    page_size = 4
+    page_size_query_param = 'page_size'
+    max_page_size = 20
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+        self.keys = [(o.lstrip('-'), o.startswith('-')) for o in self.ordering]
+
+        cursor = self.decode_cursor(request, queryset.model)
+        self.reverse = bool(cursor and cursor['reverse'])
+        if cursor:
+            queryset = queryset.filter(self.build_filter(cursor['position'], self.reverse))
+        if self.reverse:
+            queryset = queryset.order_by(*[self._invert(o) for o in self.ordering])
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw:
+            try:
+                size = int(raw)
+            except (TypeError, ValueError):
+                size = 0
+            if size > 0:
+                return min(size, self.max_page_size)
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        ordering = [o for o in queryset.query.order_by if isinstance(o, str)]
+        if not ordering:
+            ordering = ['-pk']
+        # Последний ключ обязан быть уникальным, иначе курсор нестабилен на равных значениях
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering.append('-id')
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def build_filter(self, position, reverse):
+        # (a, b) < (x, y) для смешанных направлений: a < x OR (a = x AND b < y)
+        condition = Q()
+        for i, (name, desc) in enumerate(self.keys):
+            if reverse:
+                desc = not desc
+            clause = Q(**{f'{name}__lt' if desc else f'{name}__gt': position[i]})
+            for prev_i, (prev_name, _) in enumerate(self.keys[:i]):
+                clause &= Q(**{prev_name: position[prev_i]})
+            condition |= clause
+        return condition
+
+    def encode_cursor(self, obj, reverse):
+        payload = {
+            'o': self.ordering,
+            'p': [getattr(obj, 'pk' if name == 'pk' else name) for name, _ in self.keys],
+            'r': int(reverse),
+        }
+        raw = json.dumps(payload, default=_encode_value, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+            payload = json.loads(raw)
+            if payload['o'] != self.ordering or len(payload['p']) != len(self.keys):
+                raise ValueError('ordering mismatch')
+            position = [self._to_python(model, name, value) for (name, _), value in zip(self.keys, payload['p'])]
+            return {'position': position, 'reverse': bool(payload.get('r'))}
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _to_python(model, name, value):
+        try:
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Аннотация (например matched_tags) — значение уже JSON-совместимое
+            return value
+        return field.to_python(value)
+
+    @staticmethod
+    def _invert(ordering):
+        return ordering[1:] if ordering.startswith('-') else f'-{ordering}'
+
+
+class PostFeedCursorPagination(KeysetCursorPagination):
+    page_size = SmallPageNumberPagination.page_size
+    max_page_size = SmallPageNumberPagination.max_page_size
+
+
+class CommentThreadCursorPagination(KeysetCursorPagination):
+    # Страница — корневые комментарии; ответы к ним догружаются целиком до заданной глубины
+    page_size = 10
+    max_page_size = 50
@@ -0,0 +1,197 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from .models import PantryChange, Post, PostIngredient
+from .utils import schedule_post_batch
+
+# Отставание больше этого — перестройка целиком, а не чтение журнала; старые записи журнала удаляются
+CHANGE_LOG_MAX_GAP = 1000
+CHANGE_LOG_PRUNE_EVERY = 100
+# Ключ pg_advisory_xact_lock: поколения выдаются по одному, в порядке коммита
+CHANGE_LOG_LOCK_ID = 0x70616E747279
+
+
+def _indexed_rows(post_ids):
+    # В индекс попадают только опубликованные рецепты
+    return (PostIngredient.objects
+            .filter(post_id__in=post_ids, post__status='published', post__post_type='recipe')
+            .values_list('post_id', 'ingredient_id')
+            .distinct())
+
+
+def _indexed_post_id_chunks(chunk_size=2000):
+    # Keyset по id вместо серверного курсора: у курсора Postgres выбирает «быстрый старт»,
+    # и план с вложенными циклами на полном проходе оказывается на порядки медленнее
+    last_id = 0
+    while True:
+        chunk = list(Post.objects
+                     .filter(pk__gt=last_id, status='published', post_type='recipe')
+                     .order_by('pk')
+                     .values_list('pk', flat=True)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+class PantryIndex:
+    '''
+    Инвертированный индекс «ингредиент → отсортированный массив id рецептов» в памяти процесса.
+    - Строится лениво при первом запросе и перестраивается, если индекс старше PANTRY_INDEX_MAX_AGE.
+    - Изменения постов применяются точечно (refresh_posts) после коммита; каждое изменение
+      записывается в журнал PantryChange со следующим поколением. Другие процессы
+      применяют записи журнала от своего поколения до текущего; целиком перестраиваются,
+      только если отставание больше CHANGE_LOG_MAX_GAP (старые записи уже удалены).
+    '''
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._post_ingredients = {}
+        self._required = {}
+        self._built_at = None
+        self._generation = None
+
+    def build(self):
+        # Поколение — до чтения строк: изменения, закоммиченные во время сборки, догонит журнал
+        generation = current_generation()
+        postings = {}
+        post_ingredients = {}
+        for chunk in _indexed_post_id_chunks():
+            for post_id, ingredient_id in _indexed_rows(chunk):
+                post_ingredients.setdefault(post_id, set()).add(ingredient_id)
+        for post_id in sorted(post_ingredients):
+            for ingredient_id in post_ingredients[post_id]:
+                postings.setdefault(ingredient_id, array('q')).append(post_id)
+        with self._lock:
+            self._postings = postings
+            self._post_ingredients = {pid: frozenset(ids) for pid, ids in post_ingredients.items()}
+            self._required = {pid: len(ids) for pid, ids in post_ingredients.items()}
+            self._built_at = time.monotonic()
+            self._generation = generation
+
+    def ensure_fresh(self):
+        max_age = getattr(settings, 'PANTRY_INDEX_MAX_AGE', 300)
+        if self._built_at is None or time.monotonic() - self._built_at > max_age:
+            self.build()
+            return
+        generation = current_generation()
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation == self._generation or self._catch_up(generation):
+                return
+        self.build()
+
+    def refresh_posts(self, post_ids):
+        generation = log_change(post_ids)
+        with self._lock:
+            if self._built_at is not None:
+                # Через журнал — заодно с изменениями других процессов между нашими поколениями;
+                # не вышло — ensure_fresh перестроит индекс при следующем запросе
+                self._catch_up(generation)
+
+    def _catch_up(self, generation):
+        '''Применяет журнал от своего поколения до generation (под self._lock); False — журнала не хватает.'''
+        if self._generation is None or not 0 < generation - self._generation <= CHANGE_LOG_MAX_GAP:
+            return False
+        logged = list(PantryChange.objects
+                      .filter(generation__gt=self._generation, generation__lte=generation)
+                      .values_list('post_ids', flat=True))
+        if len(logged) != generation - self._generation:
+            return False
+        self._apply(set().union(*logged))
+        self._generation = generation
+        return True
+
+    def _apply(self, post_ids):
+        current = {}
+        for post_id, ingredient_id in _indexed_rows(post_ids):
+            current.setdefault(post_id, set()).add(ingredient_id)
+        with self._lock:
+            for post_id in post_ids:
+                old = self._post_ingredients.get(post_id, frozenset())
+                new = frozenset(current.get(post_id, ()))
+                for ingredient_id in old - new:
+                    postings = self._postings[ingredient_id]
+                    del postings[bisect_left(postings, post_id)]
+                for ingredient_id in new - old:
+                    insort(self._postings.setdefault(ingredient_id, array('q')), post_id)
+                if new:
+                    self._post_ingredients[post_id] = new
+                    self._required[post_id] = len(new)
+                else:
+                    self._post_ingredients.pop(post_id, None)
+                    self._required.pop(post_id, None)
+
+    def rank(self, ingredient_ids):
+        '''
+        [(post_id, matched, required)] по убыванию покрытия (matched / required),
+        затем по числу недостающих ингредиентов.
+        '''
+        self.ensure_fresh()
+        with self._lock:
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self._postings.get(ingredient_id, ()))
+            required = self._required
+            rows = [(post_id, count, required[post_id]) for post_id, count in matched.items()]
+        rows.sort(key=lambda r: (-r[1] / r[2], r[2] - r[1], -r[1], -r[0]))
+        return rows
+
+    def missing(self, post_id, ingredient_ids):
+        with self._lock:
+            return sorted(self._post_ingredients.get(post_id, frozenset()) - set(ingredient_ids))
+
+
+def rank_posts_sql(ingredient_ids):
+    '''То же ранжирование через SQL GROUP BY — эталон для бенчмарка.'''
+    ingredient_ids = list(ingredient_ids)
+    return list(
+        PostIngredient.objects
+        .filter(post__status='published', post__post_type='recipe')
+        .values('post_id')
+        .annotate(
+            matched=Count('ingredient_id', filter=Q(ingredient_id__in=ingredient_ids), distinct=True),
+            required=Count('ingredient_id', distinct=True),
+        )
+        .filter(matched__gt=0)
+        .annotate(coverage=Cast(F('matched'), FloatField()) / F('required'))
+        .order_by('-coverage', F('required') - F('matched'), '-matched', '-post_id')
+        .values_list('post_id', 'matched', 'required')
+    )
+
+
+def current_generation():
+    # До первого изменения журнал пуст: 0, чтобы он догонялся и с первого поколения
+    return PantryChange.objects.order_by('-generation').values_list('generation', flat=True).first() or 0
+
+
+def log_change(post_ids):
+    '''
+    Запись в журнал со следующим поколением. Под advisory-блокировкой до коммита: поколение из
+    последовательности могло бы закоммититься позже следующего, и читатель, уже ушедший дальше, его пропустил бы.
+    '''
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CHANGE_LOG_LOCK_ID])
+        generation = current_generation() + 1
+        PantryChange.objects.create(generation=generation, post_ids=sorted(set(post_ids)))
+        if generation % CHANGE_LOG_PRUNE_EVERY == 0:
+            PantryChange.objects.filter(generation__lte=generation - CHANGE_LOG_MAX_GAP).delete()
+    return generation
+
+
+def schedule_pantry_refresh(post_ids):
+    schedule_post_batch('pantry', post_ids, pantry_index.refresh_posts)
+
+
+pantry_index = PantryIndex()
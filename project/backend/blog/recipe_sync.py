@@ -0,0 +1,161 @@
+from django.db import transaction
+
+from core.images import schedule_variants
+from core.storage import ContentAddressedStorage, release_blobs, retain_blobs
+
+from .models import PostIngredient, RecipeStep
+from .pantry import schedule_pantry_refresh
+from .response_cache import schedule_generation_bump
+from .search import schedule_search_vector_refresh
+from .similarity import schedule_similar_refresh
+
+# Разница с текущими строками считается в памяти и пишется пачкой: один DELETE ... WHERE id IN
+# (QuerySet.delete — с выборкой строк и post_delete на каждую), один UPDATE ... CASE (bulk_update,
+# заодно перенумерация шагов) и один INSERT (bulk_create). bulk_update и bulk_create не шлют post_save —
+# их работу из blog.signals (поисковый вектор, кладовая, похожие, поколение кеша, blob и варианты
+# изображений) функции делают сами, раз на вызов.
+
+
+def _delete_rows(model, ids):
+    if ids:
+        model.objects.filter(pk__in=ids).delete()
+
+
+def _post_children_changed(post, pantry=False):
+    schedule_search_vector_refresh([post.pk])
+    schedule_generation_bump()
+    if pantry:
+        schedule_pantry_refresh([post.pk])
+        schedule_similar_refresh([post.pk])
+
+
+def step_items(request, items):
+    '''validated_data шагов с файлами из multipart: изображение i-го шага — поле step_images_{i}.'''
+    files = request.FILES if request else {}
+    return [{**item, 'image': files.get(f'step_images_{index}')} for index, item in enumerate(items)]
+
+
+def sync_ingredients(post, items, replace=False):
+    '''
+    items — validated_data сериализаторов ингредиентов: без id — новая строка, с id — правка
+    (ingredient_id, quantity), с _delete — удаление; id чужого поста пропускаются.
+    replace — удалить и строки, которых нет в items. Возвращает созданные объекты.
+    '''
+    existing = {}
+    if replace or any(item.get('id') for item in items):
+        existing = {pi.id: pi for pi in PostIngredient.objects.filter(post=post)}
+    deleted = set(existing) if replace else set()
+    updated = {}
+    created = []
+    for item in items:
+        iid = item.get('id')
+        if not iid:
+            if not item.get('_delete'):
+                created.append(PostIngredient(post=post, ingredient_id=item['ingredient_id'], quantity=item['quantity']))
+            continue
+        obj = existing.get(iid)
+        if obj is None:
+            continue
+        if item.get('_delete'):
+            deleted.add(iid)
+            updated.pop(iid, None)
+            continue
+        deleted.discard(iid)
+        ingredient_id = item.get('ingredient_id') or obj.ingredient_id
+        quantity = item.get('quantity', obj.quantity)
+        if (ingredient_id, quantity) != (obj.ingredient_id, obj.quantity):
+            obj.ingredient_id, obj.quantity = ingredient_id, quantity
+            updated[iid] = obj
+
+    if not (deleted or updated or created):
+        return created
+    with transaction.atomic():
+        # Удаление первым освобождает (post, ingredient, quantity) для правок и новых строк
+        _delete_rows(PostIngredient, deleted)
+        if updated:
+            PostIngredient.objects.bulk_update(updated.values(), ['ingredient', 'quantity'])
+        if created:
+            PostIngredient.objects.bulk_create(created)
+        _post_children_changed(post, pantry=True)
+    return created
+
+
+def sync_steps(post, items, replace=False, existing=None):
+    '''
+    То же для шагов; item['image'] — загруженный файл шага или None. После записи шаги поста
+    пронумерованы 1..n в порядке (order из запроса, старые раньше новых, id) — номера из запроса
+    могут совпадать и иметь пропуски. existing — уже известные шаги поста (пустой список для
+    только что созданного), иначе выбираются с блокировкой строк.
+    Возвращает (все шаги поста по порядку, созданные шаги).
+    '''
+    field = RecipeStep._meta.get_field('image')
+    counts_blobs = isinstance(field.storage, ContentAddressedStorage)
+    with transaction.atomic():
+        if existing is None:
+            existing = post.steps.select_for_update().order_by('order', 'id')
+        existing = {step.id: step for step in existing}
+        original = {sid: (step.order, step.description, step.image.name) for sid, step in existing.items()}
+        deleted = set(existing) if replace else set()
+        created = []
+        for item in items:
+            sid = item.get('id')
+            image = item.get('image')
+            if not sid:
+                if not item.get('_delete'):
+                    created.append(RecipeStep(post=post, order=item['order'], description=item['description'], image=image or None))
+                continue
+            step = existing.get(sid)
+            if step is None:
+                continue
+            if item.get('_delete'):
+                deleted.add(sid)
+                continue
+            deleted.discard(sid)
+            step.order = item.get('order', step.order)
+            step.description = item.get('description', step.description)
+            if image:
+                step.image = image
+
+        kept = [step for sid, step in existing.items() if sid not in deleted]
+        steps = sorted(kept + created, key=lambda step: (step.order, step.pk is None, step.pk or 0))
+        for number, step in enumerate(steps, start=1):
+            step.order = number
+
+        updated = []
+        update_fields = set()
+        # blob удалённых шагов освобождает image_deleted (post_delete)
+        released = []
+        for step in kept:
+            order, description, image_name = original[step.id]
+            changed = set()
+            if step.order != order:
+                changed.add('order')
+            if step.description != description:
+                changed.add('description')
+            if step.image.name != image_name:
+                # bulk_update не вызывает pre_save: новый файл сохраняется в хранилище здесь
+                field.pre_save(step, add=False)
+                released.append(image_name)
+                changed.add('image')
+            if changed:
+                updated.append(step)
+                update_fields |= changed
+        if not (deleted or updated or created):
+            return steps, created
+
+        _delete_rows(RecipeStep, deleted)
+        if updated:
+            RecipeStep.objects.bulk_update(updated, sorted(update_fields))
+        if created:
+            # bulk_create сохраняет файлы сам (FileField.pre_save в INSERT)
+            RecipeStep.objects.bulk_create(created)
+
+        uploaded = [step.image for step in created if step.image]
+        uploaded += [step.image for step in updated if step.image.name != original[step.id][2]]
+        for image in uploaded:
+            schedule_variants(image, 'step')
+        if counts_blobs:
+            retain_blobs([image.name for image in uploaded])
+            release_blobs([name for name in released if name])
+        _post_children_changed(post)
+    return steps, created
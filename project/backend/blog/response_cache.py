@@ -0,0 +1,133 @@
+import datetime
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .utils import bump_cache_generation, get_cache_generation
+
+GENERATION_CACHE_KEY = 'content:generation'
+# Сколько секунд один запрос может пересчитывать устаревшую запись, пока остальные получают старую
+REVALIDATE_LOCK_TIMEOUT = 30
+
+_pending = threading.local()
+
+
+def get_content_generation():
+    return get_cache_generation(GENERATION_CACHE_KEY)
+
+
+def get_content_changed_at(generation=None):
+    '''
+    Время последней смены поколения — Last-Modified для того, что зависит не только от самой строки.
+    Поколение и есть это время (нс), так что ETag и Last-Modified во всех процессах из одного значения.
+    '''
+    if generation is None:
+        generation = get_content_generation()
+    return datetime.datetime.fromtimestamp(generation / 1e9, tz=datetime.timezone.utc)
+
+
+def bump_content_generation():
+    return bump_cache_generation(GENERATION_CACHE_KEY)
+
+
+def schedule_generation_bump():
+    '''
+    Один инкремент поколения на транзакцию, после коммита:
+    синхронизация 30 шагов рецепта не должна давать 30 инкрементов.
+    '''
+    _pending.dirty = True
+    transaction.on_commit(_flush_generation_bump)
+
+
+def _flush_generation_bump():
+    if getattr(_pending, 'dirty', False):
+        _pending.dirty = False
+        bump_content_generation()
+
+
+class ListResponseCacheMixin:
+    '''
+    Кеш ответов list() для анонимов (и для всех, если cache_authenticated — ответ не зависит от пользователя).
+    - Ключ — нормализованные параметры из cache_query_params (лишние параметры не дробят кеш,
+      порядок значений в cache_set_params не важен).
+    - Запись свежая, пока совпадает поколение контента и не истёк RESPONSE_CACHE_TTL.
+    - Устаревшую запись пересчитывает один запрос, остальные в это время получают её же
+      (stale-while-revalidate, не дольше RESPONSE_CACHE_STALE_TTL).
+    - Счётчики из cache_live_fields не меняют поколение; в отданный из кеша ответ
+      они подставляются актуальными одним запросом по id.
+    '''
+    cache_scope = None
+    cache_authenticated = False
+    cache_query_params = ()
+    cache_set_params = ()
+    cache_live_model = None
+    cache_live_fields = ()
+
+    def list(self, request, *args, **kwargs):
+        parent_list = super().list
+        ttl = getattr(settings, 'RESPONSE_CACHE_TTL', 30)
+        if ttl <= 0 or (request.user.is_authenticated and not self.cache_authenticated):
+            return parent_list(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        generation = get_content_generation()
+        entry = cache.get(key)
+        lock_key = None
+        if entry is not None:
+            if entry['generation'] == generation and time.time() - entry['stored_at'] < ttl:
+                return self._cached_response(entry, 'HIT')
+            lock_key = f'{key}:lock'
+            if not cache.add(lock_key, 1, timeout=REVALIDATE_LOCK_TIMEOUT):
+                return self._cached_response(entry, 'STALE')
+
+        try:
+            response = parent_list(request, *args, **kwargs)
+            if response.status_code == 200:
+                stale_ttl = getattr(settings, 'RESPONSE_CACHE_STALE_TTL', 5 * 60)
+                cache.set(key, {'generation': generation, 'stored_at': time.time(), 'data': response.data}, timeout=ttl + stale_ttl)
+        finally:
+            if lock_key:
+                cache.delete(lock_key)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def get_response_cache_key(self, request):
+        params = {}
+        for name in self.cache_query_params:
+            value = request.query_params.get(name, '').strip()
+            if not value:
+                continue
+            if name in self.cache_set_params:
+                value = ','.join(sorted({item.strip() for item in value.split(',') if item.strip()}))
+            params[name] = value
+        # Ссылки next/previous и URL картинок абсолютные — хост входит в ключ
+        raw = json.dumps([request.build_absolute_uri(request.path), params], sort_keys=True)
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        return f'rc:{self.cache_scope}:{digest}'
+
+    def _cached_response(self, entry, state):
+        data = entry['data']
+        if self.cache_live_fields and getattr(settings, 'RESPONSE_CACHE_LIVE_COUNTERS', True):
+            self.overlay_live_fields(data)
+        response = Response(data)
+        response['X-Cache'] = state
+        return response
+
+    def overlay_live_fields(self, data):
+        items = data.get('results', []) if isinstance(data, dict) else data
+        ids = [item['id'] for item in items if 'id' in item]
+        fields = [name for name in self.cache_live_fields if items and name in items[0]]
+        if not ids or not fields:
+            return
+        live = {row['pk']: row for row in self.cache_live_model.objects.filter(pk__in=ids).values('pk', *fields)}
+        for item in items:
+            row = live.get(item.get('id'))
+            if row:
+                for name in fields:
+                    item[name] = row[name]
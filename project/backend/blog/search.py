@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db.models import F, FloatField, Func, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Cast, Concat
+from rest_framework.filters import BaseFilterBackend
+
+from .utils import schedule_post_batch
+
+
+def get_search_config():
+    return getattr(settings, 'POST_SEARCH_CONFIG', 'russian')
+
+
+class StripTags(Func):
+    # content хранится как HTML из редактора — теги не должны попадать в вектор и сниппет
+    function = 'regexp_replace'
+    template = "%(function)s(%(expressions)s, '<[^>]+>', ' ', 'g')"
+    output_field = TextField()
+
+
+def _joined(queryset, field):
+    return Subquery(
+        queryset.filter(post_id=OuterRef('pk'))
+        .values('post_id')
+        .annotate(text=StringAgg(field, ' '))
+        .values('text')[:1],
+        output_field=TextField(),
+    )
+
+
+def build_search_vector(post_model):
+    '''
+    Взвешенный tsvector поста. Связанные модели берутся из post_model,
+    поэтому функция работает и с историческими моделями в миграциях.
+    '''
+    config = get_search_config()
+    step_model = post_model._meta.get_field('steps').related_model
+    post_ingredient_model = post_model._meta.get_field('postingredient').related_model
+    tag_through = post_model._meta.get_field('tags').remote_field.through
+    user_model = post_model._meta.get_field('author').related_model
+
+    author_names = Subquery(
+        user_model.objects.filter(pk=OuterRef('author_id'))
+        .annotate(names=Concat('username', Value(' '), 'display_name', output_field=TextField()))
+        .values('names')[:1],
+        output_field=TextField(),
+    )
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector(_joined(tag_through.objects, 'tag__name'), weight='B', config=config)
+        + SearchVector(author_names, weight='B', config=config)
+        + SearchVector('excerpt', weight='B', config=config)
+        + SearchVector(StripTags('content'), weight='C', config=config)
+        + SearchVector(_joined(step_model.objects, 'description'), weight='D', config=config)
+        + SearchVector(_joined(post_ingredient_model.objects, 'ingredient__name'), weight='D', config=config)
+    )
+
+
+def refresh_search_vectors(queryset):
+    '''Пересчитывает search_vector одним UPDATE для всех постов queryset'а.'''
+    return queryset.update(search_vector=build_search_vector(queryset.model))
+
+
+def schedule_search_vector_refresh(post_ids):
+    '''
+    Откладывает пересчёт до коммита: сохранение рецепта с 30 шагами
+    даёт один UPDATE по посту, а не 30.
+    '''
+    schedule_post_batch('search_vector', post_ids, _refresh_pending)
+
+
+def _refresh_pending(post_ids):
+    from .models import Post
+    refresh_search_vectors(Post.objects.filter(pk__in=post_ids))
+
+
+class PostFullTextSearchFilter(BaseFilterBackend):
+    '''
+    Замена SearchFilter: ?search= ищет по search_vector (GIN), ранжирует ts_rank
+    и добавляет подсвеченный сниппет. Без явного ?ordering= сортирует по рангу.
+    '''
+    search_param = 'search'
+    headline_options = {
+        'start_sel': '<mark>',
+        'stop_sel': '</mark>',
+        'max_words': 30,
+        'min_words': 10,
+        'max_fragments': 2,
+    }
+
+    def get_search_query(self, request):
+        value = request.query_params.get(self.search_param, '')
+        return ' '.join(value.replace('\x00', '').split())
+
+    def filter_queryset(self, request, queryset, view):
+        text = self.get_search_query(request)
+        if not text:
+            return queryset
+
+        config = get_search_config()
+        query = SearchQuery(text, config=config, search_type='websearch')
+        queryset = queryset.filter(search_vector=query).annotate(
+            # real -> double precision: значение ранга должно точно совпадать при keyset-сравнении
+            search_rank=Cast(SearchRank(F('search_vector'), query), FloatField()),
+            search_snippet=SearchHeadline(
+                Concat('excerpt', Value(' '), StripTags('content'), output_field=TextField()),
+                query,
+                config=config,
+                **self.headline_options,
+            ),
+        )
+        if not request.query_params.get('ordering'):
+            queryset = queryset.order_by('-search_rank', '-id')
+        return queryset
@@ -3,9 +3,14 @@ import json
 from rest_framework import serializers
 from rest_framework.permissions import BasePermission
 
+from core.images import delete_variants, srcset
+from core.media_urls import MediaURLResolver
+from core.relations import ViewerRelations
+from core.serializers import SparseFieldsetMixin, split_query_list
 from users.serializers import UserSerializer  # <-- добавили импорт
 
 from .models import Comment, Ingredient, Post, PostIngredient, RecipeStep, Tag
+from .recipe_sync import step_items, sync_ingredients, sync_steps
 
 
 class IsAdmin(BasePermission):
@@ -32,17 +37,18 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 class RecipeStepSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = RecipeStep
-        fields = ['id','post','order','description','image','image_url']
+        fields = ['id','post','order','description','image','image_url','image_srcset']
         read_only_fields = ('post',)
 
     def get_image_url(self, obj):
-        request = self.context.get('request')
-        if obj.image and request:
-            return request.build_absolute_uri(obj.image.url)
-        return None
+        return MediaURLResolver.for_request(self.context.get('request')).file_url(obj.image)
+
+    def get_image_srcset(self, obj):
+        return srcset(obj.image, 'step', self.context.get('request'))
 
 class PostIngredientSerializer(serializers.ModelSerializer):
     ingredient = IngredientSerializer(read_only=True)
@@ -71,120 +77,7 @@ class StepDataSerializer(serializers.Serializer):
             data = json.loads(data)
         return super().to_internal_value(data)
 
-class PostSerializer(serializers.ModelSerializer):
-    author = UserSerializer(read_only=True)
-    tags = TagSerializer(many=True, read_only=True)
-    tag_ids = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
-        write_only=True,
-        required=False
-    )
-    is_liked = serializers.SerializerMethodField()
-    likes_count = serializers.IntegerField(read_only=True)
-    steps = RecipeStepSerializer(many=True, read_only=True)
-    ingredients = PostIngredientSerializer(source='postingredient_set', many=True, read_only=True)
-    cover_image_url = serializers.SerializerMethodField()
-
-    # ДОБАВЛЕНО: поля для записи (nested update)
-    ingredient_data = IngredientDataSerializer(many=True, write_only=True, required=False)
-    step_data = StepDataSerializer(many=True, write_only=True, required=False)
-
-    class Meta:
-        model = Post
-        fields = [
-            'id','post_type','status','title','excerpt','content','cover_image',
-            'cover_image_url','created_at','updated_at','author','tags','tag_ids',
-            'likes_count','comments_count','views_count','calories','cooking_time',
-            'is_liked','steps','ingredients','ingredient_data','step_data'
-        ]
-        read_only_fields = [
-            'id','created_at','updated_at','author','likes_count',
-            'comments_count','views_count','is_liked','tags','steps','ingredients'
-        ]
-
-    def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        return obj.liked_by.filter(pk=request.user.pk).exists()
-
-    def get_cover_image_url(self, obj):
-        request = self.context.get('request')
-        if obj.cover_image and request:
-            return request.build_absolute_uri(obj.cover_image.url)
-        return None
-
-    def create(self, validated_data):
-        tag_ids = validated_data.pop('tag_ids', [])
-        ingredients_data = validated_data.pop('ingredient_data', [])
-        steps_data = validated_data.pop('step_data', [])
-        request = self.context.get('request')
-
-        post = super().create(validated_data)
-        if tag_ids:
-            post.tags.set(tag_ids)
-
-        for item in ingredients_data:
-            PostIngredient.objects.create(
-                post=post,
-                ingredient_id=item['ingredient_id'],
-                quantity=item['quantity']
-            )
-
-        for index, step in enumerate(steps_data):
-            step_image = request.FILES.get(f'step_images_{index}') if request else None
-            RecipeStep.objects.create(
-                post=post,
-                order=step['order'],
-                description=step['description'],
-                image=step_image
-            )
-        return post
-
-    def update(self, instance, validated_data):
-        tag_ids = validated_data.pop('tag_ids', None)
-        ingredients_data = validated_data.pop('ingredient_data', None)
-        steps_data = validated_data.pop('step_data', None)
-        request = self.context.get('request')
-
-        instance = super().update(instance, validated_data)
-
-        if tag_ids is not None:
-            instance.tags.set(tag_ids)
-
-        if ingredients_data is not None:
-            PostIngredient.objects.filter(post=instance).delete()
-            for item in ingredients_data:
-                PostIngredient.objects.create(
-                    post=instance,
-                    ingredient_id=item['ingredient_id'],
-                    quantity=item['quantity']
-                )
-
-        if steps_data is not None:
-            instance.steps.all().delete()
-            for index, step in enumerate(steps_data):
-                step_image = request.FILES.get(f'step_images_{index}') if request else None
-                RecipeStep.objects.create(  # <-- исправлено
-                    post=instance,
-                    order=step.get('order'),
-                    description=step.get('description'),
-                    image=step_image
-                )
-        # Удаление обложки
-        request = self.context.get('request')
-        if request:
-            # если фронт прислал явный флаг remove_cover = true
-            remove_cover = request.data.get('remove_cover')
-            if remove_cover in ('true', '1', True):
-                if instance.cover_image:
-                    instance.cover_image.delete(save=False)
-                instance.cover_image = None
-                instance.save(update_fields=['cover_image'])
-        return instance
-
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     post = serializers.PrimaryKeyRelatedField(read_only=True)
 
@@ -193,6 +86,21 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'post', 'author', 'content', 'created_at', 'parent_comment']
         read_only_fields = ['id', 'created_at', 'author', 'post']
 
+class CommentThreadSerializer(CommentSerializer):
+    '''Комментарий с вложенными ответами, заранее разложенными blog.comments.attach_replies.'''
+    replies = serializers.SerializerMethodField()
+    has_more_replies = serializers.SerializerMethodField()
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ['replies', 'has_more_replies']
+
+    def get_replies(self, obj):
+        return CommentThreadSerializer(getattr(obj, 'thread_replies', []), many=True, context=self.context).data
+
+    def get_has_more_replies(self, obj):
+        # Ответы есть, но не загружены — узел на границе глубины
+        return bool(getattr(obj, 'has_replies', False) and not getattr(obj, 'thread_replies', None))
+
 class PostIngredientCreateSerializer(serializers.ModelSerializer):
     ingredient_id = serializers.IntegerField(write_only=True)
 
@@ -240,7 +148,18 @@ class RecipeStepBulkSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Нельзя удалять без id')
         return attrs
 
-class PostSerializer(serializers.ModelSerializer):
+class PostListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        relations = ViewerRelations.for_request(self.context.get('request'))
+        fields = self.child.fields
+        if 'is_liked' in fields:
+            relations.load_posts([p.pk for p in posts])
+        if 'author' in fields and 'is_subscribed' in fields['author'].fields:
+            relations.load_users({p.author_id for p in posts})
+        return super().to_representation(posts)
+
+class PostSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     tag_ids = serializers.PrimaryKeyRelatedField(
@@ -254,6 +173,10 @@ class PostSerializer(serializers.ModelSerializer):
     steps = RecipeStepSerializer(many=True, read_only=True)
     ingredients = PostIngredientSerializer(source='postingredient_set', many=True, read_only=True)
     cover_image_url = serializers.SerializerMethodField()
+    cover_image_srcset = serializers.SerializerMethodField()
+    # Только при ?search= (аннотации PostFullTextSearchFilter), иначе поля не выводятся
+    search_rank = serializers.FloatField(read_only=True)
+    search_snippet = serializers.CharField(read_only=True)
 
     # ДОБАВЛЕНО: поля для записи (nested update)
     ingredient_data = IngredientDataSerializer(many=True, write_only=True, required=False)
@@ -263,26 +186,25 @@ class PostSerializer(serializers.ModelSerializer):
         model = Post
         fields = [
             'id','post_type','status','title','excerpt','content','cover_image',
-            'cover_image_url','created_at','updated_at','author','tags','tag_ids',
+            'cover_image_url','cover_image_srcset','created_at','updated_at','author','tags','tag_ids',
             'likes_count','comments_count','views_count','calories','cooking_time',
-            'is_liked','steps','ingredients','ingredient_data','step_data'
+            'is_liked','steps','ingredients','ingredient_data','step_data',
+            'search_rank','search_snippet'
         ]
         read_only_fields = [
             'id','created_at','updated_at','author','likes_count',
             'comments_count','views_count','is_liked','tags','steps','ingredients'
         ]
+        list_serializer_class = PostListSerializer
 
     def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        return obj.liked_by.filter(pk=request.user.pk).exists()
+        return ViewerRelations.for_request(self.context.get('request')).is_liked(obj)
 
     def get_cover_image_url(self, obj):
-        request = self.context.get('request')
-        if obj.cover_image and request:
-            return request.build_absolute_uri(obj.cover_image.url)
-        return None
+        return MediaURLResolver.for_request(self.context.get('request')).file_url(obj.cover_image)
+
+    def get_cover_image_srcset(self, obj):
+        return srcset(obj.cover_image, 'cover', self.context.get('request'))
 
     def create(self, validated_data):
         tag_ids = validated_data.pop('tag_ids', [])
@@ -294,21 +216,10 @@ class PostSerializer(serializers.ModelSerializer):
         if tag_ids:
             post.tags.set(tag_ids)
 
-        for item in ingredients_data:
-            PostIngredient.objects.create(
-                post=post,
-                ingredient_id=item['ingredient_id'],
-                quantity=item['quantity']
-            )
-
-        for index, step in enumerate(steps_data):
-            step_image = request.FILES.get(f'step_images_{index}') if request else None
-            RecipeStep.objects.create(
-                post=post,
-                order=step['order'],
-                description=step['description'],
-                image=step_image
-            )
+        if ingredients_data:
+            sync_ingredients(post, ingredients_data)
+        if steps_data:
+            sync_steps(post, step_items(request, steps_data), existing=[])
         return post
 
     # В update уберите полное удаление steps/ingredients если переходите на sync эндпоинты
@@ -349,7 +260,38 @@ class PostSerializer(serializers.ModelSerializer):
             remove_cover = request.data.get('remove_cover')
             if remove_cover in ('true', '1', True):
                 if instance.cover_image:
+                    delete_variants(instance.cover_image.name)
                     instance.cover_image.delete(save=False)
                 instance.cover_image = None
                 instance.save(update_fields=['cover_image'])
         return instance
+
+class PostCardSerializer(PostSerializer):
+    '''
+    Компактная карточка для лент: без content, шагов и ингредиентов (их можно запросить через ?expand=).
+    Queryset под карточку готовит setup_queryset — без тяжёлых колонок и лишних prefetch.
+    '''
+    MODEL_FIELDS = [
+        'id', 'post_type', 'status', 'title', 'excerpt', 'cover_image', 'created_at', 'updated_at',
+        'author', 'likes_count', 'comments_count', 'views_count', 'calories', 'cooking_time',
+    ]
+    AUTHOR_FIELDS = ['id', 'username', 'email', 'display_name', 'avatar', 'role', 'is_superuser']
+
+    class Meta(PostSerializer.Meta):
+        expandable_fields = ['content', 'steps', 'ingredients']
+
+    @classmethod
+    def setup_queryset(cls, queryset, request):
+        expand = split_query_list(request.query_params.get(cls.expand_query_param))
+        only = cls.MODEL_FIELDS + [f'author__{name}' for name in cls.AUTHOR_FIELDS]
+        prefetch = ['tags']
+        if 'content' in expand:
+            only.append('content')
+        if 'steps' in expand:
+            prefetch.append('steps')
+        if 'ingredients' in expand:
+            prefetch.append('postingredient_set__ingredient')
+        return (queryset.select_related('author')
+                .only(*only)
+                .prefetch_related(None)
+                .prefetch_related(*prefetch))
@@ -0,0 +1,210 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.images import schedule_variants
+from core.relations import bump_viewer_versions
+from core.storage import ContentAddressedStorage, release_blobs, retain_blobs
+from users.models import CustomUser
+
+from .comments import change_comments_count
+from .models import Comment, Ingredient, Post, PostIngredient, RecipeStep, Tag
+from .pantry import schedule_pantry_refresh
+from .response_cache import schedule_generation_bump
+from .search import schedule_search_vector_refresh
+from .similarity import schedule_similar_refresh
+from .tagging import refresh_tag_slugs
+from .timeline import drop_timelines
+from .trending import schedule_trending_refresh
+
+SEARCH_POST_FIELDS = {'title', 'excerpt', 'content', 'author', 'author_id'}
+SEARCH_USER_FIELDS = {'username', 'display_name'}
+PANTRY_POST_FIELDS = {'status', 'post_type'}
+# Счётчики обновляются без смены поколения кеша ответов — их подставляет сам кеш
+VOLATILE_POST_FIELDS = {'likes_count', 'comments_count', 'views_count'}
+CARD_USER_FIELDS = {'username', 'email', 'display_name', 'avatar', 'role', 'is_superuser'}
+
+
+def _touches(update_fields, fields):
+    return update_fields is None or bool(set(update_fields) & fields)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, update_fields=None, **kwargs):
+    if _touches(update_fields, SEARCH_POST_FIELDS):
+        schedule_search_vector_refresh([instance.pk])
+    if not created and _touches(update_fields, PANTRY_POST_FIELDS):
+        schedule_pantry_refresh([instance.pk])
+        schedule_similar_refresh([instance.pk])
+    if _touches(update_fields, {'status'}):
+        # Публикация и снятие с публикации — сразу; счётчики догонит refresh_trending_scores
+        schedule_trending_refresh([instance.pk])
+    if update_fields is None or set(update_fields) - VOLATILE_POST_FIELDS:
+        schedule_generation_bump()
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    schedule_pantry_refresh([instance.pk])
+    schedule_generation_bump()
+
+
+@receiver(post_save, sender=RecipeStep)
+@receiver(post_delete, sender=RecipeStep)
+@receiver(post_save, sender=PostIngredient)
+@receiver(post_delete, sender=PostIngredient)
+def post_child_changed(sender, instance, **kwargs):
+    schedule_search_vector_refresh([instance.post_id])
+    schedule_generation_bump()
+    if sender is PostIngredient:
+        schedule_pantry_refresh([instance.post_id])
+        schedule_similar_refresh([instance.post_id])
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # Каскад по parent_comment удаляет ответы по одному — каждый со своим сигналом
+    change_comments_count(instance.post_id, -1)
+
+
+def _tags_changed(post_ids):
+    post_ids = list(post_ids)
+    if post_ids:
+        refresh_tag_slugs(Post.objects.filter(pk__in=post_ids))
+        schedule_search_vector_refresh(post_ids)
+        schedule_similar_refresh(post_ids)
+        schedule_generation_bump()
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            # tag.posts.clear(): после очистки связи уже не найти
+            instance._cleared_post_ids = list(instance.posts.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _tags_changed([instance.pk])
+    elif action == 'post_clear':
+        _tags_changed(getattr(instance, '_cleared_post_ids', []))
+    else:
+        _tags_changed(pk_set or [])
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not created and _touches(update_fields, {'name', 'slug'}):
+        _tags_changed(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    # Каскадное удаление строк M2M не шлёт m2m_changed
+    instance._cleared_post_ids = list(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    _tags_changed(getattr(instance, '_cleared_post_ids', []))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not created and _touches(update_fields, {'name'}):
+        schedule_search_vector_refresh(instance.posts.values_list('pk', flat=True).distinct())
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def dictionary_changed(sender, **kwargs):
+    # Списки /tags/ и /ingredients/ тоже лежат в кеше ответов
+    schedule_generation_bump()
+
+
+@receiver(m2m_changed, sender=Post.liked_by.through)
+@receiver(m2m_changed, sender=CustomUser.subscribers.through)
+def viewer_relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # В обоих M2M зритель (лайкнувший / подписчик) — pk_set в прямом направлении и instance в обратном
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    user_ids = [instance.pk] if reverse else list(pk_set or [])
+    if user_ids:
+        transaction.on_commit(lambda: bump_viewer_versions(user_ids))
+
+
+@receiver(m2m_changed, sender=CustomUser.subscribers.through)
+def subscriptions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Ленты подписок подписчиков (как и в viewer_relations_changed: pk_set в прямом направлении)
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    follower_ids = [instance.pk] if reverse else list(pk_set or [])
+    if follower_ids:
+        transaction.on_commit(lambda: drop_timelines(follower_ids))
+
+
+# Поле изображения и набор его вариантов (core.images)
+IMAGE_FIELDS = {
+    Post: ('cover_image', 'cover'),
+    RecipeStep: ('image', 'step'),
+    CustomUser: ('avatar', 'avatar'),
+}
+
+
+def _counts_blobs(sender, field):
+    return isinstance(sender._meta.get_field(field).storage, ContentAddressedStorage)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=RecipeStep)
+@receiver(pre_save, sender=CustomUser)
+def image_pre_save(sender, instance, update_fields=None, **kwargs):
+    # Прежнее имя файла — для счётчика ссылок blob (core.storage); лишний запрос только при ContentAddressedStorage
+    field, _ = IMAGE_FIELDS[sender]
+    instance._previous_image_name = None
+    if instance.pk and _touches(update_fields, {field}) and _counts_blobs(sender, field):
+        instance._previous_image_name = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=RecipeStep)
+@receiver(post_save, sender=CustomUser)
+def image_saved(sender, instance, created, update_fields=None, **kwargs):
+    field, kind = IMAGE_FIELDS[sender]
+    if not _touches(update_fields, {field}):
+        return
+    # Готовые варианты пул пропустит — лишняя постановка стоит только проверки файлов
+    schedule_variants(getattr(instance, field), kind)
+    if not _counts_blobs(sender, field):
+        return
+    previous = getattr(instance, '_previous_image_name', None)
+    current = getattr(instance, field).name or None
+    if created or previous != current:
+        retain_blobs([current])
+        release_blobs([previous])
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=RecipeStep)
+@receiver(post_delete, sender=CustomUser)
+def image_deleted(sender, instance, **kwargs):
+    field, _ = IMAGE_FIELDS[sender]
+    if _counts_blobs(sender, field):
+        release_blobs([getattr(instance, field).name])
+
+
+@receiver(post_save, sender=CustomUser)
+def author_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not created and _touches(update_fields, SEARCH_USER_FIELDS):
+        schedule_search_vector_refresh(instance.posts.values_list('pk', flat=True))
+    if not created and _touches(update_fields, CARD_USER_FIELDS):
+        schedule_generation_bump()
@@ -0,0 +1,213 @@
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Like, Post, PostIngredient, SimilarPosts
+from .utils import schedule_post_batch
+
+DEFAULT_WEIGHTS = {'tags': 1.0, 'ingredients': 2.0, 'likers': 0.5}
+DEFAULT_MAX_DF = 0.05
+MIN_DF_CUTOFF = 100
+
+
+def _feature_block(post_ids, pairs, max_df):
+    '''
+    Бинарная матрица пост×признак по парам (post_id, feature_id): IDF-веса (редкий ингредиент
+    говорит о сходстве больше соли) и L2-нормированные строки — скалярное произведение строк
+    равно косинусному сходству. Пары постов не из post_ids (отсортированного) отбрасываются.
+    Признаки чаще чем у доли max_df постов выкидываются: вклад в сходство у них почти нулевой,
+    а без них произведение матриц перестаёт быть плотным (каждый пост «похож» на всех с солью).
+    '''
+    n = len(post_ids)
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    rows = np.searchsorted(post_ids, pairs[:, 0])
+    known = rows < n
+    known[known] = post_ids[rows[known]] == pairs[known, 0]
+    features, cols = np.unique(pairs[known, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(int(known.sum()), dtype=np.float32), (rows[known], cols.ravel())),
+        shape=(n, len(features)),
+    )
+    # Повторы пары при сборке суммируются — признак бинарный
+    matrix.data[:] = 1
+    df = np.bincount(matrix.indices, minlength=len(features))
+    if max_df < 1:
+        # На маленьком каталоге отсекать незачем — произведение дешёвое и так
+        matrix.data[df[matrix.indices] > max(max_df * n, MIN_DF_CUTOFF)] = 0
+        matrix.eliminate_zeros()
+    matrix.data *= (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)[matrix.indices]
+    norms = np.sqrt(np.bincount(np.repeat(np.arange(n), np.diff(matrix.indptr)), weights=matrix.data ** 2, minlength=n))
+    norms[norms == 0] = 1
+    matrix.data /= np.repeat(norms, np.diff(matrix.indptr)).astype(np.float32)
+    return matrix
+
+
+def build_feature_matrix(post_ids, blocks, weights=None, max_df=None):
+    '''
+    Блоки {имя: пары (post_id, feature_id)} склеиваются по столбцам с множителями sqrt(w / Σw):
+    произведение строк — взвешенное среднее косинусных сходств по блокам, в пределах [0, 1].
+    '''
+    weights = weights or getattr(settings, 'SIMILAR_POSTS_WEIGHTS', DEFAULT_WEIGHTS)
+    max_df = max_df if max_df is not None else getattr(settings, 'SIMILAR_POSTS_MAX_DF', DEFAULT_MAX_DF)
+    blocks = {name: pairs for name, pairs in blocks.items() if weights.get(name, 0) > 0}
+    total = sum(weights[name] for name in blocks)
+    parts = [_feature_block(post_ids, pairs, max_df) * np.float32(np.sqrt(weights[name] / total)) for name, pairs in blocks.items()]
+    return sparse.hstack(parts, format='csr', dtype=np.float32)
+
+
+def _similarity_chunks(matrix, rows, chunk_size):
+    # Сходство пачки строк со всеми постами: (chunk × признаки) @ (признаки × посты), разреженно
+    transposed = matrix.T.tocsr()
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        yield chunk, (matrix[chunk] @ transposed).tocsr()
+
+
+def _top_k(ids, scores, k):
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((ids, -scores))
+    return ids[order], scores[order]
+
+
+def _row_neighbours(sims, i, row, k):
+    start, end = sims.indptr[i], sims.indptr[i + 1]
+    cols, vals = sims.indices[start:end], sims.data[start:end]
+    mask = (cols != row) & (vals > 0)
+    return _top_k(cols[mask], vals[mask], k)
+
+
+def _as_lists(ids, scores):
+    return ids.tolist(), np.round(scores.astype(np.float64), 6).tolist()
+
+
+def compute_neighbours(matrix, post_ids, rows, k, chunk_size=500):
+    '''Полный расчёт top-k для строк rows. Возвращает {post_id: (соседи, сходства)}.'''
+    result = {}
+    for chunk, sims in _similarity_chunks(matrix, rows, chunk_size):
+        for i, row in enumerate(chunk):
+            cols, vals = _row_neighbours(sims, i, row, k)
+            result[int(post_ids[row])] = _as_lists(post_ids[cols], vals)
+    return result
+
+
+def update_neighbours(matrix, post_ids, dirty_rows, existing, k, chunk_size=500):
+    '''
+    Инкрементальный пересчёт после изменения признаков у dirty_rows. Заново считаются сами
+    изменившиеся посты и те, в чьих списках они были (их место мог занять кто угодно).
+    В остальные списки сходство с изменившимися вливается из тех же произведений
+    (сходство симметрично): прежний top-k плюс кандидаты выше его k-го значения. Результат точен
+    с точностью до сдвига IDF-весов от изменившихся частот признаков — его убирает полный пересчёт.
+    existing — {post_id: (соседи, сходства)}; возвращает изменённые строки в том же виде.
+    '''
+    n = len(post_ids)
+    index = {post_id: row for row, post_id in enumerate(post_ids.tolist())}
+    dirty = np.zeros(n, dtype=bool)
+    dirty[dirty_rows] = True
+    dirty_ids = set(post_ids[dirty_rows].tolist())
+
+    # Порог входа в чужой список — его k-е сходство; неполный список принимает любого
+    recompute = dirty.copy()
+    threshold = np.zeros(n, dtype=np.float32)
+    for post_id, (neighbours, scores) in existing.items():
+        row = index.get(post_id)
+        if row is None or dirty[row]:
+            continue
+        if dirty_ids.intersection(neighbours):
+            recompute[row] = True
+        elif len(scores) >= k:
+            threshold[row] = scores[-1]
+
+    result = {}
+    owners, sources, values = [], [], []
+    for chunk, sims in _similarity_chunks(matrix, np.flatnonzero(recompute), chunk_size):
+        for i, row in enumerate(chunk):
+            cols, vals = _row_neighbours(sims, i, row, k)
+            result[int(post_ids[row])] = _as_lists(post_ids[cols], vals)
+        coo = sims.tocoo()
+        mask = dirty[chunk[coo.row]] & ~recompute[coo.col] & (coo.data > threshold[coo.col])
+        owners.append(coo.col[mask])
+        sources.append(chunk[coo.row[mask]])
+        values.append(coo.data[mask])
+
+    if not owners:
+        return result
+    owners, sources, values = np.concatenate(owners), np.concatenate(sources), np.concatenate(values)
+    order = np.argsort(owners, kind='stable')
+    owners, sources, values = owners[order], sources[order], values[order]
+    bounds = np.flatnonzero(np.diff(owners)) + 1
+    for group_rows, group_sources, group_values in zip(np.split(owners, bounds), np.split(sources, bounds), np.split(values, bounds)):
+        if not len(group_rows):
+            continue
+        post_id = int(post_ids[group_rows[0]])
+        neighbours, scores = existing.get(post_id, ([], []))
+        ids = np.concatenate([np.asarray(neighbours, dtype=np.int64), post_ids[group_sources]])
+        vals = np.concatenate([np.asarray(scores, dtype=np.float64), group_values.astype(np.float64)])
+        result[post_id] = _as_lists(*_top_k(ids, vals, k))
+    return result
+
+
+def _pairs(queryset, field):
+    return np.array(list(queryset.values_list('post_id', field)), dtype=np.int64).reshape(-1, 2)
+
+
+def load_feature_matrix(post_ids):
+    published = {'post__status': 'published'}
+    return build_feature_matrix(post_ids, {
+        'tags': _pairs(Post.tags.through.objects.filter(**published), 'tag_id'),
+        'ingredients': _pairs(PostIngredient.objects.filter(**published), 'ingredient_id'),
+        'likers': _pairs(Like.objects.filter(**published), 'user_id'),
+    })
+
+
+def refresh_similar_posts(full=False, chunk_size=500):
+    '''
+    Пересчитывает SimilarPosts. По умолчанию — только посты без строки или с изменившимися
+    после расчёта тегами/ингредиентами (stale_since) плюс чужие списки, куда они входят;
+    full=True — все опубликованные (так подтягиваются и изменения лайков).
+    Возвращает (записано строк, удалено строк неопубликованных постов).
+    '''
+    started = timezone.now()
+    k = getattr(settings, 'SIMILAR_POSTS_TOP_K', 20)
+    removed, _ = SimilarPosts.objects.exclude(post__status='published').delete()
+    post_ids = np.fromiter(Post.objects.filter(status='published').order_by('pk').values_list('pk', flat=True), dtype=np.int64)
+
+    existing, stale = {}, set()
+    if not full:
+        for post_id, neighbours, scores, stale_since in SimilarPosts.objects.values_list('post_id', 'neighbours', 'scores', 'stale_since'):
+            existing[post_id] = (neighbours, scores)
+            if stale_since is not None:
+                stale.add(post_id)
+    dirty_rows = np.flatnonzero([full or post_id not in existing or post_id in stale for post_id in post_ids.tolist()])
+    if not len(dirty_rows):
+        return 0, removed
+
+    matrix = load_feature_matrix(post_ids)
+    if full:
+        rows = compute_neighbours(matrix, post_ids, dirty_rows, k, chunk_size)
+    else:
+        rows = update_neighbours(matrix, post_ids, dirty_rows, existing, k, chunk_size)
+
+    SimilarPosts.objects.bulk_create(
+        [SimilarPosts(post_id=post_id, neighbours=neighbours, scores=scores, computed_at=started) for post_id, (neighbours, scores) in rows.items()],
+        update_conflicts=True,
+        unique_fields=['post'],
+        update_fields=['neighbours', 'scores', 'computed_at'],
+        batch_size=1000,
+    )
+    # Отметки, поставленные во время расчёта, остаются — такие посты пересчитаются в следующий раз
+    refreshed = SimilarPosts.objects.filter(stale_since__lte=started)
+    if not full:
+        refreshed = refreshed.filter(post_id__in=post_ids[dirty_rows].tolist())
+    refreshed.update(stale_since=None)
+    return len(rows), removed
+
+
+def mark_similar_stale(post_ids):
+    SimilarPosts.objects.filter(post_id__in=post_ids).update(stale_since=timezone.now())
+
+
+def schedule_similar_refresh(post_ids):
+    schedule_post_batch('similar', post_ids, mark_similar_stale)
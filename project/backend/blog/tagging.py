@@ -0,0 +1,35 @@
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import CharField, Func, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def refresh_tag_slugs(queryset):
+    '''
+    Пересобирает денормализованный Post.tag_slugs из M2M одним UPDATE.
+    Through-модель берётся из queryset.model — работает и в миграциях.
+    '''
+    through = queryset.model._meta.get_field('tags').remote_field.through
+    slugs = (through.objects
+             .filter(post_id=OuterRef('pk'))
+             .exclude(tag__slug='')
+             .values('post_id')
+             .annotate(slugs=ArrayAgg('tag__slug', distinct=True, ordering='tag__slug'))
+             .values('slugs')[:1])
+    array_type = ArrayField(CharField(max_length=100))
+    return queryset.update(tag_slugs=Coalesce(Subquery(slugs, output_field=array_type), Value([], output_field=array_type)))
+
+
+class ArrayOverlapCount(Func):
+    '''|array ∩ values| — подзапрос над массивом самой строки, без JOIN, DISTINCT и GROUP BY.'''
+    template = '(SELECT count(*) FROM unnest(%(array)s) AS _t(v) WHERE _t.v = ANY(%(values)s))'
+    output_field = IntegerField()
+
+    def __init__(self, array, values, **extra):
+        super().__init__(array, Value(list(values), output_field=ArrayField(CharField())), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        array_sql, array_params = compiler.compile(self.source_expressions[0])
+        values_sql, values_params = compiler.compile(self.source_expressions[1])
+        sql = self.template % {'array': array_sql, 'values': values_sql}
+        return sql, (*array_params, *values_params)
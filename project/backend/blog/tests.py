@@ -1,3 +1,309 @@
-from django.test import TestCase
+import base64
+import datetime
+import json
+import math
+import smtplib
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.mail.backends import locmem
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from users.models import CustomUser
+
+from .models import Ingredient, PantryChange, Post, PostIngredient, PostNotification, PostTrendingScore, RecipeStep
+from .notifications import process_outbox
+from .pagination import KeysetCursorPagination
+from .pantry import CHANGE_LOG_MAX_GAP, CHANGE_LOG_PRUNE_EVERY, PantryIndex, current_generation, log_change
+from .recipe_sync import sync_ingredients, sync_steps
+from .response_cache import GENERATION_CACHE_KEY, bump_content_generation, get_content_generation
+from .trending import refresh_trending_scores
+
+
+class RecipeSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(username='cook', email='cook@example.com', password='x')
+        cls.post = Post.objects.create(author=author, title='Борщ', excerpt='', content='')
+        cls.ingredients = Ingredient.objects.bulk_create([Ingredient(name=f'ingredient {i}') for i in range(30)])
+
+    def make_steps(self, count):
+        return RecipeStep.objects.bulk_create(
+            [RecipeStep(post=self.post, order=i, description=f'step {i}') for i in range(1, count + 1)]
+        )
+
+    def assert_steps(self, descriptions):
+        connection.check_constraints()
+        self.assertEqual(list(self.post.steps.order_by('order').values_list('order', 'description')),
+                         list(enumerate(descriptions, start=1)))
+
+    def test_steps_queries_do_not_grow_with_recipe(self):
+        for count in (3, 30):
+            with self.subTest(count=count):
+                RecipeStep.objects.all().delete()
+                steps = self.make_steps(count)
+                # Обратный порядок (номера по пути совпадают с чужими), удаление первого, два новых шага
+                items = [{'id': step.id, 'order': count + 1 - step.order, 'description': step.description} for step in steps[1:]]
+                items += [{'id': steps[0].id, '_delete': True},
+                          {'order': 0, 'description': 'new first'}, {'order': count + 1, 'description': 'new last'}]
+                # SAVEPOINT, SELECT ... FOR UPDATE, SELECT + DELETE, UPDATE ... CASE, INSERT, RELEASE
+                with self.assertNumQueries(7):
+                    sync_steps(self.post, items)
+                self.assert_steps(['new first'] + [f'step {i}' for i in range(count, 1, -1)] + ['new last'])
+
+    def test_steps_renumber_only(self):
+        steps = self.make_steps(5)
+        with self.assertNumQueries(4):
+            sync_steps(self.post, [{'id': steps[4].id, 'order': 0}])
+        self.assert_steps(['step 5', 'step 1', 'step 2', 'step 3', 'step 4'])
+
+    def test_steps_unchanged_write_nothing(self):
+        steps = self.make_steps(5)
+        with self.assertNumQueries(3):
+            sync_steps(self.post, [{'id': step.id, 'order': step.order, 'description': step.description} for step in steps])
+
+    def test_steps_replace(self):
+        self.make_steps(5)
+        with self.assertNumQueries(6):
+            _, created = sync_steps(self.post, [{'order': 7, 'description': 'only'}], replace=True)
+        self.assertEqual([step.order for step in created], [1])
+        self.assert_steps(['only'])
+
+    def test_ingredients_queries_do_not_grow_with_recipe(self):
+        rows = PostIngredient.objects.bulk_create(
+            [PostIngredient(post=self.post, ingredient=ingredient, quantity='1') for ingredient in self.ingredients[:20]]
+        )
+        items = [{'id': row.id, 'quantity': '2'} for row in rows[:10]]
+        items += [{'id': row.id, '_delete': True} for row in rows[10:]]
+        items += [{'ingredient_id': ingredient.id, 'quantity': '3'} for ingredient in self.ingredients[20:]]
+        # SELECT, SAVEPOINT, SELECT + DELETE, UPDATE ... CASE, INSERT, RELEASE
+        with self.assertNumQueries(7):
+            created = sync_ingredients(self.post, items)
+        self.assertEqual(len(created), 10)
+        self.assertEqual(sorted(PostIngredient.objects.filter(post=self.post).values_list('quantity', flat=True)),
+                         ['2'] * 10 + ['3'] * 10)
+
+    def test_ingredients_append_without_select(self):
+        with self.assertNumQueries(3):
+            sync_ingredients(self.post, [{'ingredient_id': ingredient.id, 'quantity': '1'} for ingredient in self.ingredients])
+        self.assertEqual(PostIngredient.objects.filter(post=self.post).count(), 30)
+
+
+class ContentGenerationTests(TestCase):
+    def test_generation_shared_between_cache_instances(self):
+        # Отдельные экземпляры бэкенда — как в разных процессах; LocMem хранил бы поколение в памяти процесса
+        first, second = caches.create_connection('default'), caches.create_connection('default')
+        self.assertNotIsInstance(first, LocMemCache)
+        generation = bump_content_generation()
+        self.assertEqual(first.get(GENERATION_CACHE_KEY), generation)
+        self.assertEqual(second.get(GENERATION_CACHE_KEY), generation)
+
+    def test_lost_generation_is_not_reused(self):
+        generation = get_content_generation()
+        caches.create_connection('default').delete(GENERATION_CACHE_KEY)
+        self.assertNotEqual(get_content_generation(), generation)
+
+
+class PantryIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(username='chef', email='chef@example.com', password='x')
+        cls.ingredients = Ingredient.objects.bulk_create([Ingredient(name=f'pantry {i}') for i in range(3)])
+        cls.post = Post.objects.create(author=author, title='Омлет', excerpt='', content='',
+                                       post_type='recipe', status='published')
+        PostIngredient.objects.create(post=cls.post, ingredient=cls.ingredients[0], quantity='1')
+
+    def test_other_process_catches_up_from_log(self):
+        # Два индекса — как в двух процессах: изменение из первого второй догоняет по журналу, без перестройки
+        first, second = PantryIndex(), PantryIndex()
+        first.build()
+        second.build()
+        PostIngredient.objects.create(post=self.post, ingredient=self.ingredients[1], quantity='2')
+        first.refresh_posts([self.post.pk])
+        built_at = second._built_at
+        self.assertEqual(second.rank([self.ingredients[1].pk]), [(self.post.pk, 1, 2)])
+        self.assertEqual(second._built_at, built_at)
+
+    def test_generations_are_contiguous_and_pruned(self):
+        start = current_generation()
+        generations = [log_change([self.post.pk]) for _ in range(CHANGE_LOG_MAX_GAP + 100)]
+        self.assertEqual(generations, list(range(start + 1, start + CHANGE_LOG_MAX_GAP + 101)))
+        self.assertLess(PantryChange.objects.count(), CHANGE_LOG_MAX_GAP + CHANGE_LOG_PRUNE_EVERY)
+        self.assertEqual(current_generation(), generations[-1])
+
+
+@override_settings(TRENDING_REFRESH_OVERLAP=0, TRENDING_HALF_LIFE_HOURS=12, TRENDING_WEIGHTS={'likes': 1.0})
+class TrendingScoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(username='trend', email='trend@example.com', password='x')
+        cls.posts = [Post.objects.create(author=author, title=f'post {i}', excerpt='', content='', status='published')
+                     for i in range(3)]
+        cls.draft = Post.objects.create(author=author, title='draft', excerpt='', content='', status='draft')
+
+    def scores(self):
+        return dict(PostTrendingScore.objects.values_list('post_id', 'score'))
+
+    def test_incremental_refresh_takes_only_changed_counters(self):
+        self.assertEqual(refresh_trending_scores(full=True), (3, 0))
+        self.assertEqual(refresh_trending_scores(), (0, 0))
+        Post.objects.filter(pk=self.posts[0].pk).update(likes_count=5, counters_changed_at=timezone.now())
+        self.assertEqual(refresh_trending_scores(), (1, 0))
+
+    def test_half_life_is_worth_double_points(self):
+        # Пост на период полураспада старше догоняет новый при вдвое большем (1 + очки) — при любом «сейчас»
+        old, new = self.posts[:2]
+        Post.objects.filter(pk=old.pk).update(likes_count=3, created_at=new.created_at - datetime.timedelta(hours=12))
+        Post.objects.filter(pk=new.pk).update(likes_count=1)
+        refresh_trending_scores(full=True)
+        scores = self.scores()
+        self.assertAlmostEqual(scores[old.pk], scores[new.pk], places=6)
+        self.assertAlmostEqual(scores[self.posts[2].pk] + math.log(2), scores[new.pk], places=6)
+
+    def test_publication_changes_score_right_away(self):
+        refresh_trending_scores(full=True)
+        self.draft.status = 'published'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.draft.save()
+        self.assertIn(self.draft.pk, self.scores())
+        self.draft.status = 'archived'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.draft.save(update_fields=['status'])
+        self.assertNotIn(self.draft.pk, self.scores())
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    '''locmem, который рвёт соединение, когда в outbox уже fail_after писем.'''
+    fail_after = None
+
+    def send_messages(self, messages):
+        if self.fail_after is not None and len(mail.outbox) >= self.fail_after:
+            raise smtplib.SMTPServerDisconnected('connection lost')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='blog.tests.FlakyEmailBackend', NOTIFICATION_CHUNK_SIZE=100,
+                   NOTIFICATION_SEND_RETRIES=0, NOTIFICATION_RETRY_BACKOFF=0)
+class PostNotificationWorkerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username='writer', email='writer@example.com', password='x')
+        cls.readers = [CustomUser.objects.create_user(username=f'reader{i}', email=f'reader{i}@example.com', password='x')
+                       for i in range(5)]
+        cls.author.subscribers.add(*cls.readers)
+        cls.post = Post.objects.create(author=cls.author, title='Пирог', excerpt='', content='', status='published')
+
+    def setUp(self):
+        self.addCleanup(setattr, FlakyEmailBackend, 'fail_after', None)
+        self.notification = PostNotification.objects.create(post=self.post)
+
+    def recipients(self):
+        return [address for message in mail.outbox for address in message.to]
+
+    def test_sends_to_every_subscriber(self):
+        self.assertEqual(process_outbox(), 1)
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, 'sent')
+        self.assertEqual(self.notification.sent_count, 5)
+        self.assertEqual(sorted(self.recipients()), sorted(reader.email for reader in self.readers))
+
+    def test_retry_resumes_after_last_sent_recipient(self):
+        # Соединение рвётся на третьем письме пачки: первые два не должны уйти повторно
+        FlakyEmailBackend.fail_after = 2
+        process_outbox()
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, 'pending')
+        self.assertEqual((self.notification.sent_count, self.notification.last_recipient_id), (2, self.readers[1].pk))
+
+        FlakyEmailBackend.fail_after = None
+        PostNotification.objects.filter(pk=self.notification.pk).update(next_attempt_at=timezone.now())
+        process_outbox()
+        self.notification.refresh_from_db()
+        self.assertEqual((self.notification.status, self.notification.sent_count), ('sent', 5))
+        self.assertEqual(self.recipients(), [reader.email for reader in self.readers])
+
+
+class KeysetCursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(username='pager', email='pager@example.com', password='x')
+        # Равные likes_count и одна метка created_at на всех — порядок держит только -id
+        cls.posts = Post.objects.bulk_create([
+            Post(author=author, title=f'post {i}', excerpt='', content='', likes_count=likes, views_count=i)
+            for i, likes in enumerate([3, 3, 3, 1, 1, 0, 0])
+        ])
+        Post.objects.update(created_at=timezone.now().replace(microsecond=123456))
+
+    def paginate(self, ordering, cursor=None):
+        params = {'page_size': 3}
+        if cursor:
+            params['cursor'] = cursor
+        request = Request(APIRequestFactory().get('/api/blog/posts/', params))
+        paginator = KeysetCursorPagination()
+        page = paginator.paginate_queryset(Post.objects.order_by(ordering), request)
+        return [post.pk for post in page], paginator
+
+    @staticmethod
+    def cursor(link):
+        return parse_qs(urlparse(link).query)['cursor'][0] if link else None
+
+    def walk(self, ordering):
+        ids, paginator = self.paginate(ordering)
+        pages = [ids]
+        while paginator.get_next_link():
+            ids, paginator = self.paginate(ordering, self.cursor(paginator.get_next_link()))
+            pages.append(ids)
+        return pages
+
+    def test_pages_cover_all_rows_with_id_tie_break(self):
+        for ordering in ('-likes_count', 'likes_count', '-created_at'):
+            with self.subTest(ordering=ordering):
+                expected = list(Post.objects.order_by(ordering, '-id').values_list('pk', flat=True))
+                pages = self.walk(ordering)
+                self.assertEqual([len(page) for page in pages], [3, 3, 1])
+                self.assertEqual(sum(pages, []), expected)
+
+    def test_cursor_round_trip(self):
+        _, paginator = self.paginate('-created_at')
+        payload = json.loads(base64.urlsafe_b64decode(self.cursor(paginator.get_next_link()) + '=='))
+        last = Post.objects.get(pk=paginator.page[-1].pk)
+        self.assertEqual(payload['o'], ['-created_at', '-id'])
+        self.assertEqual(payload['p'], [last.created_at.isoformat(), last.pk])
+        self.assertEqual(payload['r'], 0)
+        # Микросекунды в курсоре: иначе при равных метках следующая страница потеряла бы строки
+        self.assertIn('.123456', payload['p'][0])
+
+    def test_previous_pages(self):
+        first, paginator = self.paginate('-likes_count')
+        self.assertIsNone(paginator.get_previous_link())
+        second, paginator = self.paginate('-likes_count', self.cursor(paginator.get_next_link()))
+        third, paginator = self.paginate('-likes_count', self.cursor(paginator.get_next_link()))
+        back, paginator = self.paginate('-likes_count', self.cursor(paginator.get_previous_link()))
+        self.assertEqual(back, second)
+        back, paginator = self.paginate('-likes_count', self.cursor(paginator.get_previous_link()))
+        self.assertEqual(back, first)
+        self.assertTrue(paginator.get_next_link())
+
+    def test_cursor_from_other_ordering_is_rejected(self):
+        _, paginator = self.paginate('-likes_count')
+        with self.assertRaises(NotFound):
+            self.paginate('-views_count', self.cursor(paginator.get_next_link()))
+
+    def test_tampered_cursor_is_rejected(self):
+        def encode(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        for cursor in ('not a cursor', base64.urlsafe_b64encode(b'{broken').decode(),
+                       encode({'o': ['-likes_count', '-id'], 'p': [3]}),
+                       encode({'o': ['-likes_count', '-id'], 'p': ['many', 'x'], 'r': 0}),
+                       encode({'p': [3, 1]})):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(NotFound):
+                    self.paginate('-likes_count', cursor)
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from users.models import CustomUser
+
+from .models import HomeTimeline, Post
+
+PULL_AUTHORS_CACHE_KEY = 'timeline:pull_authors'
+
+# Новый пост в ленты подписчиков автора одним UPDATE: порядок по убыванию id, без дублей
+# (повторная публикация) и с обрезкой до лимита. Трогаются только уже материализованные ленты
+FAN_OUT_SQL = '''
+UPDATE {timeline} AS t
+SET post_ids = ARRAY(
+        SELECT DISTINCT id FROM unnest(t.post_ids || %(post_id)s::bigint) AS id ORDER BY id DESC LIMIT %(limit)s
+    ),
+    updated_at = now()
+WHERE t.user_id IN (SELECT {follower} FROM {subscribers} WHERE {author} = %(author_id)s)
+'''
+
+
+def timeline_length():
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 500)
+
+
+def get_pull_author_ids():
+    '''
+    Авторы, у которых подписчиков больше TIMELINE_FANOUT_MAX_FOLLOWERS: их посты не раскладываются
+    по лентам (слишком дорогая запись), а подмешиваются при чтении. Один и тот же список
+    используют запись и чтение; кешируется на TIMELINE_PULL_AUTHORS_TTL секунд.
+    '''
+    author_ids = cache.get(PULL_AUTHORS_CACHE_KEY)
+    if author_ids is None:
+        limit = getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 5000)
+        author_ids = set(CustomUser.subscribers.through.objects
+                         .values('from_customuser')
+                         .annotate(followers=Count('pk'))
+                         .filter(followers__gt=limit)
+                         .values_list('from_customuser', flat=True))
+        cache.set(PULL_AUTHORS_CACHE_KEY, author_ids, timeout=getattr(settings, 'TIMELINE_PULL_AUTHORS_TTL', 600))
+    return author_ids
+
+
+def fan_out_post(post):
+    '''Кладёт опубликованный пост в материализованные ленты подписчиков автора. Возвращает число лент.'''
+    if post.status != 'published' or post.author_id in get_pull_author_ids():
+        return 0
+    field = CustomUser._meta.get_field('subscribers')
+    sql = FAN_OUT_SQL.format(
+        timeline=connection.ops.quote_name(HomeTimeline._meta.db_table),
+        subscribers=connection.ops.quote_name(field.remote_field.through._meta.db_table),
+        author=connection.ops.quote_name(field.m2m_column_name()),
+        follower=connection.ops.quote_name(field.m2m_reverse_name()),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'post_id': post.pk, 'author_id': post.author_id, 'limit': timeline_length()})
+        return cursor.rowcount
+
+
+def schedule_fan_out(post):
+    # После коммита — подписчики не увидят пост раньше, чем он станет виден в БД
+    transaction.on_commit(lambda: fan_out_post(post))
+
+
+def build_timeline(user):
+    '''Материализует ленту из подписок (fan-out-on-read один раз) и возвращает список id.'''
+    post_ids = list(Post.objects
+                    .filter(status='published', author__subscribers=user)
+                    .exclude(author_id__in=get_pull_author_ids())
+                    .order_by('-id')
+                    .values_list('pk', flat=True)[:timeline_length()])
+    HomeTimeline.objects.bulk_create(
+        [HomeTimeline(user=user, post_ids=post_ids)],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['post_ids', 'updated_at'],
+    )
+    return post_ids
+
+
+def timeline_queryset(user):
+    '''
+    Посты ленты подписок одним запросом, по убыванию id: материализованный список плюс посты
+    «тяжёлых» авторов из подписок. Их хвост ограничен так же, как материализованная часть.
+    '''
+    post_ids = HomeTimeline.objects.filter(user=user).values_list('post_ids', flat=True).first()
+    if post_ids is None:
+        post_ids = build_timeline(user)
+    condition = Q(pk__in=post_ids)
+
+    pull_author_ids = get_pull_author_ids()
+    if pull_author_ids:
+        followed = list(CustomUser.subscribers.through.objects
+                        .filter(to_customuser=user, from_customuser__in=pull_author_ids)
+                        .values_list('from_customuser', flat=True))
+        if followed:
+            pulled = Q(author_id__in=followed)
+            if len(post_ids) >= timeline_length():
+                pulled &= Q(pk__gte=post_ids[-1])
+            condition |= pulled
+    return Post.objects.filter(condition, status='published').order_by('-id')
+
+
+def drop_timelines(user_ids):
+    # Подписки изменились — лента пересоберётся при следующем чтении
+    HomeTimeline.objects.filter(user_id__in=user_ids).delete()
@@ -0,0 +1,99 @@
+import datetime
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Post, PostTrendingScore
+from .utils import schedule_post_batch
+
+# Рейтинг — очки, затухающие вдвое за каждый период полураспада возраста поста, в логарифме:
+#   ln(1 + очки) + created_at / tau,  tau = период / ln 2.
+# Сравнение двух постов от текущего времени не зависит (оба затухают одинаково), поэтому
+# пересчитывать нужно только посты, у которых изменились счётчики, а не всю таблицу
+UPSERT_SCORES_SQL = '''
+INSERT INTO {score} (post_id, score, computed_at)
+SELECT id,
+       ln(1 + likes_count * %(likes)s + comments_count * %(comments)s + views_count * %(views)s)
+       + EXTRACT(EPOCH FROM created_at) / %(tau)s,
+       now()
+FROM {post}
+WHERE id = ANY(%(ids)s) AND status = 'published' AND created_at >= %(since)s
+ON CONFLICT (post_id) DO UPDATE SET score = EXCLUDED.score, computed_at = EXCLUDED.computed_at
+'''
+
+# Начало последнего пересчёта: следующий берёт посты с counters_changed_at не раньше него
+WATERMARK_CACHE_KEY = 'trending:refreshed_at'
+
+
+def trending_params():
+    weights = getattr(settings, 'TRENDING_WEIGHTS', {})
+    half_life = float(getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 12)) * 3600
+    return {
+        'likes': float(weights.get('likes', 1.0)),
+        'comments': float(weights.get('comments', 2.0)),
+        'views': float(weights.get('views', 0.05)),
+        'tau': half_life / math.log(2),
+    }
+
+
+def trending_window_start():
+    return timezone.now() - datetime.timedelta(days=getattr(settings, 'TRENDING_WINDOW_DAYS', 14))
+
+
+def _upsert_scores(post_ids, since, params):
+    sql = UPSERT_SCORES_SQL.format(
+        score=connection.ops.quote_name(PostTrendingScore._meta.db_table),
+        post=connection.ops.quote_name(Post._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {**params, 'ids': list(post_ids), 'since': since})
+        return cursor.rowcount
+
+
+def _out_of_window(since):
+    return PostTrendingScore.objects.exclude(Q(post__status='published') & Q(post__created_at__gte=since))
+
+
+def refresh_trending_scores(batch_size=1000, full=False):
+    '''
+    Пересчитывает рейтинг опубликованных постов за последние TRENDING_WINDOW_DAYS дней, у которых
+    менялись счётчики с прошлого запуска (водяной знак в кеше; без него и с full — все посты окна),
+    пачками по id, и удаляет строки постов, выпавших из окна или снятых с публикации.
+    Возвращает (обновлено, удалено).
+    '''
+    started = timezone.now()
+    since = trending_window_start()
+    candidates = Post.objects.filter(status='published', created_at__gte=since)
+    watermark = None if full else cache.get(WATERMARK_CACHE_KEY)
+    if watermark is not None:
+        overlap = datetime.timedelta(seconds=getattr(settings, 'TRENDING_REFRESH_OVERLAP', 60))
+        candidates = candidates.filter(counters_changed_at__gte=watermark - overlap)
+    params = trending_params()
+
+    updated = 0
+    last_id = 0
+    while True:
+        batch = list(candidates.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        updated += _upsert_scores(batch, since, params)
+        last_id = batch[-1]
+
+    removed, _ = _out_of_window(since).delete()
+    cache.set(WATERMARK_CACHE_KEY, started, timeout=None)
+    return updated, removed
+
+
+def refresh_post_scores(post_ids):
+    '''Рейтинг конкретных постов сразу: опубликованный попадает в ленту, снятый с публикации — уходит.'''
+    since = trending_window_start()
+    _upsert_scores(post_ids, since, trending_params())
+    _out_of_window(since).filter(post_id__in=post_ids).delete()
+
+
+def schedule_trending_refresh(post_ids):
+    schedule_post_batch('trending', post_ids, refresh_post_scores)
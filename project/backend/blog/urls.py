@@ -1,7 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import AdminPostViewSet, CommentViewSet, IngredientSyncView, IngredientViewSet, PostIngredientCreateView, PostViewSet, RecipeStepCreateView, RecipeStepSyncView, TagViewSet
+from .views import AdminPostViewSet, AutocompleteView, CommentThreadView, CommentViewSet, IngredientSyncView, IngredientViewSet, PostIngredientCreateView, PostViewSet, RecipeStepCreateView, RecipeStepSyncView, TagViewSet
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet, basename='post')
@@ -16,6 +16,7 @@ custom_urlpatterns = [
         CommentViewSet.as_view({'get': 'list', 'post': 'create'}),
         name='post-comments'
     ),
+    path('posts/<int:post_pk>/comments/thread/', CommentThreadView.as_view(), name='post-comments-thread'),
     path('posts/<int:pk>/likes/',
          PostViewSet.as_view({'post': 'like'}),
          name='post-like'),
@@ -26,6 +27,7 @@ custom_urlpatterns = [
     path('posts/<int:post_id>/steps/', RecipeStepCreateView.as_view(), name='post-add-steps-bulk'),
     path('posts/<int:post_id>/ingredients/sync/', IngredientSyncView.as_view(), name='post-ingredients-sync'),
     path('posts/<int:post_id>/steps/sync/', RecipeStepSyncView.as_view(), name='post-steps-sync'),
+    path('autocomplete/<str:kind>/', AutocompleteView.as_view(), name='autocomplete'),
 ]
 
 urlpatterns = [
@@ -1,38 +1,51 @@
-from django.conf import settings
-from django.core.mail import send_mass_mail
+import threading
+import time
 
+from django.core.cache import cache
+from django.db import transaction
 
-def send_new_post_notification(post):
-    author = post.author
-    subscribers_qs = getattr(author, 'subscribers', None)
-    if not subscribers_qs:
-        return
-    subscribers = subscribers_qs.all()
-    emails = [u.email for u in subscribers if u.email]
-    if not emails:
-        return
-
-    author_name = author.display_name or author.username
-    type_label = 'рецепт' if post.post_type == 'recipe' else 'статью'
-    frontend_base = getattr(settings, 'FRONTEND_BASE_URL', '').rstrip('/')
-    link = f'{frontend_base}/posts/{post.id}'
-    excerpt = (post.excerpt or '')[:200]
-    subject = f'Новый пост: {post.title} — {author_name}'
-
-    text_body = f'''Здравствуйте!
+_pending_batches = threading.local()
 
-Пользователь {author_name} опубликовал новый {type_label}.
 
-{post.title}
-{excerpt}
-
-Смотреть: {link}
-
-Если вы больше не хотите получать эти письма — отпишитесь от пользователя на сайте.
-'''
-
-    messages = [
-        (subject, text_body, settings.DEFAULT_FROM_EMAIL, [email])
-        for email in emails
-    ]
-    send_mass_mail(messages, fail_silently=True)
+def schedule_post_batch(name, post_ids, callback):
+    '''
+    Копит id постов до коммита транзакции и вызывает callback(post_ids) один раз.
+    on_commit регистрируется на каждый вызов, работу делает первый сработавший;
+    после отката id остаются в наборе и обработаются со следующим коммитом (безвредно).
+    '''
+    post_ids = {pid for pid in post_ids if pid}
+    if not post_ids:
+        return
+    batches = getattr(_pending_batches, 'batches', None)
+    if batches is None:
+        batches = _pending_batches.batches = {}
+    batches.setdefault(name, set()).update(post_ids)
+    transaction.on_commit(lambda: _flush_post_batch(name, callback))
+
+
+def _flush_post_batch(name, callback):
+    post_ids = getattr(_pending_batches, 'batches', {}).pop(name, None)
+    if post_ids:
+        callback(post_ids)
+
+
+def get_cache_generation(key):
+    '''
+    Поколение из общего кеша. Пропавший ключ (вытеснение, очистка кеша) заводится заново
+    текущим временем, а не нулём, — иначе записи, сохранённые со старым поколением, снова стали бы свежими.
+    '''
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_cache_generation(key):
+    '''
+    Новое поколение — текущее время в наносекундах, а не incr: у DatabaseCache incr — это get + set,
+    и две одновременные смены дали бы одно значение. Сравниваются поколения только на равенство.
+    '''
+    generation = time.time_ns()
+    cache.set(key, generation, timeout=None)
+    return generation
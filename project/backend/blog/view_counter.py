@@ -0,0 +1,174 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .hll import HyperLogLog
+from .models import Post, PostDailyViewers
+
+logger = logging.getLogger(__name__)
+
+SKETCH_LOCK_TIMEOUT = 2
+SKETCH_LOCK_ATTEMPTS = 20
+SKETCH_LOCK_WAIT = 0.005
+
+
+class BufferedViewCounter:
+    '''
+    Write-behind счётчик просмотров: инкременты копятся в памяти процесса и раз в
+    VIEW_COUNTER_FLUSH_INTERVAL секунд уходят в Post.views_count одним UPDATE на все посты.
+    Горячая строка поста больше не блокируется на каждый просмотр.
+    Так же копятся дневные HLL-скетчи зрителей — они сливаются в PostDailyViewers.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._sketches = {}
+        self._flusher = None
+
+    def add(self, post_id, count=1):
+        with self._lock:
+            self._pending[post_id] += count
+        self._ensure_flusher()
+
+    def add_viewer(self, post_id, viewer_id):
+        key = (post_id, timezone.localdate())
+        with self._lock:
+            sketch = self._sketches.get(key)
+            if sketch is None:
+                sketch = self._sketches[key] = HyperLogLog()
+            sketch.add(viewer_id)
+        self._ensure_flusher()
+
+    def pending(self, post_id):
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, Counter()
+            sketches, self._sketches = self._sketches, {}
+        flushed = 0
+        try:
+            if batch:
+                flushed = self._flush_counts(batch)
+                batch = None
+            if sketches:
+                self._flush_sketches(sketches)
+        except Exception:
+            # Не теряем просмотры: вернём дельты и скетчи в буфер до следующего сброса
+            with self._lock:
+                if batch:
+                    self._pending.update(batch)
+                for key, sketch in sketches.items():
+                    if key in self._sketches:
+                        sketch.merge(self._sketches[key])
+                    self._sketches[key] = sketch
+            raise
+        return flushed
+
+    def _flush_counts(self, batch):
+        # Сортировка id — одинаковый порядок блокировок у параллельных сбросов
+        post_ids = sorted(batch)
+        delta = Case(
+            *[When(pk=post_id, then=Value(batch[post_id])) for post_id in post_ids],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        return Post.objects.filter(pk__in=post_ids).update(views_count=F('views_count') + delta, counters_changed_at=Now())
+
+    def _flush_sketches(self, sketches):
+        existing = set(Post.objects.filter(pk__in={post_id for post_id, _ in sketches}).values_list('pk', flat=True))
+        sketches = {key: sketch for key, sketch in sketches.items() if key[0] in existing}
+        if not sketches:
+            return
+        with transaction.atomic():
+            PostDailyViewers.objects.bulk_create(
+                [PostDailyViewers(post_id=post_id, day=day) for post_id, day in sketches],
+                ignore_conflicts=True,
+            )
+            # Слияние — максимум по регистрам; строки блокируются, чтобы другой процесс не затёр результат
+            rows = (PostDailyViewers.objects
+                    .select_for_update()
+                    .filter(post_id__in={post_id for post_id, _ in sketches}, day__in={day for _, day in sketches})
+                    .order_by('pk'))
+            changed = []
+            for row in rows:
+                local = sketches.get((row.post_id, row.day))
+                if local is None:
+                    continue
+                merged = HyperLogLog.from_bytes(row.sketch)
+                merged.merge(local)
+                row.sketch = merged.to_bytes()
+                row.unique_viewers = len(merged)
+                changed.append(row)
+            PostDailyViewers.objects.bulk_update(changed, ['sketch', 'unique_viewers'])
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._flusher.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        interval = getattr(settings, 'VIEW_COUNTER_FLUSH_INTERVAL', 10)
+        while True:
+            time.sleep(interval)
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered post views')
+
+
+def _lock_sketch(lock_key):
+    # Короткий цикл: под блокировкой только get/set скетча
+    for _ in range(SKETCH_LOCK_ATTEMPTS):
+        if cache.add(lock_key, 1, timeout=SKETCH_LOCK_TIMEOUT):
+            return True
+        time.sleep(SKETCH_LOCK_WAIT)
+    return False
+
+
+def register_unique_view(post_id, viewer_id):
+    '''
+    Дедупликация просмотров окнами по POST_VIEW_UNIQUE_TTL: один HLL-скетч (1 КиБ) на пост и окно
+    вместо ключа на каждого зрителя. Возвращает прирост views_count — на сколько выросла
+    целая часть оценки уникальных зрителей окна (0 — зритель, скорее всего, уже был).
+    Чтение и запись скетча — под блокировкой cache.add: иначе параллельные просмотры горячего
+    поста затирают регистры друг друга, и зрители считаются повторно.
+    '''
+    ttl = getattr(settings, 'POST_VIEW_UNIQUE_TTL', 21600)
+    key = f'pvh:{post_id}:{int(time.time() // ttl)}'
+    lock_key = f'{key}:lock'
+    locked = _lock_sketch(lock_key)
+    try:
+        sketch = HyperLogLog.from_bytes(cache.get(key))
+        before = sketch.count()
+        if not sketch.add(viewer_id):
+            return 0
+        added = max(0, int(sketch.count()) - int(before))
+        if not locked:
+            # Блокировку не дождались: сливаем со свежей копией (максимум по регистрам) перед записью
+            sketch.merge(HyperLogLog.from_bytes(cache.get(key)))
+        cache.set(key, sketch.to_bytes(), timeout=ttl)
+        return added
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+view_counter = BufferedViewCounter()
@@ -1,27 +1,48 @@
+import datetime
 import hashlib
 import json
+import re
+import time
 
 from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
 from django.core.cache import cache
 from django.db import transaction
-from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Value
+from django.db.models import BooleanField, ExpressionWrapper, F, IntegerField, Q, Value
+from django.db.models.functions import Greatest, Now
+from django.utils import timezone
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound
 from rest_framework.filters import SearchFilter
+from rest_framework.generics import get_object_or_404
 from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from core.conditional import conditional_get, make_etag
+from core.media_urls import MediaURLResolver
 from core.permissions import IsAdminUserOrReadOnly
-
-from .models import Comment, Ingredient, Post, PostIngredient, RecipeStep, Tag
-from .pagination import AdminPageNumberPagination, SmallPageNumberPagination
+from core.relations import ViewerRelations, bump_viewer_versions, get_viewer_version
+from users.models import CustomUser
+
+from .comments import attach_replies, thread_queryset
+from .hll import HyperLogLog
+from .likes import toggle_like
+from .models import Comment, Ingredient, Post, PostIngredient, SimilarPosts, Tag
+from .notifications import enqueue_post_notification
+from .pagination import AdminPageNumberPagination, CommentThreadCursorPagination, PostFeedCursorPagination, SmallPageNumberPagination
+from .pantry import pantry_index
+from .recipe_sync import step_items, sync_ingredients, sync_steps
+from .response_cache import ListResponseCacheMixin, get_content_changed_at, get_content_generation
+from .search import PostFullTextSearchFilter
 from .serializers import (
     CommentSerializer,
+    CommentThreadSerializer,
     IngredientSerializer,
+    PostCardSerializer,
     PostIngredientBulkSerializer,
     PostIngredientCreateSerializer,
     PostIngredientSerializer,  # <-- добавлено
@@ -31,7 +52,9 @@ from .serializers import (
     RecipeStepSerializer,
     TagSerializer,
 )
-from .utils import send_new_post_notification
+from .tagging import ArrayOverlapCount
+from .timeline import schedule_fan_out, timeline_queryset
+from .view_counter import register_unique_view, view_counter
 
 
 def ensure_author_or_admin(request, post):
@@ -43,16 +66,38 @@ def ensure_author_or_admin(request, post):
     return False
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(ListResponseCacheMixin, viewsets.ModelViewSet):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     authentication_classes = [JWTAuthentication]
-    pagination_class = SmallPageNumberPagination
-    filter_backends = [SearchFilter]
-    search_fields = ['title', 'author__username', 'tags__name']
+    pagination_class = PostFeedCursorPagination
+    filter_backends = [PostFullTextSearchFilter]
+    cache_scope = 'posts'
+    cache_query_params = ('post_type', 'tags', 'max_time', 'max_calories', 'ordering', 'search', 'page', 'page_size', 'cursor', 'fields', 'expand')
+    cache_set_params = ('tags', 'fields', 'expand')
+    cache_live_model = Post
+    cache_live_fields = ('likes_count', 'comments_count', 'views_count')
+
+    @property
+    def paginator(self):
+        # По умолчанию — keyset-курсор без COUNT; постраничный режим (с count) только по явному ?page=
+        if not hasattr(self, '_paginator'):
+            if SmallPageNumberPagination.page_query_param in self.request.query_params:
+                self._paginator = SmallPageNumberPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
-    def get_queryset(self):
+    def filter_visible(self, queryset):
+        # Статус: не staff видит только опубликованные чужие посты, но всегда видит свои (draft/archived)
         user = self.request.user
+        if user.is_staff:
+            return queryset
+        if user.is_authenticated:
+            return queryset.filter(Q(status='published') | Q(author_id=user.id))
+        return queryset.filter(status='published')
+
+    def get_queryset(self):
         qp = self.request.query_params
         queryset = (Post.objects.all()
                     .select_related('author')
@@ -82,35 +127,15 @@ class PostViewSet(viewsets.ModelViewSet):
         if tags_raw:
             tag_slugs = [t.strip() for t in tags_raw.split(',') if t.strip()]
             if tag_slugs:
-                queryset = queryset.filter(tags__slug__in=tag_slugs).distinct()
-
-        # Аннотация is_liked
-        if user.is_authenticated:
-            queryset = queryset.annotate(
-                is_liked=Exists(
-                    Post.liked_by.through.objects.filter(
-                        post_id=OuterRef('pk'),
-                        customuser_id=user.id
-                    )
-                )
-            )
+                queryset = queryset.filter(tag_slugs__overlap=tag_slugs)
 
         # Аннотация релевантности (число совпавших тегов)
         if tag_slugs:
-            queryset = queryset.annotate(
-                matched_tags=Count('tags', filter=Q(tags__slug__in=tag_slugs))
-            )
+            queryset = queryset.annotate(matched_tags=ArrayOverlapCount('tag_slugs', tag_slugs))
         else:
             queryset = queryset.annotate(matched_tags=Value(0, output_field=IntegerField()))
 
-        # Статус: не staff видит только опубликованные чужие посты, но всегда видит свои (draft/archived)
-        if not user.is_staff:
-            if user.is_authenticated:
-                queryset = queryset.filter(
-                    Q(status='published') | Q(author_id=user.id)
-                )
-            else:
-                queryset = queryset.filter(status='published')
+        queryset = self.filter_visible(queryset)
 
         # Сортировка
         ordering = qp.get('ordering')
@@ -122,18 +147,71 @@ class PostViewSet(viewsets.ModelViewSet):
             'relevance': '-matched_tags',
             '-relevance': 'matched_tags',
         }
-        if ordering in mapping:
+        if ordering == 'trending':
+            # Готовый рейтинг из blog.trending; постов без рейтинга (вне окна) в этой ленте нет.
+            # Аннотация — чтобы курсор брал значение с объекта
+            queryset = (queryset
+                        .filter(trending__isnull=False)
+                        .annotate(trending_score=F('trending__score'))
+                        .order_by('-trending_score', '-id'))
+        elif ordering in mapping:
             queryset = queryset.order_by(mapping[ordering], '-id')
         else:
             # По умолчанию — новизна
             queryset = queryset.order_by('-created_at', '-id')
 
+        if self.action == 'list':
+            queryset = PostCardSerializer.setup_queryset(queryset, self.request)
+        else:
+            queryset = queryset.defer('search_vector')
+
         return queryset
 
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return PostCardSerializer
+        return super().get_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        # Карточки: поколение контента + окно устаревания счётчиков + лайки/подписки зрителя
+        user = request.user
+        window = max(getattr(settings, 'RESPONSE_CACHE_TTL', 30), 1)
+        etag = make_etag(
+            'posts', get_content_generation(), int(time.time() // window),
+            user.pk, get_viewer_version(user.pk) if user.is_authenticated else None,
+            weak=True,
+        )
+        return conditional_get(request, lambda: super(PostViewSet, self).list(request, *args, **kwargs), etag=etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Валидаторы из одной строки поста, без prefetch шагов/ингредиентов и сериализации
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            self.get_queryset().prefetch_related(None).order_by().values(
+                'pk', 'author_id', 'updated_at', 'likes_count', 'comments_count', 'views_count'
+            ),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+        )
+        relations = ViewerRelations.for_request(request)
+        generation = get_content_generation()
+        etag = make_etag(
+            'post', row, generation,
+            request.user.pk, relations.is_liked(Post(pk=row['pk'])), relations.is_subscribed(CustomUser(pk=row['author_id'])),
+        )
+        # Счётчики учитывает только ETag; Last-Modified — правки поста и связанного контента
+        last_modified = max(row['updated_at'], get_content_changed_at(generation))
+        return conditional_get(
+            request, lambda: super(PostViewSet, self).retrieve(request, *args, **kwargs),
+            etag=etag, last_modified=last_modified,
+        )
+
     def perform_create(self, serializer):
-        post = serializer.save(author=self.request.user)
-        if post.status == 'published':
-            send_new_post_notification(post)
+        # Пост и строка рассылки — одной транзакцией: опубликованный пост без уведомления не остаётся
+        with transaction.atomic():
+            post = serializer.save(author=self.request.user)
+            if post.status == 'published':
+                enqueue_post_notification(post)
+                schedule_fan_out(post)
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -146,14 +224,85 @@ class PostViewSet(viewsets.ModelViewSet):
         old_status = instance.status
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
-
-        new_instance = serializer.instance
-        if old_status != 'published' and new_instance.status == 'published':
-            send_new_post_notification(new_instance)
+        with transaction.atomic():
+            self.perform_update(serializer)
+            new_instance = serializer.instance
+            if old_status != 'published' and new_instance.status == 'published':
+                enqueue_post_notification(new_instance)
+                schedule_fan_out(new_instance)
 
         return Response(serializer.data)
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[permissions.AllowAny],
+        url_path='pantry'
+    )
+    def pantry(self, request):
+        # ?ingredients=1,2,3 — опубликованные рецепты по покрытию набора ингредиентов
+        raw = request.query_params.get('ingredients', '')
+        ingredient_ids = {int(i) for i in raw.split(',') if i.strip().isdigit()}
+        if not ingredient_ids:
+            return Response({'detail': 'ingredients required'}, status=400)
+
+        ranked = pantry_index.rank(ingredient_ids)
+        paginator = SmallPageNumberPagination()
+        page = paginator.paginate_queryset(ranked, request, view=self)
+
+        posts = PostCardSerializer.setup_queryset(
+            Post.objects.filter(pk__in=[row[0] for row in page]), request
+        ).in_bulk()
+        rows = [row for row in page if row[0] in posts]
+        data = PostCardSerializer([posts[row[0]] for row in rows], many=True, context=self.get_serializer_context()).data
+        for item, (post_id, matched, required) in zip(data, rows):
+            item['pantry'] = {
+                'matched': matched,
+                'required': required,
+                'coverage': round(matched / required, 4),
+                'missing': required - matched,
+                'missing_ingredient_ids': pantry_index.missing(post_id, ingredient_ids),
+            }
+        return paginator.get_paginated_response(data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        url_path='following'
+    )
+    def following(self, request):
+        # Лента подписок: материализованный список id (blog.timeline) + карточки одним запросом
+        queryset = PostCardSerializer.setup_queryset(timeline_queryset(request.user), request)
+        page = self.paginate_queryset(queryset)
+        serializer = PostCardSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=True,
+        methods=['get'],
+        permission_classes=[permissions.AllowAny],
+        url_path='similar'
+    )
+    def similar(self, request, pk=None):
+        # Готовые соседи из blog.similarity (refresh_similar_posts); ?limit= — сколько отдать
+        post = get_object_or_404(self.filter_visible(Post.objects.only('pk')), pk=pk)
+        neighbours, scores = SimilarPosts.objects.filter(post=post).values_list('neighbours', 'scores').first() or ([], [])
+        top_k = getattr(settings, 'SIMILAR_POSTS_TOP_K', 20)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), top_k)
+        except ValueError:
+            limit = 10
+
+        posts = PostCardSerializer.setup_queryset(
+            self.filter_visible(Post.objects.filter(pk__in=neighbours)), request
+        ).in_bulk()
+        rows = [(post_id, score) for post_id, score in zip(neighbours, scores) if post_id in posts][:limit]
+        data = PostCardSerializer([posts[post_id] for post_id, _ in rows], many=True, context=self.get_serializer_context()).data
+        for item, (_, score) in zip(data, rows):
+            item['similarity'] = score
+        return Response({'results': data})
+
     @action(
         detail=True,
         methods=['post'],
@@ -161,24 +310,14 @@ class PostViewSet(viewsets.ModelViewSet):
         url_path='likes'
     )
     def like(self, request, pk=None):
-        post = self.get_object()
-        user = request.user
-        with transaction.atomic():
-            if post.liked_by.filter(id=user.id).exists():
-                post.liked_by.remove(user)
-                # безопасно уменьшаем (не даём < 0)
-                Post.objects.filter(id=post.id, likes_count__gt=0).update(
-                    likes_count=F('likes_count') - 1
-                )
-                is_liked = False
-            else:
-                post.liked_by.add(user)
-                Post.objects.filter(id=post.id).update(
-                    likes_count=F('likes_count') + 1
-                )
-                is_liked = True
-            post.refresh_from_db(fields=['likes_count'])
-        return Response({'likes': post.likes_count, 'is_liked': is_liked})
+        # Переключение и новый счётчик — один SQL-оператор (blog.likes)
+        result = toggle_like(request.user, pk) if str(pk).isdigit() else None
+        if result is None:
+            raise NotFound()
+        likes, is_liked = result
+        # M2M-сигналов при прямом SQL нет — ETag'и списков зрителя сбрасываем сами
+        transaction.on_commit(lambda: bump_viewer_versions([request.user.pk]))
+        return Response({'likes': likes, 'is_liked': is_liked})
 
     @action(
         detail=True,
@@ -188,8 +327,11 @@ class PostViewSet(viewsets.ModelViewSet):
         url_path='views'
     )
     def view(self, request, pk=None):
-        post = self.get_object()
-        ttl = getattr(settings, 'POST_VIEW_UNIQUE_TTL', 21600)
+        # Только счётчик видимого поста — без ленты, prefetch'ей и refresh_from_db
+        pk = int(pk) if str(pk).isdigit() else None
+        views = self.filter_visible(Post.objects.filter(pk=pk)).values_list('views_count', flat=True).first()
+        if views is None:
+            raise NotFound()
         if request.user.is_authenticated:
             viewer_id = f'u{request.user.id}'
         else:
@@ -198,11 +340,44 @@ class PostViewSet(viewsets.ModelViewSet):
             ua = request.META.get('HTTP_USER_AGENT', '')
             fp_raw = f'{ip}:{ua}'
             viewer_id = 'a' + hashlib.sha256(fp_raw.encode()).hexdigest()[:32]
-        cache_key = f'pv:{post.id}:{viewer_id}'
-        if cache.add(cache_key, 1, timeout=ttl):
-            Post.objects.filter(id=post.id).update(views_count=F('views_count') + 1)
-            post.refresh_from_db(fields=['views_count'])
-        return Response({'views': post.views_count})
+        view_counter.add_viewer(pk, viewer_id)
+        new_views = register_unique_view(pk, viewer_id)
+        if new_views:
+            if getattr(settings, 'VIEW_COUNTER_BUFFERED', False):
+                view_counter.add(pk, new_views)
+            else:
+                Post.objects.filter(id=pk).update(views_count=F('views_count') + new_views, counters_changed_at=Now())
+                views += new_views
+        # Значение из БД плюс ещё не сброшенные просмотры этого процесса
+        return Response({'views': views + view_counter.pending(pk)})
+
+    @action(
+        detail=True,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        url_path='viewers'
+    )
+    def viewers(self, request, pk=None):
+        # Уникальные зрители по дням (оценка HyperLogLog) — автору и админу
+        post = get_object_or_404(Post.objects.only('id', 'author_id'), pk=pk)
+        if not ensure_author_or_admin(request, post):
+            return Response({'detail': 'Forbidden'}, status=403)
+        raw_days = request.query_params.get('days', '')
+        days = min(int(raw_days), 365) if raw_days.isdigit() and int(raw_days) > 0 else 30
+        since = timezone.localdate() - datetime.timedelta(days=days - 1)
+
+        total = HyperLogLog()
+        daily = []
+        for row in post.daily_viewers.filter(day__gte=since).order_by('day'):
+            total.merge(HyperLogLog.from_bytes(row.sketch))
+            daily.append({'day': row.day, 'unique_viewers': row.unique_viewers})
+        return Response({
+            'post': post.id,
+            'days': daily,
+            # Скетчи дней сливаются без двойного счёта зрителей, заходивших в разные дни
+            'unique_viewers': len(total),
+            'relative_error': round(total.error_bound, 4),
+        })
 
 class AdminPostViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminUserOrReadOnly]
@@ -210,8 +385,7 @@ class AdminPostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     pagination_class = AdminPageNumberPagination
-    filter_backends = [SearchFilter]
-    search_fields = ['title', 'author__username', 'tags__name']
+    filter_backends = [PostFullTextSearchFilter]
 
     @action(detail=True, methods=['patch'])
     def status(self, request, pk=None):
@@ -221,9 +395,11 @@ class AdminPostViewSet(viewsets.ModelViewSet):
         if new_status not in dict(Post.STATUS_CHOICES):
             return Response({'detail': 'Invalid status'}, status=400)
         post.status = new_status
-        post.save(update_fields=['status'])
-        if old_status != 'published' and new_status == 'published':
-            send_new_post_notification(post)
+        with transaction.atomic():
+            post.save(update_fields=['status'])
+            if old_status != 'published' and new_status == 'published':
+                enqueue_post_notification(post)
+                schedule_fan_out(post)
         return Response(PostSerializer(post, context={'request': request}).data)
 
 class CommentViewSet(viewsets.ModelViewSet):
@@ -245,6 +421,43 @@ class CommentViewSet(viewsets.ModelViewSet):
             raise ValueError('post id required')
         serializer.save(author=self.request.user, post_id=post_pk)
 
+class CommentThreadView(APIView):
+    '''
+    Дерево комментариев поста:
+    - по умолчанию — страница корневых комментариев (keyset-курсор) с ответами до ?depth= уровней;
+    - ?root=<id> — поддерево одного комментария (дочитать ветку глубже границы).
+    Ответы всех корней страницы — один рекурсивный запрос.
+    '''
+    permission_classes = [permissions.AllowAny]
+    default_depth = 5
+    max_depth = 20
+
+    def get(self, request, post_pk):
+        if not Post.objects.filter(pk=post_pk).exists():
+            raise NotFound('Post not found')
+        raw_depth = request.query_params.get('depth', '')
+        depth = min(max(int(raw_depth), 1), self.max_depth) if raw_depth.isdigit() else self.default_depth
+        queryset = thread_queryset().filter(post_id=post_pk)
+        context = {'request': request, 'view': self}
+
+        root_id = request.query_params.get('root')
+        if root_id:
+            root = get_object_or_404(queryset, pk=root_id)
+            descendants = attach_replies([root], depth)
+            self.preload_authors([root, *descendants], request)
+            return Response(CommentThreadSerializer(root, context=context).data)
+
+        paginator = CommentThreadCursorPagination()
+        roots = paginator.paginate_queryset(queryset.filter(parent_comment__isnull=True), request, view=self)
+        descendants = attach_replies(roots, depth)
+        self.preload_authors([*roots, *descendants], request)
+        data = CommentThreadSerializer(roots, many=True, context=context).data
+        return paginator.get_paginated_response(data)
+
+    def preload_authors(self, comments, request):
+        # is_subscribed для всех авторов дерева — одним запросом
+        ViewerRelations.for_request(request).load_users({comment.author_id for comment in comments})
+
 class PostIngredientCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -256,20 +469,9 @@ class PostIngredientCreateView(APIView):
         if not serializer.is_valid():
             print('DEBUG serializer.errors:', serializer.errors)
             return Response(serializer.errors, status=400)
-        created = []
-        with transaction.atomic():
-            if replace:
-                PostIngredient.objects.filter(post=post).delete()
-            for item in serializer.validated_data:
-                ingredient_id = item['ingredient_id']
-                quantity = item['quantity']
-                obj = PostIngredient.objects.create(
-                    post=post,
-                    ingredient_id=ingredient_id,
-                    quantity=quantity
-                )
-                created.append(obj.id)
-        return Response({'created': created, 'replaced': replace}, status=status.HTTP_201_CREATED)
+        items = serializer.validated_data if isinstance(serializer.validated_data, list) else [serializer.validated_data]
+        created = sync_ingredients(post, items, replace=replace)
+        return Response({'created': [obj.id for obj in created], 'replaced': replace}, status=status.HTTP_201_CREATED)
 
 class RecipeStepCreateView(APIView):
     permission_classes = [IsAuthenticated]
@@ -322,45 +524,115 @@ class RecipeStepCreateView(APIView):
             print('DEBUG step serializer errors:', serializer.errors)
             return Response(serializer.errors, status=400)
 
-        created_objs = []
-        with transaction.atomic():
-            if replace:
-                post.steps.all().delete()
-            for idx, item in enumerate(serializer.validated_data):
-                image = request.FILES.get(f'step_images_{idx}')
-                if image:
-                    if image.size > 5 * 1024 * 1024:
-                        return Response({'error': 'Step image too large (>5MB)'}, status=400)
-                    if not image.content_type.startswith('image/'):
-                        return Response({'error': 'Invalid step image type'}, status=400)
-                obj = RecipeStep.objects.create(
-                    post=post,
-                    order=item['order'],
-                    description=item['description'],
-                    image=image
-                )
-                created_objs.append(obj)
+        items = step_items(request, serializer.validated_data)
+        for item in items:
+            image = item['image']
+            if image:
+                if image.size > 5 * 1024 * 1024:
+                    return Response({'error': 'Step image too large (>5MB)'}, status=400)
+                if not image.content_type.startswith('image/'):
+                    return Response({'error': 'Invalid step image type'}, status=400)
+        _, created_objs = sync_steps(post, items, replace=replace)
 
         return Response(
             {'steps': RecipeStepSerializer(created_objs, many=True).data, 'replaced': replace},
             status=status.HTTP_201_CREATED
         )
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ListResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all().order_by('name')
     serializer_class = IngredientSerializer
     permission_classes = [IsAdminUserOrReadOnly]
     pagination_class = AdminPageNumberPagination
     filter_backends = [SearchFilter]
     search_fields = ['name']
+    cache_scope = 'ingredients'
+    cache_authenticated = True
+    cache_query_params = ('search', 'page', 'page_size')
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ListResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all().order_by('name')
     serializer_class = TagSerializer
     permission_classes = [IsAdminUserOrReadOnly]
     pagination_class = AdminPageNumberPagination
     filter_backends = [SearchFilter]
     search_fields = ['name']
+    cache_scope = 'tags'
+    cache_authenticated = True
+    cache_query_params = ('search', 'page', 'page_size')
+
+def trigram_suggest(queryset, fields, query, limit):
+    # Префикс (~* '^q') и нечёткое совпадение по словам (<%) — оба оператора обслуживает gin_trgm_ops
+    prefix = '^' + re.escape(query)
+    match = Q()
+    prefix_match = Q()
+    similarities = []
+    for field in fields:
+        prefix_match |= Q(**{f'{field}__iregex': prefix})
+        match |= Q(**{f'{field}__iregex': prefix}) | Q(**{f'{field}__trigram_word_similar': query})
+        similarities.append(TrigramWordSimilarity(query, field))
+    similarity = similarities[0] if len(similarities) == 1 else Greatest(*similarities)
+    return (queryset.filter(match)
+            .annotate(is_prefix=ExpressionWrapper(prefix_match, output_field=BooleanField()),
+                      similarity=similarity)
+            .order_by('-is_prefix', '-similarity', fields[0])[:limit])
+
+class AutocompleteView(APIView):
+    '''
+    Подсказки для редактора рецепта и поиска: /autocomplete/<kind>/?q=...&limit=
+    Фиксированный limit без COUNT и пагинации; короткие (самые частые) префиксы кешируются.
+    '''
+    permission_classes = [IsAuthenticated]
+    min_length = 2
+    default_limit = 10
+    max_limit = 20
+
+    def get(self, request, kind):
+        source = getattr(self, f'suggest_{kind}', None)
+        if kind not in ('ingredients', 'tags', 'users') or source is None:
+            raise NotFound('Unknown autocomplete source')
+
+        query = ' '.join(request.query_params.get('q', '').split())[:100]
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+        if len(query) < self.min_length or limit < 1:
+            return Response({'results': []})
+
+        cache_key = None
+        if len(query) <= getattr(settings, 'AUTOCOMPLETE_CACHE_MAX_PREFIX', 4):
+            digest = hashlib.md5(query.lower().encode()).hexdigest()
+            cache_key = f'ac:{kind}:{limit}:{digest}'
+            results = cache.get(cache_key)
+            if results is not None:
+                return Response({'results': self.present(kind, results)})
+
+        results = list(source(query, limit))
+        if cache_key:
+            cache.set(cache_key, results, timeout=getattr(settings, 'AUTOCOMPLETE_CACHE_TTL', 60))
+        return Response({'results': self.present(kind, results)})
+
+    def suggest_ingredients(self, query, limit):
+        return trigram_suggest(Ingredient.objects.all(), ['name'], query, limit).values('id', 'name')
+
+    def suggest_tags(self, query, limit):
+        return trigram_suggest(Tag.objects.all(), ['name'], query, limit).values('id', 'name', 'slug', 'color')
+
+    def suggest_users(self, query, limit):
+        return (trigram_suggest(CustomUser.objects.filter(is_active=True), ['username', 'display_name'], query, limit)
+                .values('id', 'username', 'display_name', 'avatar'))
+
+    def present(self, kind, results):
+        if kind != 'users':
+            return results
+        media_urls = MediaURLResolver.for_request(self.request)
+        out = []
+        for row in results:
+            row = dict(row)
+            row['avatar_url'] = media_urls.url(row.pop('avatar'))
+            out.append(row)
+        return out
 
 class IngredientSyncView(APIView):
     permission_classes = [IsAuthenticated]
@@ -381,33 +653,7 @@ class IngredientSyncView(APIView):
         serializer = PostIngredientBulkSerializer(data=request.data, many=True)
         serializer.is_valid(raise_exception=True)
 
-        existing = {pi.id: pi for pi in PostIngredient.objects.filter(post=post)}
-        processed_ids = set()
-        with transaction.atomic():
-            for item in serializer.validated_data:
-                iid = item.get('id')
-                delete_flag = item.get('_delete', False)
-                if iid:
-                    obj = existing.get(iid)
-                    if not obj:
-                        continue
-                    if delete_flag:
-                        obj.delete()
-                        continue
-                    # update
-                    ingredient_id = item.get('ingredient_id') or obj.ingredient_id
-                    obj.ingredient_id = ingredient_id
-                    obj.quantity = item.get('quantity', obj.quantity)
-                    obj.save()
-                    processed_ids.add(iid)
-                else:
-                    if delete_flag:
-                        continue
-                    PostIngredient.objects.create(
-                        post=post,
-                        ingredient_id=item['ingredient_id'],
-                        quantity=item['quantity']
-                    )
+        sync_ingredients(post, serializer.validated_data)
 
         result = PostIngredient.objects.filter(post=post).select_related('ingredient')
         out = PostIngredientSerializer(result, many=True).data
@@ -440,42 +686,8 @@ class RecipeStepSyncView(APIView):
         serializer = RecipeStepBulkSerializer(data=data_list, many=True)
         serializer.is_valid(raise_exception=True)
 
-        existing = {s.id: s for s in post.steps.all()}
-        with transaction.atomic():
-            for idx, item in enumerate(serializer.validated_data):
-                sid = item.get('id')
-                delete_flag = item.get('_delete', False)
-                image = request.FILES.get(f'step_images_{idx}')
-                if sid:
-                    step = existing.get(sid)
-                    if not step:
-                        continue
-                    if delete_flag:
-                        step.delete()
-                        continue
-                    # update
-                    step.order = item.get('order', step.order)
-                    step.description = item.get('description', step.description)
-                    if image:
-                        step.image = image
-                    step.save()
-                else:
-                    if delete_flag:
-                        continue
-                    RecipeStep.objects.create(
-                        post=post,
-                        order=item['order'],
-                        description=item['description'],
-                        image=image if image else None
-                    )
-
-            # Нормализуем порядок (уникальность order внутри поста)
-            ordered = list(post.steps.order_by('order', 'id'))
-            for i, step in enumerate(ordered, start=1):
-                if step.order != i:
-                    step.order = i
-                    step.save(update_fields=['order'])
-
-        out = RecipeStepSerializer(post.steps.order_by('order'), many=True, context={'request': request}).data
+        steps, _ = sync_steps(post, step_items(request, serializer.validated_data))
+
+        out = RecipeStepSerializer(steps, many=True, context={'request': request}).data
         return Response({'steps': out})
 
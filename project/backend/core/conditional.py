@@ -0,0 +1,31 @@
+import hashlib
+import json
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(*parts, weak=False):
+    digest = hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def conditional_get(request, build_response, etag=None, last_modified=None):
+    '''
+    Условный GET: валидаторы считаются до сериализации. При совпадении
+    If-None-Match / If-Modified-Since — 304 без тела, build_response() не вызывается.
+    last_modified — datetime или None.
+    '''
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build_response()
+        if response.status_code != 200:
+            return response
+    if etag:
+        response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    # Валидаторы зависят от зрителя (is_liked, is_subscribed)
+    patch_vary_headers(response, ['Authorization'])
+    return response
@@ -0,0 +1,169 @@
+import io
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .media_urls import MediaURLResolver
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VARIANT_WIDTHS = {
+    'cover': (320, 640, 1280),
+    'step': (320, 640, 1280),
+    'avatar': (64, 128, 256),
+}
+# Формат варианта -> (расширение файла, формат Pillow)
+VARIANT_FORMATS = {'webp': ('webp', 'WEBP'), 'jpeg': ('jpg', 'JPEG')}
+VARIANT_NAME_RE = re.compile(r'^(?P<original>.+)\.w(?P<width>\d+)\.(?P<ext>webp|jpg)$')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_widths(kind):
+    return tuple(getattr(settings, 'IMAGE_VARIANT_WIDTHS', DEFAULT_VARIANT_WIDTHS)[kind])
+
+
+def all_variant_widths():
+    return {width for widths in getattr(settings, 'IMAGE_VARIANT_WIDTHS', DEFAULT_VARIANT_WIDTHS).values() for width in widths}
+
+
+def variant_name(name, width, fmt):
+    '''Вариант лежит рядом с оригиналом: posts/covers/x.png -> posts/covers/x.png.w640.webp.'''
+    return f'{name}.w{width}.{VARIANT_FORMATS[fmt][0]}'
+
+
+def parse_variant_name(name):
+    '''Обратное к variant_name: (оригинал, ширина, формат) или None.'''
+    match = VARIANT_NAME_RE.match(name)
+    if not match:
+        return None
+    fmt = 'webp' if match['ext'] == 'webp' else 'jpeg'
+    return match['original'], int(match['width']), fmt
+
+
+def render_variant(image, width, fmt):
+    '''
+    Кодирует вариант шириной не больше width (без увеличения) в bytes.
+    Метаданные (EXIF, XMP, ICC) не переносятся: ориентацию применяет exif_transpose до вызова.
+    '''
+    variant = image.copy()
+    if variant.width > width:
+        variant.thumbnail((width, round(variant.height * width / variant.width) or 1), Image.LANCZOS)
+    has_alpha = variant.mode in ('RGBA', 'LA') or (variant.mode == 'P' and 'transparency' in variant.info)
+    if fmt == 'jpeg':
+        if has_alpha:
+            background = Image.new('RGB', variant.size, (255, 255, 255))
+            background.paste(variant.convert('RGBA'), mask=variant.convert('RGBA').getchannel('A'))
+            variant = background
+        else:
+            variant = variant.convert('RGB')
+    else:
+        variant = variant.convert('RGBA' if has_alpha else 'RGB')
+    out = io.BytesIO()
+    quality = getattr(settings, 'IMAGE_VARIANT_QUALITY', 80)
+    variant.save(out, VARIANT_FORMATS[fmt][1], quality=quality, optimize=fmt == 'jpeg', method=4 if fmt == 'webp' else 0)
+    return out.getvalue()
+
+
+def open_original(name, storage=default_storage):
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        # Image.open отказывает только при 2 × MAX_IMAGE_PIXELS, между 1× и 2× лишь предупреждает —
+        # проверяем до декодирования (warnings.catch_warnings в пуле потоков не годится)
+        if Image.MAX_IMAGE_PIXELS and image.width * image.height > Image.MAX_IMAGE_PIXELS:
+            raise Image.DecompressionBombError(f'{name}: {image.width}x{image.height} exceeds MAX_IMAGE_PIXELS')
+        image.load()
+    return ImageOps.exif_transpose(image)
+
+
+def generate_variants(name, kind, storage=default_storage, force=False):
+    '''
+    Создаёт все варианты изображения name (ширины IMAGE_VARIANT_WIDTHS[kind], WebP и JPEG).
+    Существующие пропускаются, если не force. Возвращает число записанных файлов.
+    '''
+    targets = [
+        variant_name(name, width, fmt)
+        for width in variant_widths(kind)
+        for fmt in VARIANT_FORMATS
+    ]
+    if not force and all(storage.exists(target) for target in targets):
+        return 0
+    image = open_original(name, storage)
+    written = 0
+    for width in variant_widths(kind):
+        for fmt in VARIANT_FORMATS:
+            target = variant_name(name, width, fmt)
+            if not force and storage.exists(target):
+                continue
+            save_variant(target, render_variant(image, width, fmt), storage)
+            written += 1
+    return written
+
+
+def save_variant(target, data, storage=default_storage):
+    # ContentAddressedStorage адресует всё, что идёт через save(), — вариант пишется отдельным методом
+    save_derived = getattr(storage, 'save_derived', None)
+    if save_derived is not None:
+        save_derived(target, ContentFile(data))
+        return
+    # Имя варианта детерминировано — перезаписываем, а не получаем x_AbCdEf.webp от storage
+    if storage.exists(target):
+        storage.delete(target)
+    storage.save(target, ContentFile(data))
+
+
+def delete_variants(name, storage=default_storage):
+    for width in all_variant_widths():
+        for fmt in VARIANT_FORMATS:
+            target = variant_name(name, width, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2), thread_name_prefix='image-variants')
+    return _executor
+
+
+def _generate_logged(name, kind):
+    try:
+        generate_variants(name, kind)
+    except Exception:
+        logger.exception('Failed to generate image variants for %s', name)
+
+
+def schedule_variants(field_file, kind):
+    '''После коммита строит варианты загруженного файла в пуле потоков, не задерживая ответ.'''
+    if not field_file or not getattr(settings, 'IMAGE_VARIANTS_ON_UPLOAD', True):
+        return
+    name = field_file.name
+    transaction.on_commit(lambda: _get_executor().submit(_generate_logged, name, kind))
+
+
+def srcset(field_file, kind, request):
+    '''
+    {'webp': 'url 320w, url 640w, ...', 'jpeg': ...} для <picture>/<img srcset>.
+    Ширина в дескрипторе — номинальная: у узкого оригинала вариант не увеличивается.
+    '''
+    media_urls = MediaURLResolver.for_request(request)
+    if not field_file or not media_urls.available:
+        return None
+    return {
+        fmt: ', '.join(
+            f'{media_urls.url(variant_name(field_file.name, width, fmt))} {width}w'
+            for width in variant_widths(kind)
+        )
+        for fmt in VARIANT_FORMATS
+    }
@@ -0,0 +1,133 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from .storage import is_blob_name
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def media_cache_control(name):
+    '''Blob (имя — хеш содержимого) не меняется никогда; остальные файлы могут быть перезаписаны.'''
+    if is_blob_name(name):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={getattr(settings, "MEDIA_CACHE_MAX_AGE", 3600)}'
+
+
+def parse_range(header, size):
+    '''
+    Один диапазон из Range: (start, end) включительно. None — отдать файл целиком
+    (заголовка нет, он некорректен или диапазонов несколько); ValueError — диапазон вне файла (416).
+    '''
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            raise ValueError(header)
+    else:
+        if int(last) == 0 or size == 0:
+            raise ValueError(header)
+        start, end = max(size - int(last), 0), size - 1
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+class RangeReader:
+    '''Читает не больше length байт с текущей позиции файла — тело ответа 206 для FileResponse.'''
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _stream(request, full_path, st, content_type, etag, last_modified):
+    size = st.st_size
+    try:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size) if _if_range_matches(request, etag, last_modified) else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(RangeReader(file, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.block_size = getattr(settings, 'MEDIA_STREAM_CHUNK_SIZE', 64 * 1024)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def media_response(request, name):
+    '''
+    Ответ с файлом name из MEDIA_ROOT в режиме MEDIA_SERVE_MODE:
+    'x-accel' — заголовок X-Accel-Redirect (nginx отдаёт файл сам, с Range),
+    'x-sendfile' — X-Sendfile (Apache mod_xsendfile, lighttpd),
+    'python' — FileResponse кусками по MEDIA_STREAM_CHUNK_SIZE с поддержкой Range.
+    Условные запросы (If-None-Match / If-Modified-Since) получают 304 без чтения файла.
+    '''
+    full_path = safe_join(settings.MEDIA_ROOT, name)
+    try:
+        st = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404
+
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    last_modified = int(st.st_mtime)
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        mode = getattr(settings, 'MEDIA_SERVE_MODE', 'python')
+        if mode == 'x-accel':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/') + quote(name)
+        elif mode == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = full_path
+        else:
+            response = _stream(request, full_path, st, content_type, etag, last_modified)
+    if response.status_code in (200, 206, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = media_cache_control(name)
+    return response
@@ -0,0 +1,160 @@
+import collections
+import hashlib
+import json
+import os
+import time
+
+from .images import parse_variant_name
+from .models import MediaBlob
+
+
+def name_key(name):
+    '''
+    8 байт вместо строки имени: множество ссылок на миллионы файлов помещается в память.
+    Коллизия только оставит лишний файл на диске — удалить нужный она не может.
+    '''
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'big')
+
+
+def referenced_keys(sources, chunk_size=5000):
+    '''Ключи name_key всех имён файлов из полей sources ([(модель, поле), ...]), читаются потоком.'''
+    keys = set()
+    for model, field in sources:
+        names = (model.objects
+                 .exclude(**{f'{field}__isnull': True})
+                 .exclude(**{field: ''})
+                 .order_by()
+                 .values_list(field, flat=True)
+                 .iterator(chunk_size=chunk_size))
+        keys.update(map(name_key, names))
+    return keys
+
+
+def still_referenced(sources, names):
+    '''Имена из names, на которые ссылаются сейчас (перепроверка перед удалением).'''
+    found = set()
+    for model, field in sources:
+        found.update(model.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+    return found
+
+
+def walk_media(root, resume_after=(), prune_before=None):
+    '''
+    Файлы под root как (кортеж частей пути, DirEntry), в порядке отсортированных имён — порядок
+    одинаков между запусками, поэтому можно продолжить после resume_after. Символические ссылки
+    пропускаются. prune_before — удалять опустевшие каталоги, не менявшиеся с этого момента.
+    '''
+    def walk(directory, parts):
+        with os.scandir(directory) as iterator:
+            entries = sorted(iterator, key=lambda entry: entry.name)
+        for entry in entries:
+            path = parts + (entry.name,)
+            if entry.is_symlink():
+                continue
+            if entry.is_dir():
+                # Каталог целиком до точки продолжения — не заходим
+                if path < resume_after[:len(path)]:
+                    continue
+                yield from walk(entry.path, path)
+            elif path > resume_after:
+                yield path, entry
+        if prune_before is not None and parts:
+            try:
+                if os.stat(directory).st_mtime < prune_before:
+                    os.rmdir(directory)
+            except OSError:
+                pass
+
+    yield from walk(root, ())
+
+
+def _throttle(max_rate):
+    started = time.monotonic()
+    count = 0
+
+    def tick():
+        nonlocal count
+        count += 1
+        ahead = count / max_rate - (time.monotonic() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+    return tick if max_rate else (lambda: None)
+
+
+def _read_state(state_path):
+    if state_path and os.path.exists(state_path):
+        with open(state_path) as f:
+            return tuple(json.load(f)['after'])
+    return ()
+
+
+def _write_state(state_path, parts):
+    temp_path = f'{state_path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump({'after': list(parts)}, f)
+    os.replace(temp_path, state_path)
+
+
+def collect_garbage(root, sources, grace, delete=False, state_path=None, max_rate=0, batch_size=500, checkpoint_every=10000, on_orphan=None):
+    '''
+    Ищет в root файлы, на которые не ссылается ни одно поле sources и которые не менялись
+    дольше grace секунд; варианты изображений (core.images) принадлежат своему оригиналу.
+    С delete — удаляет их (и опустевшие каталоги). С state_path — сохраняет позицию каждые
+    checkpoint_every файлов и продолжает с неё при следующем запуске; после полного прохода файл
+    удаляется. max_rate — не больше N просмотренных файлов в секунду. Возвращает счётчики.
+    '''
+    stats = collections.Counter()
+    keys = referenced_keys(sources)
+    cutoff = time.time() - grace
+    resume_after = _read_state(state_path)
+    stats['resumed'] = int(bool(resume_after))
+    tick = _throttle(max_rate)
+    candidates = {}
+
+    def flush():
+        if not candidates:
+            return
+        owners = {name: (parse_variant_name(name) or (name,))[0] for name in candidates}
+        referenced = still_referenced(sources, list(set(owners.values())))
+        removed = []
+        for name, size in candidates.items():
+            if owners[name] in referenced:
+                stats['referenced'] += 1
+                continue
+            stats['orphans'] += 1
+            stats['orphan_bytes'] += size
+            if on_orphan:
+                on_orphan(name, size)
+            if delete:
+                try:
+                    os.remove(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                stats['deleted'] += 1
+                removed.append(name)
+        if removed:
+            MediaBlob.objects.filter(name__in=removed).delete()
+        candidates.clear()
+
+    for parts, entry in walk_media(root, resume_after, prune_before=cutoff if delete else None):
+        tick()
+        stats['scanned'] += 1
+        name = '/'.join(parts)
+        owner = (parse_variant_name(name) or (name,))[0]
+        if name_key(owner) in keys:
+            stats['referenced'] += 1
+        elif entry.stat(follow_symlinks=False).st_mtime > cutoff:
+            stats['recent'] += 1
+        else:
+            candidates[name] = entry.stat(follow_symlinks=False).st_size
+            if len(candidates) >= batch_size:
+                flush()
+        if state_path and stats['scanned'] % checkpoint_every == 0:
+            # Позиция сохраняется только после удаления всего, что было до неё
+            flush()
+            _write_state(state_path, parts)
+    flush()
+    if state_path and os.path.exists(state_path):
+        os.remove(state_path)
+    return stats
@@ -0,0 +1,82 @@
+import time
+import zlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import PermissionDenied
+from django.utils.crypto import constant_time_compare
+from django.utils.encoding import filepath_to_uri
+
+
+def _signer():
+    return signing.Signer(key=getattr(settings, 'MEDIA_URL_SIGNING_KEY', None) or settings.SECRET_KEY, salt='media-url')
+
+
+def media_url_expires(now=None):
+    '''
+    Срок годности подписанной ссылки, округлённый вверх до окна MEDIA_URL_TTL: в пределах окна
+    URL одного файла одинаков (кешируется браузером и CDN) и живёт не меньше MEDIA_URL_TTL секунд.
+    '''
+    ttl = getattr(settings, 'MEDIA_URL_TTL', 60 * 60)
+    now = int(now if now is not None else time.time())
+    return (now // ttl + 2) * ttl
+
+
+def media_signature(name, expires):
+    return _signer().signature(f'{name}:{expires}')
+
+
+def check_media_signature(request, name):
+    '''Для MEDIA_URL_SIGNED: 403, если подпись не совпадает или срок истёк.'''
+    if not getattr(settings, 'MEDIA_URL_SIGNED', False):
+        return
+    expires = request.GET.get('expires', '')
+    signature = request.GET.get('sig', '')
+    if not expires.isdigit() or int(expires) < time.time() or not constant_time_compare(signature, media_signature(name, expires)):
+        raise PermissionDenied
+
+
+class MediaURLResolver:
+    '''
+    Абсолютные URL файлов media для сериализаторов. Базовый URL считается один раз на запрос
+    (build_absolute_uri разбирает хост, схему и X-Forwarded-* при каждом вызове) или берётся из
+    MEDIA_CDN_ORIGINS — тогда хост выбирается по хешу имени файла, и один файл всегда на одном хосте.
+    С MEDIA_URL_SIGNED к URL добавляются expires и sig (check_media_signature).
+    '''
+
+    def __init__(self, base_url=None):
+        self.origins = [origin.rstrip('/') + '/' for origin in getattr(settings, 'MEDIA_CDN_ORIGINS', [])]
+        self.base_url = base_url
+        self.signed = getattr(settings, 'MEDIA_URL_SIGNED', False)
+        self.expires = media_url_expires() if self.signed else None
+
+    @classmethod
+    def for_request(cls, request):
+        if request is None:
+            return cls()
+        resolver = getattr(request, '_media_url_resolver', None)
+        if resolver is None:
+            resolver = cls(request.build_absolute_uri(settings.MEDIA_URL))
+            request._media_url_resolver = resolver
+        return resolver
+
+    @property
+    def available(self):
+        '''Без запроса и без CDN абсолютный URL построить не из чего.'''
+        return bool(self.origins or self.base_url)
+
+    def url(self, name):
+        if not name or not self.available:
+            return None
+        if self.origins:
+            base = self.origins[zlib.crc32(name.encode()) % len(self.origins)]
+        else:
+            base = self.base_url
+        url = base + filepath_to_uri(name)
+        if self.signed:
+            url += '?' + urlencode({'expires': self.expires, 'sig': media_signature(name, self.expires)})
+        return url
+
+    def file_url(self, field_file):
+        return self.url(field_file.name) if field_file else None
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MovedMedia",
+            fields=[
+                (
+                    "old_name",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("new_name", models.CharField(max_length=255)),
+                ("moved_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
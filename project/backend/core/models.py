@@ -1,3 +1,31 @@
 from django.db import models
+from django.db.models import Q
 
-# Create your models here.
+
+class MediaBlob(models.Model):
+    '''
+    Файл ContentAddressedStorage (core.storage) и число ссылок на него из полей изображений.
+    released_at — когда ссылок не осталось; файл удаляется purge_media_blobs после MEDIA_BLOB_GRACE.
+    '''
+    name = models.CharField(max_length=100, primary_key=True)
+    refcount = models.IntegerField(default=0)
+    released_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['released_at'], name='mediablob_released_idx', condition=Q(refcount=0)),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+class MovedMedia(models.Model):
+    '''Старое имя файла -> новое после reshard_media: старые URL отвечают редиректом (core.views).'''
+    old_name = models.CharField(max_length=255, primary_key=True)
+    new_name = models.CharField(max_length=255)
+    moved_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.old_name} -> {self.new_name}'
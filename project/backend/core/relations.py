@@ -0,0 +1,79 @@
+from blog.models import Like
+from blog.utils import bump_cache_generation, get_cache_generation
+from users.models import CustomUser
+
+VIEWER_VERSION_CACHE_KEY = 'viewer:{}:version'
+
+
+def get_viewer_version(user_id):
+    return get_cache_generation(VIEWER_VERSION_CACHE_KEY.format(user_id))
+
+
+def bump_viewer_versions(user_ids):
+    '''Лайки/подписки пользователя изменились — его ETag'и списков больше не валидны.'''
+    for user_id in set(user_ids):
+        bump_cache_generation(VIEWER_VERSION_CACHE_KEY.format(user_id))
+
+
+class ViewerRelations:
+    '''
+    Отношения текущего пользователя к постам и авторам (лайк, подписка) в рамках одного запроса.
+    Списочные сериализаторы заранее загружают всю страницу — по одному запросу на тип связи,
+    вместо .exists() на каждую строку. Для одиночного объекта загрузка ленивая.
+    '''
+
+    def __init__(self, user):
+        self.user = user if user is not None and user.is_authenticated else None
+        self._liked = {}
+        self._subscribed = {}
+
+    @classmethod
+    def for_request(cls, request):
+        if request is None:
+            return cls(None)
+        relations = getattr(request, '_viewer_relations', None)
+        if relations is None:
+            relations = cls(getattr(request, 'user', None))
+            request._viewer_relations = relations
+        return relations
+
+    def load_posts(self, post_ids):
+        missing = {pk for pk in post_ids if pk is not None and pk not in self._liked}
+        if not missing:
+            return
+        liked = set()
+        if self.user:
+            liked = set(
+                Like.objects
+                .filter(user_id=self.user.pk, post_id__in=missing)
+                .values_list('post_id', flat=True)
+            )
+        for pk in missing:
+            self._liked[pk] = pk in liked
+
+    def load_users(self, user_ids):
+        missing = {pk for pk in user_ids if pk is not None and pk not in self._subscribed}
+        if not missing:
+            return
+        subscribed = set()
+        if self.user:
+            # obj.subscribers: from_customuser = автор, to_customuser = подписчик
+            subscribed = set(
+                CustomUser.subscribers.through.objects
+                .filter(to_customuser_id=self.user.pk, from_customuser_id__in=missing)
+                .values_list('from_customuser_id', flat=True)
+            )
+        for pk in missing:
+            self._subscribed[pk] = pk in subscribed
+
+    def is_liked(self, post):
+        if self.user is None:
+            return False
+        self.load_posts([post.pk])
+        return self._liked[post.pk]
+
+    def is_subscribed(self, user):
+        if self.user is None or user.pk == self.user.pk:
+            return False
+        self.load_users([user.pk])
+        return self._subscribed[user.pk]
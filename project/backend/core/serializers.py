@@ -0,0 +1,40 @@
+from rest_framework import serializers
+
+
+def split_query_list(value):
+    return {item.strip() for item in (value or '').split(',') if item.strip()}
+
+
+class SparseFieldsetMixin:
+    '''
+    Разреженные наборы полей для корневого сериализатора ответа:
+    - ?fields=id,title — вернуть только перечисленные поля;
+    - ?expand=steps — добавить поля из Meta.expandable_fields, которые по умолчанию скрыты.
+    Вложенные сериализаторы (например author у поста) не затрагиваются, write-only поля остаются.
+    '''
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not self._is_root():
+            return fields
+
+        expand = split_query_list(request.query_params.get(self.expand_query_param))
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expand:
+                fields.pop(name, None)
+
+        only = split_query_list(request.query_params.get(self.fields_query_param))
+        if only:
+            for name, field in list(fields.items()):
+                if name not in only and not field.write_only:
+                    fields.pop(name)
+        return fields
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
@@ -0,0 +1,287 @@
+import collections
+import datetime
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .images import VARIANT_FORMATS, all_variant_widths, variant_name
+from .models import MediaBlob
+
+HASH_CHUNK_SIZE = 64 * 1024
+EXTENSION_RE = re.compile(r'^\.[a-z0-9]{1,8}$')
+
+RETAIN_SQL = '''
+INSERT INTO {blob} (name, refcount, released_at, created_at)
+VALUES (%s, %s, NULL, now())
+ON CONFLICT (name) DO UPDATE SET refcount = {blob}.refcount + EXCLUDED.refcount, released_at = NULL
+'''
+
+RELEASE_SQL = '''
+UPDATE {blob}
+SET refcount = GREATEST(refcount - %s, 0),
+    released_at = CASE WHEN refcount - %s <= 0 THEN now() ELSE NULL END
+WHERE name = %s
+'''
+
+# Точное значение счётчика (пересчёт по полям изображений)
+SET_REFCOUNT_SQL = '''
+INSERT INTO {blob} (name, refcount, released_at, created_at)
+VALUES (%s, %s, NULL, now())
+ON CONFLICT (name) DO UPDATE SET refcount = EXCLUDED.refcount, released_at = NULL
+'''
+
+
+def blob_prefix():
+    return getattr(settings, 'MEDIA_BLOB_PREFIX', 'blobs').strip('/')
+
+
+def upload_fanout():
+    '''Ширины уровней каталогов раскладки (MEDIA_UPLOAD_FANOUT): (2, 2) — ab/cd/, по 256 на уровень.'''
+    return tuple(getattr(settings, 'MEDIA_UPLOAD_FANOUT', (2, 2)))
+
+
+def fanout_segments(hexdigest):
+    segments, position = [], 0
+    for width in upload_fanout():
+        segments.append(hexdigest[position:position + width])
+        position += width
+    return segments
+
+
+def blob_name(digest, extension=''):
+    '''blobs/ab/cd/abcd….jpg — каталоги из начала хеша, чтобы не копить файлы в одном.'''
+    return '/'.join([blob_prefix(), *fanout_segments(digest), f'{digest}{extension}'])
+
+
+def _key_segments(key):
+    return fanout_segments(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+
+
+def sharded_upload_path(directory, name):
+    '''
+    directory/ab/cd/name для upload_to: каталоги — из md5 первой части name (имени файла или,
+    у аватаров, id пользователя), поэтому файлы распределяются равномерно при любых именах.
+    '''
+    return '/'.join([directory, *_key_segments(name.split('/', 1)[0]), name])
+
+
+def resharded_name(directory, name):
+    '''Имя файла из плоского каталога directory в раскладке sharded_upload_path; None — уже разложен или не из directory.'''
+    if not name or not name.startswith(f'{directory}/'):
+        return None
+    parts = name[len(directory) + 1:].split('/')
+    depth = len(upload_fanout())
+    if len(parts) > depth and parts[:depth] == _key_segments(parts[depth]):
+        return None
+    return sharded_upload_path(directory, '/'.join(parts))
+
+
+def move_media_file(old, new, storage=default_storage):
+    '''
+    Переносит файл хранилища вместе с вариантами (core.images). Повторный вызов после сбоя
+    безопасен: уже перенесённый файл пропускается. False — на новом месте другой файл.
+    '''
+    source, target = storage.path(old), storage.path(new)
+    if not os.path.exists(source):
+        return os.path.exists(target)
+    if os.path.exists(target):
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(source, target)
+    for width in all_variant_widths():
+        for fmt in VARIANT_FORMATS:
+            variant = storage.path(variant_name(old, width, fmt))
+            if os.path.exists(variant):
+                os.replace(variant, storage.path(variant_name(new, width, fmt)))
+    return True
+
+
+def blob_extension(name):
+    extension = os.path.splitext(name)[1].lower()
+    return extension if EXTENSION_RE.match(extension) else ''
+
+
+def is_blob_path(name):
+    '''Файл под префиксом blob-хранилища: сам blob или его производные (варианты core.images).'''
+    return bool(name) and name.startswith(f'{blob_prefix()}/')
+
+
+def is_blob_name(name):
+    return bool(name) and re.fullmatch(rf'{re.escape(blob_prefix())}/(?:[0-9a-f]+/)*[0-9a-f]{{64}}(\.[a-z0-9]{{1,8}})?', name) is not None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    '''
+    Хранит каждое содержимое один раз: имя файла — SHA-256, посчитанный при потоковой записи
+    (blobs/ab/cd/<sha256>.<ext>, уровни — MEDIA_UPLOAD_FANOUT), каталог из upload_to не используется.
+    Повторная загрузка того же файла возвращает то же имя и не занимает места.
+
+    Один blob могут держать несколько полей, поэтому delete() для blob — no-op: ссылки считает
+    MediaBlob (retain_blobs/release_blobs), файлы без ссылок удаляет purge_released_blobs.
+    Варианты изображений пишет только save_derived (core.images.save_variant) — под их
+    детерминированными именами; всё, что приходит через save(), адресуется по содержимому,
+    как бы ни называлось. Файлы вне префикса (загруженные до перехода) удаляются как в FileSystemStorage.
+    '''
+
+    def _save(self, name, content):
+        digest, temp_path = self._spool(content)
+        return self._store(temp_path, blob_name(digest, blob_extension(name)), overwrite=False)
+
+    def save_derived(self, name, content):
+        '''Производный файл (вариант core.images) под заданным именем рядом с оригиналом; перезаписывает.'''
+        _, temp_path = self._spool(content)
+        return self._store(temp_path, name, overwrite=True)
+
+    def _store(self, temp_path, target, overwrite):
+        try:
+            full_path = self.path(target)
+            os.makedirs(os.path.dirname(full_path), mode=self.directory_permissions_mode or 0o777, exist_ok=True)
+            if overwrite or not os.path.exists(full_path):
+                # Атомарно: читатель видит либо старый файл, либо полностью записанный
+                os.replace(temp_path, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+            else:
+                # Повторная загрузка: свежий mtime защищает blob от gc_media, пока ссылка не сохранена
+                os.utime(full_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        return target
+
+    def _spool(self, content):
+        '''Пишет содержимое во временный файл рядом с хранилищем, считая хеш по ходу. Возвращает (sha256, путь).'''
+        temp_dir = self.path(f'{blob_prefix()}/.tmp')
+        os.makedirs(temp_dir, mode=self.directory_permissions_mode or 0o777, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=temp_dir)
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(descriptor, 'wb') as out:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(HASH_CHUNK_SIZE):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return digest.hexdigest(), temp_path
+
+    def content_name(self, name):
+        '''Имя blob, под которым лёг бы уже сохранённый файл name.'''
+        digest = hashlib.sha256()
+        with open(self.path(name), 'rb') as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+        return blob_name(digest.hexdigest(), blob_extension(name))
+
+    def ingest(self, name):
+        '''
+        Переносит уже лежащий в хранилище файл в blob без копирования (жёсткая ссылка, если можно).
+        Исходный файл остаётся — его удаляют после того, как ссылки в БД переписаны. Возвращает имя blob.
+        '''
+        source = self.path(name)
+        target = self.content_name(name)
+        full_path = self.path(target)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), mode=self.directory_permissions_mode or 0o777, exist_ok=True)
+            try:
+                os.link(source, full_path)
+            except FileExistsError:
+                pass
+            except OSError:
+                shutil.copyfile(source, full_path)
+        return target
+
+    def delete(self, name):
+        if is_blob_path(name):
+            return
+        super().delete(name)
+
+    def purge(self, name):
+        '''Удаляет blob и его варианты — только для blob без ссылок (purge_released_blobs).'''
+        for width in all_variant_widths():
+            for fmt in VARIANT_FORMATS:
+                super().delete(variant_name(name, width, fmt))
+        super().delete(name)
+
+
+def _blob_counts(names):
+    return collections.Counter(name for name in names if is_blob_name(name))
+
+
+def retain_blobs(names):
+    '''+1 ссылка на каждый blob из names (в текущей транзакции). Не-blob имена пропускаются.'''
+    counts = _blob_counts(names)
+    if counts:
+        with connection.cursor() as cursor:
+            cursor.executemany(RETAIN_SQL.format(blob=connection.ops.quote_name(MediaBlob._meta.db_table)),
+                               [(name, count) for name, count in counts.items()])
+
+
+def release_blobs(names):
+    '''-1 ссылка; blob без ссылок получает released_at и удаляется позже purge_released_blobs.'''
+    counts = _blob_counts(names)
+    if counts:
+        with connection.cursor() as cursor:
+            cursor.executemany(RELEASE_SQL.format(blob=connection.ops.quote_name(MediaBlob._meta.db_table)),
+                               [(count, count, name) for name, count in counts.items()])
+
+
+def purge_released_blobs(grace=None, storage=default_storage, batch_size=500):
+    '''
+    Удаляет файлы blob, на которые больше MEDIA_BLOB_GRACE секунд нет ссылок.
+    Пауза закрывает гонку с загрузкой того же содержимого: файл уже записан, а ссылка появится
+    только при сохранении модели. Возвращает число удалённых blob.
+    '''
+    if grace is None:
+        grace = getattr(settings, 'MEDIA_BLOB_GRACE', 24 * 60 * 60)
+    cutoff = timezone.now() - datetime.timedelta(seconds=grace)
+    purge = getattr(storage, 'purge', storage.delete)
+    purged = 0
+    while True:
+        with transaction.atomic():
+            names = list(MediaBlob.objects
+                         .select_for_update(skip_locked=True)
+                         .filter(refcount=0, released_at__lt=cutoff)
+                         .values_list('name', flat=True)[:batch_size])
+            if not names:
+                return purged
+            for name in names:
+                purge(name)
+            MediaBlob.objects.filter(name__in=names).delete()
+        purged += len(names)
+
+
+def rebuild_blob_refcounts(sources):
+    '''
+    Пересчитывает MediaBlob.refcount по полям изображений: sources — [(модель, поле), ...].
+    Для починки после массовых изменений в обход сигналов (QuerySet.update, bulk_create).
+    '''
+    counts = collections.Counter()
+    for model, field in sources:
+        rows = (model.objects
+                .filter(**{f'{field}__startswith': f'{blob_prefix()}/'})
+                .order_by()
+                .values_list(field)
+                .annotate(references=Count('pk')))
+        for name, references in rows.iterator():
+            if is_blob_name(name):
+                counts[name] += references
+    table = connection.ops.quote_name(MediaBlob._meta.db_table)
+    with transaction.atomic():
+        # Сначала все без ссылок, затем точные счётчики — в одной транзакции
+        MediaBlob.objects.filter(refcount__gt=0).update(refcount=0, released_at=timezone.now())
+        with connection.cursor() as cursor:
+            cursor.executemany(SET_REFCOUNT_SQL.format(blob=table), list(counts.items()))
+    return len(counts)
@@ -1,3 +1,114 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
 
-# Create your tests here.
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.http import http_date
+
+from .media_delivery import RangeReader, _if_range_matches, media_response, parse_range
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_no_or_malformed_header_means_whole_file(self):
+        for header in (None, '', 'bytes=-', 'items=0-1', 'bytes=5-1', 'bytes=a-b'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 1000))
+
+    def test_explicit_ranges(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=500-', 1000), (500, 999))
+        # Конец за пределами файла обрезается
+        self.assertEqual(parse_range('bytes=900-2000', 1000), (900, 999))
+
+    def test_suffix_ranges(self):
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 999))
+
+    def test_unsatisfiable(self):
+        for header, size in (('bytes=-0', 1000), ('bytes=1000-', 1000), ('bytes=1000-1001', 1000), ('bytes=-1', 0)):
+            with self.subTest(header=header, size=size):
+                with self.assertRaises(ValueError):
+                    parse_range(header, size)
+
+    def test_multiple_ranges_fall_back_to_whole_file(self):
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1000))
+
+
+class IfRangeTests(SimpleTestCase):
+    etag = '"17f-3e8"'
+    last_modified = 1_700_000_000
+
+    def matches(self, if_range=None):
+        headers = {'HTTP_IF_RANGE': if_range} if if_range is not None else {}
+        request = RequestFactory().get('/media/file.bin', **headers)
+        return _if_range_matches(request, self.etag, self.last_modified)
+
+    def test_without_header(self):
+        self.assertTrue(self.matches())
+
+    def test_etag(self):
+        self.assertTrue(self.matches(self.etag))
+        self.assertFalse(self.matches('"other"'))
+
+    def test_weak_etag_never_matches(self):
+        # If-Range сравнивает строго: слабый валидатор с тем же тегом — весь файл
+        self.assertFalse(self.matches(f'W/{self.etag}'))
+
+    def test_date(self):
+        self.assertTrue(self.matches(http_date(self.last_modified)))
+        self.assertFalse(self.matches(http_date(self.last_modified - 60)))
+
+
+class RangeReaderTests(SimpleTestCase):
+    def test_reads_at_most_length_bytes(self):
+        source = io.BytesIO(b'0123456789')
+        source.seek(2)
+        reader = RangeReader(source, 5)
+        self.assertEqual(reader.read(3), b'234')
+        self.assertEqual(reader.read(), b'56')
+        self.assertEqual(reader.read(), b'')
+
+    def test_short_file(self):
+        reader = RangeReader(io.BytesIO(b'abc'), 10)
+        self.assertEqual(reader.read(), b'abc')
+        self.assertEqual(reader.read(), b'')
+
+
+class MediaRangeResponseTests(SimpleTestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        with open(os.path.join(media_root.name, 'file.bin'), 'wb') as file:
+            file.write(self.content)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, MEDIA_SERVE_MODE='python')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get(self, **headers):
+        response = media_response(RequestFactory().get('/media/file.bin', **headers), 'file.bin')
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        if hasattr(response, 'close'):
+            response.close()
+        return response, body
+
+    def test_suffix_range(self):
+        response, body = self.get(HTTP_RANGE='bytes=-10')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes {len(self.content) - 10}-{len(self.content) - 1}/{len(self.content)}')
+        self.assertEqual(body, self.content[-10:])
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_multi_range_and_weak_if_range_get_whole_file(self):
+        etag = self.get()[0]['ETag']
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag)[0].status_code, 206)
+        for headers in ({'HTTP_RANGE': 'bytes=0-1,5-6'}, {'HTTP_RANGE': 'bytes=0-1', 'HTTP_IF_RANGE': f'W/{etag}'}):
+            with self.subTest(headers=headers):
+                response, body = self.get(**headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(body, self.content)
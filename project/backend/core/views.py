@@ -1,3 +1,67 @@
-from django.shortcuts import render
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponsePermanentRedirect
+from PIL import Image
 
-# Create your views here.
+from .images import all_variant_widths, open_original, parse_variant_name, render_variant, save_variant, variant_name
+from .media_delivery import media_response
+from .media_urls import MediaURLResolver, check_media_signature
+from .models import MovedMedia
+
+
+def moved_redirect(request, path):
+    '''Редирект со старого имени файла (или его варианта), перенесённого reshard_media; None — не переносился.'''
+    parsed = parse_variant_name(path)
+    original = parsed[0] if parsed else path
+    moved = MovedMedia.objects.filter(old_name=original).values_list('new_name', flat=True).first()
+    if moved is None:
+        return None
+    target = variant_name(moved, parsed[1], parsed[2]) if parsed else moved
+    return HttpResponsePermanentRedirect(MediaURLResolver.for_request(request).url(target))
+
+
+def media_file(request, path):
+    '''
+    Файл из MEDIA_ROOT (core.media_delivery: X-Accel-Redirect/X-Sendfile или поток с Range);
+    файл, перенесённый в раскладку с каталогами ab/cd/, — редиректом на новый URL.
+    '''
+    check_media_signature(request, path)
+    try:
+        return media_response(request, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    except Http404:
+        redirect = moved_redirect(request, path)
+        if redirect is None:
+            raise
+        return redirect
+
+
+def image_variant(request, path):
+    '''
+    Вариант изображения (core.images) с генерацией при первом запросе: если файла ещё нет
+    (загрузка до появления вариантов, пул не успел), он строится из оригинала и сохраняется рядом.
+    '''
+    parsed = parse_variant_name(path)
+    if parsed is None or parsed[1] not in all_variant_widths():
+        raise Http404
+    original, width, fmt = parsed
+    # Вариант варианта (x.jpg.w320.webp.w320.webp...) и служебные каталоги (blobs/.tmp) не строятся:
+    # иначе анонимные запросы плодят на диске сколько угодно новых файлов
+    if parse_variant_name(original) is not None or any(part.startswith('.') for part in original.split('/')):
+        raise Http404
+    check_media_signature(request, path)
+    try:
+        if not default_storage.exists(path):
+            if not default_storage.exists(original):
+                redirect = moved_redirect(request, path)
+                if redirect is None:
+                    raise Http404
+                return redirect
+            data = render_variant(open_original(original), width, fmt)
+            if not default_storage.exists(path):
+                save_variant(path, data)
+        return media_response(request, path)
+    except (SuspiciousFileOperation, OSError, Image.DecompressionBombError):
+        # DecompressionBombError не OSError: слишком большой оригинал — вариантов у него нет
+        raise Http404
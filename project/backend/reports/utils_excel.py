@@ -63,3 +63,37 @@ def build_posts_report(queryset, filters: dict) -> bytes:
     bio = io.BytesIO()
     wb.save(bio)
     return bio.getvalue()
+
+def build_post_viewers_report(queryset, filters: dict, relative_error: float) -> bytes:
+    wb = Workbook()
+    ws_meta = wb.active
+    ws_meta.title = 'meta'
+    ws_meta.append(['Отчет: Уникальные зрители по дням'])
+    ws_meta.append(['Сгенерировано', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
+    ws_meta.append(['Оценка HyperLogLog, стандартная ошибка', f'±{relative_error:.2%}'])
+    for k, v in filters.items():
+        ws_meta.append([k, ', '.join(v) if isinstance(v, (list, tuple)) else v])
+
+    ws = wb.create_sheet('viewers')
+    headers = ['День', 'ID', 'Заголовок', 'Автор', 'Уникальные_зрители', 'Просмотры_всего']
+    ws.append(headers)
+    for c in ws[1]:
+        c.fill = BASE_HEADER_FILL
+        c.font = BASE_HEADER_FONT
+        c.alignment = Alignment(horizontal='center')
+
+    for row in queryset:
+        ws.append([
+            row.day.strftime('%Y-%m-%d'),
+            row.post_id,
+            row.post.title,
+            row.post.author.username,
+            row.unique_viewers,
+            row.post.views_count,
+        ])
+
+    autosize(ws_meta)
+    autosize(ws)
+    bio = io.BytesIO()
+    wb.save(bio)
+    return bio.getvalue()
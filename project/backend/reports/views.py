@@ -2,9 +2,10 @@ from django.http import HttpResponse
 from django.utils.dateparse import parse_date
 from rest_framework.views import APIView
 
-from blog.models import Post
+from blog.hll import HyperLogLog
+from blog.models import Post, PostDailyViewers
 from reports.permissions import IsAdmin
-from reports.utils_excel import build_posts_report
+from reports.utils_excel import build_post_viewers_report, build_posts_report
 
 
 class PostReportView(APIView):
@@ -58,3 +59,43 @@ class PostReportView(APIView):
         )
         resp['Content-Disposition'] = 'attachment; filename="posts_report.xlsx"'
         return resp
+
+
+class PostViewersReportView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        qs = (PostDailyViewers.objects
+              .select_related('post__author')
+              .defer('sketch')
+              .order_by('-day', '-unique_viewers'))
+        date_from = request.query_params.get('date_from')
+        date_to = request.query_params.get('date_to')
+        post_id = request.query_params.get('post_id')
+        author_id = request.query_params.get('author_id')
+
+        if date_from:
+            d = parse_date(date_from)
+            if d:
+                qs = qs.filter(day__gte=d)
+        if date_to:
+            d = parse_date(date_to)
+            if d:
+                qs = qs.filter(day__lte=d)
+        if post_id:
+            qs = qs.filter(post_id=post_id)
+        if author_id:
+            qs = qs.filter(post__author_id=author_id)
+
+        data = build_post_viewers_report(qs, {
+            'date_from': date_from or '',
+            'date_to': date_to or '',
+            'post_id': post_id or '',
+            'author_id': author_id or '',
+        }, HyperLogLog().error_bound)
+        resp = HttpResponse(
+            data,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        resp['Content-Disposition'] = 'attachment; filename="post_viewers_report.xlsx"'
+        return resp
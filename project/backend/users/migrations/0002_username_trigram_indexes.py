@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:30
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0001_initial"),
+        # pg_trgm создаётся там
+        ("blog", "0005_trigram_name_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="customuser",
+            name="email",
+            field=models.EmailField(
+                max_length=254, unique=True, verbose_name="email address"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customuser",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["username"],
+                name="user_username_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customuser",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["display_name"],
+                name="user_display_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
@@ -1,14 +1,18 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 from backend import settings
+from core.storage import sharded_upload_path
+
+AVATAR_UPLOAD_DIR = 'users'
 
 
 def user_avatar_path(instance, filename):
     if not instance.pk:
         return 'temp_avatars/' + filename
-    return f'users/{instance.pk}/avatar/{filename}'
+    return sharded_upload_path(AVATAR_UPLOAD_DIR, f'{instance.pk}/avatar/{filename}')
 
 class CustomUser(AbstractUser):
     class Role(models.TextChoices):
@@ -81,3 +85,7 @@ class CustomUser(AbstractUser):
         verbose_name = _('user')
         verbose_name_plural = _('users')
         ordering = ['-date_joined']
+        indexes = [
+            GinIndex(fields=['username'], name='user_username_trgm_idx', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['display_name'], name='user_display_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
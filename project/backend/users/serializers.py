@@ -3,6 +3,11 @@ from django.core.validators import EmailValidator
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+from core.images import srcset
+from core.media_urls import MediaURLResolver
+from core.relations import ViewerRelations
+from core.serializers import SparseFieldsetMixin
+
 User = get_user_model()
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -49,8 +54,16 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         )
         return user
 
-class UserSerializer(serializers.ModelSerializer):
+class UserListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        users = list(data.all() if hasattr(data, 'all') else data)
+        if 'is_subscribed' in self.child.fields:
+            ViewerRelations.for_request(self.context.get('request')).load_users([u.pk for u in users])
+        return super().to_representation(users)
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     avatar_url = serializers.SerializerMethodField()
+    avatar_srcset = serializers.SerializerMethodField()
     is_admin = serializers.BooleanField(read_only=True)
     subscribers_count = serializers.IntegerField(read_only=True)
     subscriptions_count = serializers.IntegerField(read_only=True)
@@ -61,23 +74,20 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = [
-            'id','username','email','display_name','avatar_url','role',
+            'id','username','email','display_name','avatar_url','avatar_srcset','role',
             'is_admin','subscribers_count','subscriptions_count',
             'posts_count','liked_posts_count','is_subscribed'
         ]
+        list_serializer_class = UserListSerializer
 
     def get_avatar_url(self, obj):
-        request = self.context.get('request')
-        if obj.avatar and request:
-            return request.build_absolute_uri(obj.avatar.url)
-        return None
+        return MediaURLResolver.for_request(self.context.get('request')).file_url(obj.avatar)
+
+    def get_avatar_srcset(self, obj):
+        return srcset(obj.avatar, 'avatar', self.context.get('request'))
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        user = getattr(request, 'user', None)
-        if not user or not user.is_authenticated or user.id == obj.id:
-            return False
-        return obj.subscribers.filter(pk=user.pk).exists()
+        return ViewerRelations.for_request(self.context.get('request')).is_subscribed(obj)
 
 class UserUpdateSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(
@@ -11,7 +11,10 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 
 from blog.models import Post  # убедись что путь корректен
 from blog.serializers import PostSerializer  # существующий сериализатор постов
+from core.conditional import conditional_get, make_etag
+from core.images import delete_variants
 from core.permissions import IsAdminUserOrReadOnly
+from core.relations import ViewerRelations
 
 from .models import CustomUser
 from .serializers import CustomTokenObtainPairSerializer, UserRegisterSerializer, UserSerializer, UserUpdateSerializer
@@ -110,6 +113,7 @@ class UserAvatarUpdateView(APIView):
 
             if user.avatar:
                 try:
+                    delete_variants(user.avatar.name)
                     user.avatar.delete()
                 except Exception as e:
                     print(f'Error deleting old avatar: {e}')
@@ -173,13 +177,19 @@ class UserRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAdminUserOrReadOnly]
 
+def profile_posts_queryset(queryset):
+    # Полный пост: профиль открывает из этого списка PostEditModal (content, steps, ingredients)
+    return (queryset.select_related('author')
+            .prefetch_related('tags', 'steps', 'postingredient_set__ingredient')
+            .defer('search_vector'))
+
 class UserPostsView(generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.AllowAny]
 
     def get_queryset(self):
         user = get_object_or_404(CustomUser, pk=self.kwargs['user_id'])
-        qs = Post.objects.filter(author=user).order_by('-created_at')
+        qs = profile_posts_queryset(Post.objects.filter(author=user).order_by('-created_at'))
         # для чужих показываем только опубликованные
         req_user = self.request.user
         if not (req_user.is_authenticated and (req_user.is_admin or req_user.id == user.id)):
@@ -197,40 +207,42 @@ class UserLikedPostsView(generics.ListAPIView):
 
     def get_queryset(self):
         user = get_object_or_404(CustomUser, pk=self.kwargs['user_id'])
-        # предполагается что в Post есть ManyToMany liked_by = models.ManyToManyField(User, related_name='liked_posts', ...)
-        return Post.objects.filter(liked_by=user).order_by('-created_at')
+        # По времени лайка — индекс like_user_created_idx (user, -created_at)
+        return profile_posts_queryset(
+            Post.objects.filter(likes__user=user).order_by('-likes__created_at', '-likes__id')
+        )
 
     def get_serializer_context(self):
         ctx = super().get_serializer_context()
         ctx['request'] = self.request
         return ctx
 
+def public_profile_response(request, **lookup):
+    user = get_object_or_404(
+        CustomUser.objects.annotate(
+            subscribers_count=Count('subscribers', distinct=True),
+            subscriptions_count=Count('subscriptions', distinct=True),
+            posts_count=Count('posts', distinct=True),
+            liked_posts_count=Count('liked_posts', distinct=True),
+        ),
+        **lookup
+    )
+    # ETag из полей и счётчиков профиля — при совпадении сериализатор не запускается
+    etag = make_etag(
+        'user', user.pk, user.username, user.email, user.display_name, user.avatar.name, user.role, user.is_superuser,
+        user.subscribers_count, user.subscriptions_count, user.posts_count, user.liked_posts_count,
+        request.user.pk, ViewerRelations.for_request(request).is_subscribed(user),
+    )
+    return conditional_get(request, lambda: Response(UserSerializer(user, context={'request': request}).data), etag=etag)
+
 class UserByUsernameView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, username):
-        user = get_object_or_404(
-            CustomUser.objects.annotate(
-                subscribers_count=Count('subscribers', distinct=True),
-                subscriptions_count=Count('subscriptions', distinct=True),
-                posts_count=Count('posts', distinct=True),
-                liked_posts_count=Count('liked_posts', distinct=True),
-            ),
-            username=username
-        )
-        return Response(UserSerializer(user, context={'request': request}).data)
+        return public_profile_response(request, username=username)
 
 class UserPublicDetailView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, user_id):
-        user = get_object_or_404(
-            CustomUser.objects.annotate(
-                subscribers_count=Count('subscribers', distinct=True),
-                subscriptions_count=Count('subscriptions', distinct=True),
-                posts_count=Count('posts', distinct=True),
-                liked_posts_count=Count('liked_posts', distinct=True),
-            ),
-            pk=user_id
-        )
-        return Response(UserSerializer(user, context={'request': request}).data)
+        return public_profile_response(request, pk=user_id)